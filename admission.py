@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+
+from state_store import MemoryStateStore
+
+
+class AdmissionRejected(Exception):
+    """Raised when a connection or job is refused; `retry_after` is in seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"busy ({reason}), retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Decides up front whether a connection or audio job gets served.
+
+    Limits, all checked without waiting except the global job queue:
+    - `max_connections` open WebSocket connections;
+    - `max_in_flight_per_client` unanswered jobs per client;
+    - `audio_seconds_per_minute` of decoded audio per client (sliding window);
+    - `max_in_flight` jobs globally. A job over this limit waits in a FIFO
+      queue of at most `max_waiting` entries for up to `queue_timeout`
+      seconds before it is rejected.
+
+    Rejections raise AdmissionRejected with a `retry_after` hint, so
+    clients get a fast, explicit "busy" instead of a slow answer.
+
+    Connection, per-client and audio counters live in `store`, so they hold
+    across server workers when it is shared (see state_store). The global
+    in-flight limit and its wait queue are per worker; `from_env` splits
+    ADMISSION_MAX_IN_FLIGHT and ADMISSION_MAX_WAITING between the workers.
+    A blocking store is called from a worker thread, and units are given
+    back to it in the background so `release` stays synchronous.
+    """
+
+    def __init__(self, max_connections=200, max_in_flight=64, max_in_flight_per_client=4,
+                 audio_seconds_per_minute=300.0, max_waiting=128, queue_timeout=5.0, window=60.0,
+                 store=None):
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_client = max_in_flight_per_client
+        self.audio_seconds_per_minute = audio_seconds_per_minute
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.window = window
+        self.store = store or MemoryStateStore()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._waiting = 0
+        # Smoothed job duration, for retry-after estimates
+        self._job_seconds = 1.0
+        # Background give-backs to a blocking store
+        self._returns = set()
+        self._counters = {"admitted": 0, "rejected_connections": 0, "rejected_client": 0,
+                          "rejected_rate": 0, "rejected_busy": 0, "cancelled": 0}
+
+    @classmethod
+    def from_env(cls, store=None, workers=None):
+        workers = workers if workers is not None else int(os.getenv("WEB_CONCURRENCY", "1"))
+        return cls(
+            max_connections=int(os.getenv("ADMISSION_MAX_CONNECTIONS", "200")),
+            max_in_flight=max(1, int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64")) // workers),
+            max_in_flight_per_client=int(os.getenv("ADMISSION_MAX_IN_FLIGHT_PER_CLIENT", "4")),
+            audio_seconds_per_minute=float(os.getenv("ADMISSION_AUDIO_SECONDS_PER_MINUTE", "300")),
+            max_waiting=max(1, int(os.getenv("ADMISSION_MAX_WAITING", "128")) // workers),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5")),
+            store=store,
+        )
+
+    async def _store_call(self, method, *args):
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    def _give_back(self, method, client_id):
+        if not self.store.blocking:
+            method(client_id)
+            return
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(method, client_id))
+        self._returns.add(task)
+        task.add_done_callback(self._returned)
+
+    def _returned(self, task):
+        self._returns.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error in admission release: {task.exception()}")
+
+    def _busy_retry_after(self):
+        # Roughly how long until the queue ahead of a new job has drained
+        return max(1.0, self._job_seconds * (self._waiting + 1) / self.max_in_flight)
+
+    async def open_connection(self, client_id):
+        if not await self._store_call(self.store.open_connection, client_id, self.max_connections):
+            self._counters["rejected_connections"] += 1
+            raise AdmissionRejected("connections", self._busy_retry_after())
+
+    def close_connection(self, client_id):
+        self._give_back(self.store.close_connection, client_id)
+
+    async def acquire(self, client_id):
+        """
+        Reserve a job slot for `client_id`, waiting in the bounded queue if
+        every global slot is busy. Pair with `release()`.
+        """
+        if not await self._store_call(self.store.acquire_client_slot, client_id, self.max_in_flight_per_client):
+            self._counters["rejected_client"] += 1
+            raise AdmissionRejected("client_in_flight", self._job_seconds)
+        try:
+            if self._slots.locked():
+                if self._waiting >= self.max_waiting:
+                    self._counters["rejected_busy"] += 1
+                    raise AdmissionRejected("busy", self._busy_retry_after())
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    self._counters["rejected_busy"] += 1
+                    raise AdmissionRejected("busy", self._busy_retry_after()) from None
+                finally:
+                    self._waiting -= 1
+            else:
+                await self._slots.acquire()
+        except BaseException:
+            self._give_back(self.store.release_client_slot, client_id)
+            raise
+        self._in_flight += 1
+        self._counters["admitted"] += 1
+        return time.monotonic()
+
+    def release(self, client_id, admitted_at=None, cancelled=False):
+        self._slots.release()
+        self._in_flight -= 1
+        self._give_back(self.store.release_client_slot, client_id)
+        if cancelled:
+            self._counters["cancelled"] += 1
+        elif admitted_at is not None:
+            self._job_seconds = 0.9 * self._job_seconds + 0.1 * (time.monotonic() - admitted_at)
+
+    async def charge_audio(self, client_id, seconds):
+        """Count `seconds` of audio against the client's per-minute budget, or reject the job."""
+        if self.audio_seconds_per_minute <= 0:
+            return
+        retry_after = await self._store_call(self.store.charge_audio, client_id, seconds,
+                                             self.audio_seconds_per_minute, self.window)
+        if retry_after is not None:
+            self._counters["rejected_rate"] += 1
+            raise AdmissionRejected("rate", retry_after)
+
+    def stats(self):
+        return {
+            **self._counters,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "job_seconds_avg": self._job_seconds,
+            **{f"shared_{key}": value for key, value in self.store.stats().items()},
+        }
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+
+class BatchTranslationError(Exception):
+    """Raised when a batched response does not line up with its inputs."""
+
+
+def batch_translation_messages(texts, target_lang, context=""):
+    """Chat messages that translate a list of texts in one request; `context` is appended to the instructions."""
+    return [
+        {"role": "system", "content": (
+            "You are a translator. Translate every string in the JSON array to " + target_lang + ". "
+            'Reply with only a JSON object {"translations": [...]} containing the translations '
+            "in the same order and with the same number of items."
+            + ("\n" + context if context else "")
+        )},
+        {"role": "user", "content": json.dumps(texts, ensure_ascii=False)}
+    ]
+
+
+def parse_batch_translations(content, expected):
+    """Extract the translations list from a batched reply."""
+    try:
+        translations = json.loads(content)["translations"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise BatchTranslationError(f"unparseable batch reply: {e}") from e
+    if not isinstance(translations, list):
+        raise BatchTranslationError(f"expected a list of translations, got {type(translations).__name__}")
+    if len(translations) != expected:
+        raise BatchTranslationError(f"expected {expected} translations, got {len(translations)}")
+    return [str(translation) for translation in translations]
+
+
+class MicroBatcher:
+    """
+    Coalesces translation requests for the same target language.
+
+    The first request for a target language opens a window of `window_ms`;
+    every request that arrives for that language before the window closes (or
+    until `max_batch_size` is reached) is sent upstream as one call to
+    `translate_batch(texts, target_lang)`, and the results are fanned back
+    out to the callers.
+    """
+
+    def __init__(self, translate_batch, window_ms=20, max_batch_size=16):
+        self.translate_batch = translate_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = {}
+        self._timers = {}
+        self._running = set()
+        self._counters = {"requests": 0, "batches": 0, "errors": 0}
+
+    async def translate(self, text, target_lang):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(target_lang, [])
+        batch.append((text, future))
+        self._counters["requests"] += 1
+        if len(batch) >= self.max_batch_size:
+            self._flush(target_lang)
+        elif target_lang not in self._timers:
+            self._timers[target_lang] = loop.call_later(self.window, self._flush, target_lang)
+        return await future
+
+    def _flush(self, target_lang):
+        timer = self._timers.pop(target_lang, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(target_lang, None)
+        if batch:
+            task = asyncio.create_task(self._run(batch, target_lang))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch, target_lang):
+        self._counters["batches"] += 1
+        try:
+            translations = await self.translate_batch([text for text, _ in batch], target_lang)
+        except Exception as e:
+            self._counters["errors"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), translation in zip(batch, translations):
+            # Callers that gave up (e.g. disconnected) leave a cancelled future
+            if not future.done():
+                future.set_result(translation)
+
+    def stats(self):
+        batches = self._counters["batches"]
+        return {
+            **self._counters,
+            "avg_batch_size": self._counters["requests"] / batches if batches else 0.0,
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+        }
@@ -0,0 +1,169 @@
+"""
+Cold-start costs to track across releases:
+
+- import time of server.py and of each page's top-level imports, and of
+  the modules the pages now import only when a feature needs them, each
+  measured in fresh interpreters (median of --runs);
+- server readiness: seconds from launching uvicorn until it answers, the
+  warm-up steps it reported, and the latency of the first and second
+  upstream-backed request, with the lifespan warm-up on and off. Runs
+  offline against loadtest/fake_openai.py.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --json >> startup-history.jsonl
+"""
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ("pages/translator.py", "pages/grammer.py")
+# Imported by the pages only when recording or calling the API
+DEFERRED_MODULES = ("openai", "speech_recognition", "translation_memory")
+
+
+def top_level_imports(path):
+    """Modules a script imports at module level, in order."""
+    with open(os.path.join(REPO_DIR, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def importable(module):
+    sys.path.insert(0, REPO_DIR)
+    try:
+        return importlib.util.find_spec(module.split(".")[0]) is not None
+    finally:
+        sys.path.pop(0)
+
+
+def import_ms(modules, runs):
+    """Median milliseconds to import `modules` in a fresh interpreter."""
+    code = (
+        "import time; started = time.perf_counter()\n"
+        + "".join(f"import {module}\n" for module in modules)
+        + "print((time.perf_counter() - started) * 1000)"
+    )
+    samples = [float(subprocess.check_output([sys.executable, "-c", code], cwd=REPO_DIR)) for _ in range(runs)]
+    return statistics.median(samples)
+
+
+def measure_imports(runs):
+    results = {"server": import_ms(["server"], runs)}
+    for page in PAGES:
+        modules = [module for module in top_level_imports(page) if importable(module)]
+        results[os.path.basename(page)] = import_ms(modules, runs)
+    for module in DEFERRED_MODULES:
+        if importable(module):
+            results[f"deferred:{module}"] = import_ms([module], runs)
+    return results
+
+
+def http(url, body=None, timeout=30):
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode() if body is not None else None,
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def wait_for(url, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            return http(url, timeout=1)
+        except OSError:
+            time.sleep(0.02)
+    raise SystemExit(f"{url} did not come up within {timeout}s")
+
+
+def measure_server(warmup, args):
+    cache_dir = tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(
+        os.environ,
+        WARMUP="1" if warmup else "0",
+        OPENAI_API_KEY="sk-fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1",
+        TRANSLATION_CACHE_PATH=os.path.join(cache_dir, "cache.sqlite3"),
+        TRANSCRIPT_STORE_PATH=os.path.join(cache_dir, "transcripts.sqlite3"),
+        SUMMARY_CACHE_PATH=os.path.join(cache_dir, "summaries.sqlite3"),
+    )
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.server_port), "--log-level", "warning"],
+        cwd=REPO_DIR, env=env
+    )
+    try:
+        stats = wait_for(f"http://127.0.0.1:{args.server_port}/stats")
+        ready_s = time.perf_counter() - started
+        requests_ms = []
+        for i in range(2):
+            request_started = time.perf_counter()
+            http(f"http://127.0.0.1:{args.server_port}/translate/batch", {"texts": [f"cold start {i}"]})
+            requests_ms.append((time.perf_counter() - request_started) * 1000)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "warmup": warmup,
+        "ready_s": ready_s,
+        "first_request_ms": requests_ms[0],
+        "second_request_ms": requests_ms[1],
+        "startup": stats.get("startup", {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--fake-port", type=int, default=8100)
+    parser.add_argument("--server-port", type=int, default=8001)
+    parser.add_argument("--fake-args", default="--chat-latency fixed:300", help="extra arguments for fake_openai.py")
+    parser.add_argument("--skip-server", action="store_true", help="only measure imports")
+    parser.add_argument("--json", action="store_true", help="print one JSON line, e.g. to append to a history file")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "imports_ms": measure_imports(args.runs), "server": []}
+    if not args.skip_server:
+        fake = subprocess.Popen([
+            sys.executable, os.path.join(REPO_DIR, "loadtest", "fake_openai.py"),
+            "--port", str(args.fake_port), *args.fake_args.split(),
+        ])
+        try:
+            wait_for(f"http://127.0.0.1:{args.fake_port}/v1/models")
+            report["server"] = [measure_server(warmup, args) for warmup in (False, True)]
+        finally:
+            fake.terminate()
+            fake.wait()
+
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"{'import':<28} {'median ms':>10}")
+    for name, ms in report["imports_ms"].items():
+        print(f"{name:<28} {ms:>10.1f}")
+    if report["server"]:
+        print(f"\n{'warm-up':<8} {'ready s':>8} {'1st req ms':>11} {'2nd req ms':>11}  steps")
+        for r in report["server"]:
+            steps = " ".join(f"{key}={value:.0f}" for key, value in r["startup"].items())
+            print(f"{'on' if r['warmup'] else 'off':<8} {r['ready_s']:>8.2f} {r['first_request_ms']:>11.1f} "
+                  f"{r['second_request_ms']:>11.1f}  {steps}")
+
+
+if __name__ == "__main__":
+    main()
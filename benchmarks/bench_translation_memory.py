@@ -0,0 +1,197 @@
+"""
+Translation memory hit rate and lookup latency against a replay corpus.
+
+Fills a memory-only TranslationMemory with --entries unrelated sentences,
+then replays a stream of utterances the way a session would (look up,
+"translate" on a miss, remember) and reports:
+
+- how many utterances an exact-match cache would have answered, and how
+  many the memory reused verbatim, with number/name substitution, or
+  helped with few-shot examples;
+- reuse precision: reused translations equal to what the translator
+  would have produced (a deterministic stand-in that copies numbers and
+  names and rewrites every other word);
+- lookup latency percentiles at the final memory size.
+
+The default corpus is synthetic: new sentences mixed with repeats that
+differ in punctuation, casing, numbers, a name or one word. --corpus
+replays a file instead, one utterance per line (or JSONL with "text").
+
+    python benchmarks/bench_translation_memory.py --entries 300000
+    python benchmarks/bench_translation_memory.py --corpus session.txt --json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translation_cache import normalize_text  # noqa: E402
+from translation_memory import TranslationMemory  # noqa: E402
+
+NAMES = ["Alice", "Bob", "Carol", "Dmitri", "Eun", "Farah", "Goro", "Hana", "Ivan", "Jisoo", "Kenji", "Lena"]
+_WORD = re.compile(r"\d+(?:[.,:]\d+)*|\w+|[^\w\s]")
+
+
+def make_vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return sorted({"".join(rng.choice(letters) for _ in range(rng.randint(2, 9))) for _ in range(size)})
+
+
+def make_sentence(vocabulary, rng):
+    words = [rng.choice(vocabulary) for _ in range(rng.randint(5, 14))]
+    if rng.random() < 0.5:
+        words.insert(rng.randrange(len(words)), rng.choice(NAMES))
+    if rng.random() < 0.6:
+        words.insert(rng.randrange(len(words)), str(rng.randint(1, 500)))
+    words[0] = words[0].capitalize()
+    return " ".join(words) + rng.choice([".", ".", ".", "?", "!"])
+
+
+def fake_translate(text):
+    """Copies numbers and names (in their usual spelling), reverses other words, keeps "?"."""
+    words = [token for token in _WORD.findall(normalize_text(text)) if token[0].isalnum()]
+    out = [word if word[0].isdigit() else word.capitalize() if word.capitalize() in NAMES else word.lower()[::-1]
+           for word in words]
+    return " ".join(out) + ("?" if "?" in text else ".")
+
+
+def vary(sentence, vocabulary, rng):
+    """A near-duplicate of `sentence` and the kind of change made."""
+    kind = rng.choice(["repeat", "punctuation", "number", "name", "word"])
+    tokens = sentence[:-1].split(" ")
+    if kind == "punctuation":
+        text = sentence[:-1].lower() + rng.choice([",", "", " ...", "!"])
+        return (text if sentence[-1] != "?" else text + "?"), kind
+    if kind == "number":
+        positions = [i for i, token in enumerate(tokens) if token.isdigit()]
+        if positions:
+            tokens[rng.choice(positions)] = str(rng.randint(501, 999))
+            return " ".join(tokens) + sentence[-1], kind
+    if kind == "name":
+        positions = [i for i, token in enumerate(tokens) if token in NAMES]
+        if positions:
+            tokens[rng.choice(positions)] = rng.choice(NAMES)
+            return " ".join(tokens) + sentence[-1], kind
+    if kind == "word":
+        tokens[rng.randrange(1, len(tokens))] = rng.choice(vocabulary)
+        return " ".join(tokens) + sentence[-1], kind
+    return sentence, "repeat"
+
+
+def synthetic_corpus(length, new_fraction, vocabulary, rng):
+    said = []
+    for _ in range(length):
+        if not said or rng.random() < new_fraction:
+            said.append(make_sentence(vocabulary, rng))
+            yield said[-1], "new"
+        else:
+            # Recent sentences are repeated more often than old ones
+            yield vary(said[-1 - min(int(rng.expovariate(0.05)), len(said) - 1)], vocabulary, rng)
+
+
+def file_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield (json.loads(line)["text"] if line.startswith("{") else line), "file"
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    memory = TranslationMemory(path=None, max_entries=args.entries + args.length + 1)
+
+    started = time.perf_counter()
+    for _ in range(args.entries):
+        sentence = make_sentence(vocabulary, rng)
+        memory.add(sentence, fake_translate(sentence), "en", "ko")
+    fill_s = time.perf_counter() - started
+
+    corpus = file_corpus(args.corpus) if args.corpus else synthetic_corpus(args.length, args.new_fraction,
+                                                                          vocabulary, rng)
+    exact_seen = set()
+    counts = {"utterances": 0, "exact_cache": 0, "exact": 0, "substituted": 0, "context": 0, "miss": 0,
+              "reused_correct": 0}
+    by_change = {}
+    lookups_us = []
+    for text, change in corpus:
+        counts["utterances"] += 1
+        key = normalize_text(text)
+        counts["exact_cache"] += key in exact_seen
+        exact_seen.add(key)
+        lookup_started = time.perf_counter()
+        match = memory.lookup(text, "en", "ko")
+        lookups_us.append((time.perf_counter() - lookup_started) * 1e6)
+        outcome = match.kind or ("context" if match.examples else "miss")
+        counts[outcome] += 1
+        by_change.setdefault(change, {}).setdefault(outcome, 0)
+        by_change[change][outcome] += 1
+        if match.translation is not None:
+            counts["reused_correct"] += match.translation == fake_translate(text)
+        else:
+            memory.add(text, fake_translate(text), "en", "ko")
+
+    utterances = counts["utterances"] or 1
+    reused = counts["exact"] + counts["substituted"]
+    return {
+        "entries": memory.stats()["entries"],
+        "fill_s": fill_s,
+        **counts,
+        "exact_cache_hit_rate": counts["exact_cache"] / utterances,
+        "memory_reuse_rate": reused / utterances,
+        "few_shot_rate": counts["context"] / utterances,
+        "reuse_precision": counts["reused_correct"] / reused if reused else 1.0,
+        "lookup_us": {
+            "p50": percentile(lookups_us, 0.5), "p90": percentile(lookups_us, 0.9),
+            "p99": percentile(lookups_us, 0.99), "mean": statistics.fmean(lookups_us),
+        } if lookups_us else {},
+        "by_change": by_change,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=300000, help="unrelated sentences stored before the replay")
+    parser.add_argument("--length", type=int, default=5000, help="utterances in the synthetic replay")
+    parser.add_argument("--new-fraction", type=float, default=0.4, help="share of never-said sentences")
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--corpus", help="replay this file instead of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print one JSON line, e.g. to append to a history file")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"memory: {report['entries']} entries (filled in {report['fill_s']:.1f}s), "
+          f"replayed {report['utterances']} utterances")
+    print(f"exact-match cache hit rate  {report['exact_cache_hit_rate']:6.1%}")
+    print(f"memory reuse rate           {report['memory_reuse_rate']:6.1%}  "
+          f"({report['exact']} verbatim, {report['substituted']} substituted)")
+    print(f"reuse precision             {report['reuse_precision']:6.1%}")
+    print(f"few-shot context rate       {report['few_shot_rate']:6.1%}")
+    if report["lookup_us"]:
+        latency = report["lookup_us"]
+        print(f"lookup us                   p50 {latency['p50']:.0f}  p90 {latency['p90']:.0f}  "
+              f"p99 {latency['p99']:.0f}  mean {latency['mean']:.0f}")
+    print(f"\n{'change':<12} " + " ".join(f"{outcome:>11}" for outcome in ("exact", "substituted", "context", "miss")))
+    for change, outcomes in sorted(report["by_change"].items()):
+        print(f"{change:<12} " + " ".join(f"{outcomes.get(outcome, 0):>11}"
+                                          for outcome in ("exact", "substituted", "context", "miss")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compare the legacy JSON/base64 WebSocket audio message with the binary frame
+protocol: bytes on the wire per clip and peak memory while ingesting a clip.
+
+Each protocol runs in its own child process so peak RSS is not shared.
+
+    python benchmarks/bench_ws_protocol.py --clip-kb 160 --clips 50
+"""
+import argparse
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ws_protocol import encode_audio_frame, read_audio_message  # noqa: E402
+
+
+def build_message(protocol, clip, seq):
+    if protocol == "json":
+        return {"type": "websocket.receive", "text": json.dumps({
+            "type": "audio",
+            "data": base64.b64encode(clip).decode("ascii"),
+            "target_lang": "ko",
+            "seq": seq,
+        })}
+    return {"type": "websocket.receive", "bytes": encode_audio_frame(clip, seq=seq, target_lang="ko")}
+
+
+def wire_size(message):
+    if message.get("bytes") is not None:
+        return len(message["bytes"])
+    return len(message["text"].encode("utf-8"))
+
+
+def run_protocol(protocol, clip_bytes, clips):
+    clip = os.urandom(clip_bytes)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    total_wire = 0
+    for seq in range(clips):
+        message = build_message(protocol, clip, seq)
+        total_wire += wire_size(message)
+        audio_message = read_audio_message(message)
+        assert len(audio_message.audio) == clip_bytes
+        del message, audio_message
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "protocol": protocol,
+        "clip_bytes": clip_bytes,
+        "wire_bytes_per_clip": total_wire / clips,
+        "wire_overhead_pct": (total_wire / clips / clip_bytes - 1) * 100,
+        "traced_peak_bytes": traced_peak,
+        "peak_rss_growth_bytes": (rss_after - rss_before) * rss_unit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clip-kb", type=int, default=160, help="size of one recorded clip in KiB")
+    parser.add_argument("--clips", type=int, default=50)
+    parser.add_argument("--child", choices=["json", "binary"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    clip_bytes = args.clip_kb * 1024
+
+    if args.child:
+        print(json.dumps(run_protocol(args.child, clip_bytes, args.clips)))
+        return
+
+    results = []
+    for protocol in ("json", "binary"):
+        output = subprocess.check_output([
+            sys.executable, os.path.abspath(__file__),
+            "--clip-kb", str(args.clip_kb), "--clips", str(args.clips), "--child", protocol,
+        ])
+        results.append(json.loads(output))
+
+    print(f"{'protocol':<8} {'wire B/clip':>12} {'overhead':>9} {'traced peak':>12} {'peak RSS +':>12}")
+    for r in results:
+        print(
+            f"{r['protocol']:<8} {r['wire_bytes_per_clip']:>12.0f} {r['wire_overhead_pct']:>8.1f}% "
+            f"{r['traced_peak_bytes']:>12} {r['peak_rss_growth_bytes']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from model_router import ModelRouter
+from translation_cache import TranslationCache
+
+# Cache namespace for analyses; the model per call is picked by the router
+GRAMMAR_MODEL = "gpt-4"
+# Bump when the prompt or schema changes so stale cached analyses are not reused
+GRAMMAR_PROMPT_VERSION = "grammar-json-v1"
+DEFAULT_GRAMMAR_CACHE_PATH = os.getenv(
+    "GRAMMAR_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache", "grammar.sqlite3")
+)
+
+# Top-level keys of an analysis, in the order the model is asked to emit them
+SECTIONS = ("score", "errors", "corrected", "explanation", "vocabulary", "examples", "resources", "style")
+
+SYSTEM_PROMPT = (
+    "당신은 전문 영어 교사이자 문법 검사기입니다. 문법 교정뿐만 아니라 어휘 학습과 관련 자료도 제공하여 "
+    "종합적인 영어 학습이 가능하도록 한국어로 상세하고 건설적인 피드백을 제공해주세요. "
+    "응답은 설명 없이 JSON 객체 하나만 출력합니다."
+)
+
+ANALYSIS_SCHEMA = """{
+  "score": <grammar score, integer 0-100>,
+  "errors": [{"error": "<the mistake>", "explanation": "<why it is wrong>"}],
+  "corrected": "<the corrected English sentence>",
+  "explanation": "<detailed explanation of the corrections>",
+  "vocabulary": [{"term": "<word or expression>", "meaning": "<meaning>", "level": "<초급|중급|고급>", "related": ["<synonyms/antonyms>"]}],
+  "examples": ["<example sentence>", "<example sentence>", "<example sentence>"],
+  "resources": ["<YouTube video, website or book recommendation>"],
+  "style": ["<writing style suggestion>"]
+}"""
+
+SCHEMA_INSTRUCTIONS = (
+    "Reply with exactly one JSON object with these keys, in this order:\n\n" + ANALYSIS_SCHEMA
+    + '\n\nUse an empty list for "errors" if the sentence is correct.'
+)
+
+
+class GrammarAnalysisError(Exception):
+    """Raised when the model's reply is not a usable analysis."""
+
+
+def analysis_messages(text):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": (
+            "Analyze the following English sentence and give the feedback in Korean.\n"
+            + SCHEMA_INSTRUCTIONS + "\n\nSentence: " + json.dumps(text, ensure_ascii=False)
+        )}
+    ]
+
+
+def batch_analysis_messages(texts):
+    """Chat messages that analyze a list of sentences in one request."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": (
+            "Analyze each English sentence in the JSON array below and give the feedback in Korean.\n"
+            + SCHEMA_INSTRUCTIONS.replace("Reply with exactly one JSON object", "Describe each sentence with one JSON object")
+            + '\n\nReply with only a JSON object {"analyses": [...]} holding one such object per sentence, '
+            "in the same order and with the same number of items.\n\nSentences: "
+            + json.dumps(texts, ensure_ascii=False)
+        )}
+    ]
+
+
+def parse_analysis(content):
+    """Parse a complete reply, tolerating code fences or text around the object."""
+    start, end = content.find("{"), content.rfind("}")
+    try:
+        analysis = json.loads(content[start:end + 1]) if start != -1 else None
+    except ValueError as e:
+        raise GrammarAnalysisError(f"unparseable analysis: {e}") from e
+    if not isinstance(analysis, dict) or "corrected" not in analysis:
+        raise GrammarAnalysisError("analysis is missing required keys")
+    return {section: analysis.get(section) for section in SECTIONS}
+
+
+def parse_batch_analyses(content, expected):
+    """Extract the analyses list from a batched reply."""
+    start, end = content.find("{"), content.rfind("}")
+    try:
+        analyses = json.loads(content[start:end + 1])["analyses"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise GrammarAnalysisError(f"unparseable batch reply: {e}") from e
+    if not isinstance(analyses, list):
+        raise GrammarAnalysisError(f"expected a list of analyses, got {type(analyses).__name__}")
+    if len(analyses) != expected:
+        raise GrammarAnalysisError(f"expected {expected} analyses, got {len(analyses)}")
+    return [parse_analysis(json.dumps(analysis)) for analysis in analyses]
+
+
+class SectionStreamParser:
+    """
+    Incremental parser for a streamed JSON object: `feed()` takes text
+    deltas and returns the (key, value) pairs of top-level members that
+    completed in them, so each section can be shown as soon as the model
+    has finished writing it.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, delta):
+        self._text += delta
+        completed = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._key_start = None
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._key_start = i
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete(text[self._value_start:i] if self._value_start is not None else None, completed)
+            elif self._depth == 1:
+                if char == ":" and self._value_start is None:
+                    self._value_start = i + 1
+                elif char == "," and self._value_start is not None:
+                    self._complete(text[self._value_start:i], completed)
+        self._pos = len(text)
+        return completed
+
+    def _complete(self, raw, completed):
+        if raw is not None and self._key is not None:
+            try:
+                completed.append((self._key, json.loads(raw)))
+            except ValueError:
+                pass
+        self._key = None
+        self._value_start = None
+
+
+class GrammarAnalyzer:
+    """
+    Structured grammar analysis with a cache keyed by normalized sentence.
+
+    `stream()` yields (section, value) pairs as the model completes them,
+    or all sections at once on a cache hit; `analyze()` returns the whole
+    analysis dict. Analyses are kept in a TranslationCache (memory LRU +
+    SQLite), so `prewarm()`ed sentences are served instantly, also after a
+    restart. The model for each call comes from `router` (task "grammar").
+    """
+
+    def __init__(self, client, cache=None, router=None, model=GRAMMAR_MODEL):
+        self.client = client
+        self.model = model
+        self.router = router or ModelRouter()
+        self.cache = cache if cache is not None else TranslationCache(path=DEFAULT_GRAMMAR_CACHE_PATH)
+
+    def _cache_args(self, text):
+        return (text, "en", "grammar", self.model, GRAMMAR_PROMPT_VERSION)
+
+    def cached(self, text):
+        cached = self.cache.get(*self._cache_args(text))
+        return json.loads(cached) if cached is not None else None
+
+    def _store(self, text, analysis):
+        self.cache.put(*self._cache_args(text), json.dumps(analysis, ensure_ascii=False))
+
+    def _complete(self, messages, text):
+        route = self.router.choose("grammar", text)
+        with self.router.timed(route, text):
+            response = self.client.chat.completions.create(model=route.model, messages=messages)
+        return response.choices[0].message.content
+
+    def analyze(self, text):
+        analysis = self.cached(text)
+        if analysis is None:
+            analysis = parse_analysis(self._complete(analysis_messages(text), text))
+            self._store(text, analysis)
+        return analysis
+
+    def analyze_many(self, texts):
+        """
+        Analyses for `texts`, in order. Uncached sentences go upstream in one
+        batched request; if the batched reply does not line up with its
+        inputs they are analyzed one by one instead.
+        """
+        analyses = {text: self.cached(text) for text in texts}
+        missing = [text for text, analysis in analyses.items() if analysis is None]
+        if len(missing) == 1:
+            analyses[missing[0]] = self.analyze(missing[0])
+        elif missing:
+            content = self._complete(batch_analysis_messages(missing), " ".join(missing))
+            try:
+                results = parse_batch_analyses(content, len(missing))
+            except GrammarAnalysisError:
+                results = [self.analyze(text) for text in missing]
+            for text, analysis in zip(missing, results):
+                self._store(text, analysis)
+                analyses[text] = analysis
+        return [analyses[text] for text in texts]
+
+    def stream(self, text):
+        analysis = self.cached(text)
+        if analysis is not None:
+            yield from analysis.items()
+            return
+
+        route = self.router.choose("grammar", text)
+        parser = SectionStreamParser()
+        parts = []
+        with self.router.timed(route, text):
+            stream = self.client.chat.completions.create(model=route.model, messages=analysis_messages(text), stream=True)
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    for section, value in parser.feed(delta):
+                        if section in SECTIONS:
+                            yield section, value
+        # Only cache replies that parse as a whole
+        self._store(text, parse_analysis("".join(parts)))
+
+    def prewarm(self, sentences, max_workers=4):
+        """Analyze the uncached `sentences` in a background thread pool; returns the thread."""
+        missing = [sentence for sentence in sentences if self.cached(sentence) is None]
+
+        def run():
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for sentence in missing:
+                    executor.submit(self.analyze, sentence)
+
+        thread = threading.Thread(target=run, name="grammar-prewarm", daemon=True)
+        thread.start()
+        return thread
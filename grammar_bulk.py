@@ -0,0 +1,265 @@
+"""
+Bulk grammar checking for essays and batches of student submissions.
+
+    python grammar_bulk.py essays/*.txt submissions.csv --output results.jsonl \
+        --concurrency 8 --batch-size 5
+
+Input files are split into sentences and deduplicated; sentences are sent
+to the model in batches by a bounded worker pool with retries, and every
+finished sentence is appended to the output (JSONL or CSV, by extension or
+--format) right away. Rerunning with the same output file skips sentences
+that are already in it, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+# Before the project imports: their defaults (e.g. cache paths) read the environment
+load_dotenv()
+
+from grammar_analysis import GrammarAnalyzer
+from translation_cache import normalize_text
+from tts import split_sentences
+
+CSV_FIELDS = ("sentence", "sources", "score", "corrected", "errors", "analysis")
+
+
+def read_submission(name, data):
+    """Text of one input file; for CSV, the `text` column or else the first column of each row."""
+    text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    if not name.lower().endswith(".csv"):
+        return text
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return ""
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "text" in header:
+        column = header.index("text")
+        rows = rows[1:]
+    else:
+        column = 0
+    return "\n".join(row[column] for row in rows if len(row) > column)
+
+
+def collect_sentences(submissions):
+    """
+    Unique sentences across `submissions` ({source name: text}), in first-seen
+    order, each with the list of sources it appeared in.
+    """
+    sentences = {}
+    for source, text in submissions.items():
+        for sentence in split_sentences(text):
+            key = normalize_text(sentence)
+            entry = sentences.setdefault(key, {"sentence": sentence, "sources": []})
+            if source not in entry["sources"]:
+                entry["sources"].append(source)
+    return list(sentences.values())
+
+
+def output_format(path, fmt=None):
+    return fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+
+
+def complete_csv_row(row):
+    """Whether a CSV result row has every field and its analysis JSON is intact (not cut short by a crash)."""
+    if any(row.get(field) is None for field in CSV_FIELDS):
+        return False
+    try:
+        json.loads(row["analysis"])
+    except ValueError:
+        return False
+    return True
+
+
+def completed_sentences(path, fmt=None):
+    """Normalized sentences already written to `path` by an earlier run."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, newline="", encoding="utf-8") as f:
+        if output_format(path, fmt) == "csv":
+            records = []
+            try:
+                # A row cut short by a crash is redone
+                records.extend(row for row in csv.DictReader(f) if complete_csv_row(row))
+            except csv.Error:
+                # An unterminated quote at the end of the file
+                pass
+        else:
+            records = []
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash is redone
+                    continue
+        for record in records:
+            if record.get("sentence"):
+                done.add(normalize_text(record["sentence"]))
+    return done
+
+
+class ResultWriter:
+    """Appends one record per finished sentence and flushes it immediately."""
+
+    def __init__(self, path, fmt=None):
+        self.format = output_format(path, fmt)
+        if os.path.exists(path):
+            # A record cut short by a crash is not counted as done; drop it before appending
+            self._drop_partial_record(path)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._csv = None
+        if self.format == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+            if new_file:
+                self._csv.writeheader()
+
+    @staticmethod
+    def _drop_partial_record(path, block=65536):
+        """Truncate `path` after its last newline, reading backwards from the end."""
+        with open(path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - block)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+
+    def write(self, entry, analysis):
+        if self._csv is not None:
+            self._csv.writerow({
+                "sentence": entry["sentence"],
+                "sources": ";".join(entry["sources"]),
+                "score": analysis.get("score"),
+                "corrected": analysis.get("corrected"),
+                "errors": json.dumps(analysis.get("errors") or [], ensure_ascii=False),
+                "analysis": json.dumps(analysis, ensure_ascii=False),
+            })
+        else:
+            self._file.write(json.dumps({**entry, **analysis}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def analyze_with_retry(analyzer, sentences, retries=3, backoff=1.0):
+    """`analyzer.analyze_many` with exponential backoff and jitter between attempts."""
+    for attempt in range(retries + 1):
+        try:
+            return analyzer.analyze_many(sentences)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def run_bulk(analyzer, entries, output, fmt=None, concurrency=4, batch_size=5, retries=3,
+             on_progress=None, stop=None):
+    """
+    Analyzes `entries` (from collect_sentences) into `output`, skipping those
+    already there. At most `concurrency` batches are in flight at a time.
+    `on_progress(done, total)` is called after every batch; setting the
+    `stop` event lets in-flight batches finish and then returns.
+    """
+    done = completed_sentences(output, fmt)
+    pending = [entry for entry in entries if normalize_text(entry["sentence"]) not in done]
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    summary = {"total": len(entries), "skipped": len(entries) - len(pending), "analyzed": 0, "failed": 0}
+    writer = ResultWriter(output, fmt)
+    progress = summary["skipped"]
+    if on_progress is not None:
+        on_progress(progress, summary["total"])
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            queued = iter(batches)
+            in_flight = {}
+
+            def submit_next():
+                batch = next(queued, None)
+                if batch is not None and not (stop is not None and stop.is_set()):
+                    future = executor.submit(analyze_with_retry, analyzer, [e["sentence"] for e in batch], retries)
+                    in_flight[future] = batch
+
+            # Bounded submission keeps memory flat for very large inputs
+            for _ in range(concurrency):
+                submit_next()
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    try:
+                        analyses = future.result()
+                    except Exception as e:
+                        summary["failed"] += len(batch)
+                        print(f"batch of {len(batch)} failed: {e}", file=sys.stderr)
+                    else:
+                        for entry, analysis in zip(batch, analyses):
+                            writer.write(entry, analysis)
+                        summary["analyzed"] += len(batch)
+                    progress += len(batch)
+                    if on_progress is not None:
+                        on_progress(progress, summary["total"])
+                    submit_next()
+    finally:
+        writer.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="text or CSV files ('-' for stdin)")
+    parser.add_argument("--output", required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="output format (default: by extension)")
+    parser.add_argument("--concurrency", type=int, default=4, help="batches in flight at once")
+    parser.add_argument("--batch-size", type=int, default=5, help="sentences per request")
+    parser.add_argument("--retries", type=int, default=3, help="retries per batch")
+    args = parser.parse_args()
+
+    # Only the CLI needs the SDK; the grammar page imports this module for its helpers
+    from openai import OpenAI
+
+    submissions = {}
+    for path in args.inputs:
+        if path == "-":
+            submissions["stdin"] = sys.stdin.read()
+        else:
+            with open(path, "rb") as f:
+                # The path as given, so files with the same name in different directories stay apart
+                submissions[os.path.normpath(path)] = read_submission(path, f.read())
+    entries = collect_sentences(submissions)
+
+    started = time.perf_counter()
+
+    def report(done, total):
+        print(f"\r{done}/{total} sentences", end="", file=sys.stderr, flush=True)
+
+    analyzer = GrammarAnalyzer(OpenAI())
+    summary = run_bulk(analyzer, entries, args.output, args.format, args.concurrency, args.batch_size,
+                       args.retries, on_progress=report)
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+    print(f"{summary['analyzed']} analyzed, {summary['skipped']} already done, {summary['failed']} failed "
+          f"in {elapsed:.1f}s ({summary['analyzed'] / elapsed if elapsed else 0:.2f} sentences/s)")
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
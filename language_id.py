@@ -0,0 +1,137 @@
+import functools
+import re
+import threading
+
+from langdetect.detector_factory import PROFILES_DIRECTORY, DetectorFactory
+from langdetect.lang_detect_exception import LangDetectException
+
+from translation_cache import normalize_text
+
+DEFAULT_LANGUAGE = "en"
+
+# Language code -> display name used by the pages
+LANGUAGE_NAMES = {
+    'ko': '한국어',
+    'en': '영어',
+    'ja': '일본어',
+    'zh-cn': '중국어',
+    'es': '스페인어',
+    'fr': '프랑스어',
+    'de': '독일어',
+    'ru': '러시아어',
+    'vi': '베트남어',
+    'th': '태국어',
+    'ar': '아랍어',
+    'hi': '힌디어',
+    'pt': '포르투갈어',
+    'it': '이탈리아어'
+}
+
+# Scripts used by exactly one of the languages above decide the language on
+# their own, without running the n-gram detector
+SCRIPT_LANGUAGES = (
+    ("ko", re.compile(r"[ᄀ-ᇿ㄰-㆏가-힣]")),
+    ("ja", re.compile(r"[぀-ヿ]")),
+    ("th", re.compile(r"[฀-๿]")),
+    ("hi", re.compile(r"[ऀ-ॿ]")),
+    ("zh-cn", re.compile(r"[一-鿿]")),
+)
+SCRIPT_CODES = frozenset(code for code, _ in SCRIPT_LANGUAGES)
+LATIN_LETTERS = re.compile(r"[A-Za-zÀ-ɏ]")
+
+
+def language_name(code):
+    return LANGUAGE_NAMES.get(code, code)
+
+
+def hint_language(hint):
+    """Language code for a recognizer locale or Whisper language, e.g. "ko-KR" -> "ko"."""
+    if not hint:
+        return None
+    hint = hint.lower().replace("_", "-")
+    if hint in LANGUAGE_NAMES:
+        return hint
+    return hint.split("-")[0]
+
+
+class LanguageIdentifier:
+    """
+    Deterministic, memoized language identification.
+
+    The langdetect profiles are loaded once, when the identifier is created,
+    into a private factory with a fixed seed, so the same text always gets
+    the same answer. Results are cached per normalized text. Text written
+    mostly in a script that only one supported language uses (Hangul, kana,
+    Thai, ...) is classified by script alone, and a hint from the speech
+    recognizer is trusted whenever the script does not contradict it, so
+    the n-gram detector only runs for unhinted Latin text and for scripts
+    shared by several languages (Cyrillic, Arabic).
+    """
+
+    def __init__(self, cache_size=4096, seed=0):
+        self._factory = DetectorFactory()
+        self._factory.load_profile(PROFILES_DIRECTORY)
+        self._factory.set_seed(seed)
+        # Restrict the detector to the languages the pages know, which keeps
+        # short utterances from landing on e.g. Somali or Macedonian
+        supported = [code for code in LANGUAGE_NAMES if code in self._factory.get_lang_list()]
+        self._prior = {code: 1.0 for code in supported}
+        self._lock = threading.Lock()
+        self._counters = {"script": 0, "hint": 0, "ngram": 0, "failed": 0}
+        self._detect_cached = functools.lru_cache(maxsize=cache_size)(self._detect)
+
+    def warm(self):
+        """Run one detection so the first real request does not pay for lazy setup."""
+        self._ngram("This is a warm-up sentence for the language detector.")
+
+    def detect(self, text, hint=None):
+        """Returns (language code, language name) for `text`."""
+        code = self._detect_cached(normalize_text(text), hint_language(hint))
+        return code, language_name(code)
+
+    def _detect(self, text, hint):
+        script = self._dominant_script(text)
+        if script in SCRIPT_CODES:
+            self._count("script")
+            return script
+        # Only Latin-script hints are checked against Latin text; anything
+        # else (Cyrillic, Arabic, a contradicting hint) goes to the detector
+        if script == "latin" and hint is not None and hint not in SCRIPT_CODES:
+            self._count("hint")
+            return hint
+        return self._ngram(text)
+
+    @staticmethod
+    def _dominant_script(text):
+        """"latin", a code from SCRIPT_LANGUAGES, or None, by which script most letters are in."""
+        best, best_count = None, 0
+        for script, pattern in (("latin", LATIN_LETTERS), *SCRIPT_LANGUAGES):
+            count = len(pattern.findall(text))
+            if count > best_count:
+                best, best_count = script, count
+        return best
+
+    def _ngram(self, text):
+        try:
+            detector = self._factory.create()
+            detector.set_prior_map(self._prior)
+            detector.append(text)
+            code = detector.detect()
+        except LangDetectException:
+            self._count("failed")
+            return DEFAULT_LANGUAGE
+        self._count("ngram")
+        return code
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def stats(self):
+        cache = self._detect_cached.cache_info()
+        return {
+            **self._counters,
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+            "cache_entries": cache.currsize,
+        }
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import re
+import time
+
+from segmentation import pcm_duration, trailing_silence
+from transcoder import TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH
+
+# A committed word ending like this closes the subtitle segment
+SENTENCE_END = re.compile(r"[.!?。！？]$")
+# Whisper's prompt is limited to 224 tokens; the recent context is what helps
+PROMPT_CHARS = 200
+# Buffers with less speech than this are not worth a transcription request
+MIN_VOICED_SECONDS = 0.1
+
+
+def _normalize(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def agreed_prefix(previous, current):
+    """Leading words (text, start, end) of `current` that `previous` also had, ignoring case and punctuation."""
+    count = 0
+    for (old, _, _), (new, _, _) in zip(previous, current):
+        if _normalize(old) != _normalize(new):
+            break
+        count += 1
+    return current[:count]
+
+
+class LiveSubtitleSession:
+    """
+    Incremental transcription of one live audio stream.
+
+    `feed()` appends PCM16 chunks to a rolling buffer. Every `step` seconds
+    the uncommitted part of the buffer (at most `window` seconds) is
+    transcribed again. Words that two consecutive passes agree on are
+    committed and the audio they cover is dropped from the buffer, so later
+    passes only see what is still uncertain. A segment of committed words
+    is finalized on a sentence end, a pause of `pause` seconds or after
+    `max_segment_words` words, and then translated on its own.
+
+    `emit(event)` receives, in order:
+    - "subtitle_partial": `committed` words of the open segment plus the
+      `tentative` words of the last pass, after every pass, and
+      `heard_until`, the stream time the last of those words ends at;
+    - "subtitle_final": the text of a finished segment with its start and
+      end time in the stream;
+    - "subtitle_translation": a finished segment's translation, which can
+      arrive after later partials;
+    - "subtitle_end" once `finish()` has flushed everything.
+
+    `transcribe(pcm, prompt)` returns a list of (word, start, end) with
+    times in seconds from the start of `pcm`; `translate(text)` returns
+    the translated text.
+    """
+
+    def __init__(self, transcribe, translate, emit, step=1.0, window=12.0, pause=0.6, max_segment_words=24,
+                 on_pass=None):
+        self.transcribe = transcribe
+        self.translate = translate
+        self.emit = emit
+        self.step = step
+        self.window = window
+        self.pause = pause
+        self.max_segment_words = max_segment_words
+        # Called with the duration of every transcription pass
+        self.on_pass = on_pass
+        self._buffer = bytearray()
+        # Stream time, in seconds, of the first byte in the buffer
+        self._buffer_start = 0.0
+        self._received = 0
+        self._transcribed = 0
+        self._tentative = []
+        self._segment = []
+        self._segment_id = 0
+        self._context = ""
+        self._translations = set()
+        self._stop = asyncio.Event()
+        self._loop = None
+
+    @classmethod
+    def from_env(cls, transcribe, translate, emit, on_pass=None):
+        return cls(
+            transcribe, translate, emit,
+            step=float(os.getenv("LIVE_STEP_S", "1.0")),
+            window=float(os.getenv("LIVE_WINDOW_S", "12")),
+            pause=float(os.getenv("LIVE_PAUSE_S", "0.6")),
+            max_segment_words=int(os.getenv("LIVE_MAX_SEGMENT_WORDS", "24")),
+            on_pass=on_pass,
+        )
+
+    def feed(self, pcm):
+        self._buffer += pcm
+        self._received += len(pcm)
+        # Upstream may be failing; never hold more than two windows of audio
+        overflow = len(self._buffer) - int(2 * self.window * TARGET_SAMPLE_RATE) * TARGET_SAMPLE_WIDTH
+        if overflow > 0:
+            self._trim(overflow)
+            self._tentative = []
+        if self._loop is None:
+            self._loop = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # Fixed cadence: a slow pass delays the next one, not all later ones
+        next_pass = time.monotonic() + self.step
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), max(0.0, next_pass - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            next_pass += self.step
+            if not self._stop.is_set() and self._received > self._transcribed:
+                await self._pass()
+
+    async def finish(self):
+        """Transcribe and commit whatever is left, wait for the translations, then emit "subtitle_end"."""
+        self._stop.set()
+        if self._loop is not None:
+            await self._loop
+        await self._pass(final=True)
+        if self._translations:
+            await asyncio.gather(*self._translations, return_exceptions=True)
+        await self.emit({"type": "subtitle_end", "segments": self._segment_id})
+
+    def cancel(self):
+        self._stop.set()
+        for task in (self._loop, *self._translations):
+            if task is not None:
+                task.cancel()
+
+    def _trim(self, size):
+        """Drop the first `size` bytes of the buffer."""
+        size -= size % TARGET_SAMPLE_WIDTH
+        del self._buffer[:size]
+        self._buffer_start += size / (TARGET_SAMPLE_RATE * TARGET_SAMPLE_WIDTH)
+
+    async def _pass(self, final=False):
+        self._transcribed = self._received
+        # The newest `window` seconds; feed() may trim the buffer while the
+        # pass awaits, so its stream time is taken now
+        skipped = max(0, len(self._buffer) - int(self.window * TARGET_SAMPLE_RATE) * TARGET_SAMPLE_WIDTH)
+        pcm = bytes(self._buffer[skipped:])
+        pcm_start = self._buffer_start + skipped / (TARGET_SAMPLE_RATE * TARGET_SAMPLE_WIDTH)
+        duration = pcm_duration(pcm)
+        silence = trailing_silence(pcm)
+        hypothesis = []
+        if duration - silence >= MIN_VOICED_SECONDS:
+            started = time.perf_counter()
+            try:
+                words = await self.transcribe(pcm, self._context[-PROMPT_CHARS:])
+            except Exception as e:
+                # Keep the audio; the next pass tries again
+                await self.emit({"type": "error", "segment_id": self._segment_id, "message": str(e)})
+                return
+            if self.on_pass is not None:
+                self.on_pass(time.perf_counter() - started)
+            hypothesis = [(word, pcm_start + start, pcm_start + end) for word, start, end in words]
+        elif duration > self.pause:
+            # Only silence: keep a pause's worth so a word starting now is not cut
+            self._trim(len(self._buffer) - int(self.pause * TARGET_SAMPLE_RATE) * TARGET_SAMPLE_WIDTH)
+
+        if final:
+            stable = hypothesis
+        else:
+            stable = agreed_prefix(self._tentative, hypothesis)
+            if not stable and duration >= self.window:
+                # No agreement within a whole window; commit all but the last words
+                stable = hypothesis[:max(1, len(hypothesis) - 2)]
+        self._tentative = hypothesis[len(stable):]
+        for word in stable:
+            if self._segment and word[1] - self._segment[-1][2] >= self.pause:
+                await self._finalize()
+            self._segment.append(word)
+            if SENTENCE_END.search(word[0]) or len(self._segment) >= self.max_segment_words:
+                await self._finalize()
+        if stable:
+            self._context += " " + " ".join(word for word, _, _ in stable)
+            cut = int((stable[-1][2] - self._buffer_start) * TARGET_SAMPLE_RATE) * TARGET_SAMPLE_WIDTH
+            self._trim(min(max(cut, 0), len(self._buffer)))
+
+        if self._segment and (
+            final
+            or (not self._tentative and silence >= self.pause)
+            or (self._tentative and self._tentative[0][1] - self._segment[-1][2] >= self.pause)
+        ):
+            await self._finalize()
+        if not final:
+            await self.emit({
+                "type": "subtitle_partial",
+                "segment_id": self._segment_id,
+                "committed": " ".join(word for word, _, _ in self._segment),
+                "tentative": " ".join(word for word, _, _ in self._tentative),
+                "heard_until": round(max((end for _, _, end in self._segment + self._tentative), default=0.0), 2),
+            })
+
+    async def _finalize(self):
+        segment_id = self._segment_id
+        text = " ".join(word for word, _, _ in self._segment)
+        await self.emit({
+            "type": "subtitle_final",
+            "segment_id": segment_id,
+            "text": text,
+            "start": round(self._segment[0][1], 2),
+            "end": round(self._segment[-1][2], 2),
+        })
+        self._segment = []
+        self._segment_id += 1
+        task = asyncio.create_task(self._translate(segment_id, text))
+        self._translations.add(task)
+        task.add_done_callback(self._translations.discard)
+
+    async def _translate(self, segment_id, text):
+        try:
+            translated = await self.translate(text)
+        except Exception as e:
+            await self.emit({"type": "error", "segment_id": segment_id, "message": str(e)})
+            return
+        await self.emit({"type": "subtitle_translation", "segment_id": segment_id, "translated": translated})
@@ -0,0 +1,196 @@
+"""
+Local stand-in for the OpenAI endpoints used by server.py, for load tests
+that must not touch the network or spend API credit.
+
+    python loadtest/fake_openai.py --port 8100 \
+        --transcribe-latency lognormal:600,0.4 --chat-latency lognormal:900,0.5 \
+        --token-delay 25 --error-rate 0.01 --stall-rate 0.01
+
+Then start the server with OPENAI_API_BASE=http://127.0.0.1:8100/v1.
+
+Latency specs are `fixed:MS`, `uniform:LOW_MS,HIGH_MS` or
+`lognormal:MEDIAN_MS,SIGMA`.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import random
+import time
+import wave
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def parse_latency(spec):
+    """Turn a latency spec into a function returning a delay in seconds."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(0, sigma) * median / 1000
+    raise argparse.ArgumentTypeError(f"unknown latency spec: {spec}")
+
+
+def audio_frames(data):
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            return wav.readframes(wav.getnframes()), wav.getframerate()
+    except (wave.Error, EOFError):
+        return data, 16000
+
+
+def timed_words(data, words_per_second):
+    """
+    Deterministic words for verbose_json replies: one per fully heard,
+    non-silent 1/words_per_second span, named after the span's audio, so
+    re-transcribing a window that starts on a word boundary repeats them.
+    """
+    frames, rate = audio_frames(data)
+    span = int(rate / words_per_second) * 2
+    words = []
+    for i in range(len(frames) // span):
+        chunk = frames[i * span:(i + 1) * span]
+        if set(chunk[1::2]) - {0, 255}:
+            # Low-level noise leaves the high byte of every sample at 0 or 255
+            words.append({
+                "word": "w" + hashlib.blake2b(chunk, digest_size=3).hexdigest(),
+                "start": i * span / 2 / rate,
+                "end": (i + 1) * span / 2 / rate,
+            })
+    return words
+
+
+def audio_seconds(data):
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        return len(data) / 32000
+
+
+def create_app(config):
+    app = FastAPI()
+    stats = {"transcriptions": 0, "chat_completions": 0, "errors": 0, "stalls": 0}
+
+    async def injected_stall():
+        # A stuck request: no answer for a long time, as seen in real tail latency
+        if random.random() < config.stall_rate:
+            stats["stalls"] += 1
+            await asyncio.sleep(config.stall_ms / 1000)
+
+    def injected_error():
+        if random.random() < config.error_rate:
+            stats["errors"] += 1
+            status = random.choice((429, 500, 503))
+            return JSONResponse(
+                {"error": {"message": f"injected {status}", "type": "fake_error", "code": status}},
+                status_code=status
+            )
+        return None
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": model, "object": "model"} for model in ("gpt-4", "whisper-1")]}
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        audio = await form["file"].read()
+        await injected_stall()
+        await asyncio.sleep(config.transcribe_latency())
+        error = injected_error()
+        if error is not None:
+            return error
+        stats["transcriptions"] += 1
+        if form.get("response_format") == "verbose_json":
+            words = timed_words(audio, config.words_per_second)
+            return {"text": " ".join(word["word"] for word in words), "duration": audio_seconds(audio), "words": words}
+        seconds = audio_seconds(audio)
+        words = max(1, int(seconds * config.words_per_second))
+        # Repeated transcripts exercise the translation cache; the rest are unique
+        prefix = "word" if random.random() < config.repeat_rate else f"u{stats['transcriptions']}w"
+        return {"text": " ".join(f"{prefix}{i}" for i in range(words))}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await injected_stall()
+        error = injected_error()
+        if error is not None:
+            await asyncio.sleep(config.chat_latency())
+            return error
+        stats["chat_completions"] += 1
+        prompt = body["messages"][-1]["content"]
+        if "JSON array" in body["messages"][0]["content"]:
+            content = json.dumps({"translations": [f"[t] {text}" for text in json.loads(prompt)]})
+        else:
+            content = f"[t] {prompt}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.chat_latency())
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(content.split()), "total_tokens": 0},
+            }
+
+        async def events():
+            # Time to first token, then one chunk per word
+            await asyncio.sleep(config.chat_latency())
+            for i, word in enumerate(content.split(" ")):
+                if i:
+                    await asyncio.sleep(config.token_delay / 1000)
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def read_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--transcribe-latency", type=parse_latency, default="lognormal:600,0.4")
+    parser.add_argument("--chat-latency", type=parse_latency, default="lognormal:800,0.5",
+                        help="full response time, or time to first token when streaming")
+    parser.add_argument("--token-delay", type=float, default=25, help="ms between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of requests that hang first")
+    parser.add_argument("--stall-ms", type=float, default=10000, help="how long a stalled request hangs")
+    parser.add_argument("--words-per-second", type=float, default=2.5, help="transcript length per audio second")
+    parser.add_argument("--repeat-rate", type=float, default=0.0,
+                        help="fraction of transcripts that repeat earlier ones of the same length")
+    parser.add_argument("--seed", type=int)
+    config = parser.parse_args()
+    if config.seed is not None:
+        random.seed(config.seed)
+    uvicorn.run(create_app(config), host=config.host, port=config.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Load generator for the /ws/{client_id} endpoint.
+
+Opens N concurrent WebSocket connections, replays a corpus of audio clips on
+each and reports p50/p95/p99 latency (end to end, time to transcription,
+time to first translated token and the per-stage timings reported by the
+server), messages per second and peak memory.
+
+Fully offline run (starts loadtest/fake_openai.py and server.py itself):
+
+    python loadtest/load_generator.py --spawn --connections 20 --clips 10
+
+Live subtitle mode (--live) streams each clip in real time as PCM16 chunks
+and reports how far captions lag behind the audio:
+
+    python loadtest/load_generator.py --spawn --live --connections 4 --clips 3
+
+Against an already running server:
+
+    python loadtest/load_generator.py --url ws://127.0.0.1:8000 --corpus clips/
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+import wave
+
+import numpy as np
+import websockets
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from transcoder import PCM_FORMAT  # noqa: E402
+from ws_protocol import encode_audio_frame  # noqa: E402
+
+
+def synthetic_clip(seconds, sample_rate=16000, seed=0):
+    """WAV clip of tone bursts separated by short pauses, roughly like speech."""
+    rng = np.random.default_rng(seed)
+    parts = []
+    remaining = seconds
+    while remaining > 0:
+        burst = min(remaining, rng.uniform(1.0, 3.0))
+        t = np.arange(int(burst * sample_rate)) / sample_rate
+        parts.append((np.sin(2 * np.pi * rng.uniform(120, 300) * t) * 6000).astype(np.int16))
+        pause = min(max(remaining - burst, 0), rng.uniform(0.4, 0.9))
+        parts.append(rng.normal(0, 40, int(pause * sample_rate)).astype(np.int16))
+        remaining -= burst + pause
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.concatenate(parts).tobytes())
+    return buffer.getvalue()
+
+
+def load_corpus(path, synthetic_lengths):
+    if path:
+        clips = []
+        for name in sorted(os.listdir(path)):
+            with open(os.path.join(path, name), "rb") as f:
+                clips.append(f.read())
+        if not clips:
+            raise SystemExit(f"no clips found in {path}")
+        return clips
+    return [synthetic_clip(seconds, seed=i) for i, seconds in enumerate(synthetic_lengths)]
+
+
+def percentiles(values):
+    if not values:
+        return {"n": 0}
+    array = np.asarray(values)
+    return {
+        "n": len(values),
+        "p50": float(np.percentile(array, 50)),
+        "p95": float(np.percentile(array, 95)),
+        "p99": float(np.percentile(array, 99)),
+        "max": float(array.max()),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.messages = 0
+        self.completed = 0
+        self.errors = {}
+
+    def add(self, metric, value_ms):
+        self.samples.setdefault(metric, []).append(value_ms)
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+async def run_connection(args, clips, offset, recorder):
+    url = f"{args.url}/ws/load-{uuid.uuid4().hex[:8]}"
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            for seq in range(args.clips):
+                clip = clips[(offset + seq) % len(clips)]
+                sent = time.perf_counter()
+                await ws.send(encode_audio_frame(clip, seq=seq, target_lang=args.target_lang, stream=args.stream))
+                first_token = None
+                while True:
+                    message = json.loads(await asyncio.wait_for(ws.recv(), args.timeout))
+                    recorder.messages += 1
+                    elapsed = (time.perf_counter() - sent) * 1000
+                    kind = message.get("type")
+                    if kind == "transcription":
+                        recorder.add("time_to_transcription_ms", elapsed)
+                    elif kind == "translation_delta" and first_token is None:
+                        first_token = elapsed
+                        recorder.add("time_to_first_token_ms", elapsed)
+                    elif kind == "dropped":
+                        recorder.error("dropped")
+                        break
+                    elif kind == "error":
+                        recorder.error("error")
+                        break
+                    elif kind == "busy":
+                        recorder.error(f"busy_{message.get('reason')}")
+                        if "utterance_id" not in message:
+                            # Connection refused; the server closes it
+                            return
+                        break
+                    elif kind in ("final", None):
+                        recorder.add("end_to_end_ms", elapsed)
+                        for stage, value in (message.get("timings") or {}).items():
+                            recorder.add(f"server_{stage}", value)
+                        recorder.completed += 1
+                        break
+                if args.think_time:
+                    await asyncio.sleep(args.think_time / 1000)
+    except asyncio.TimeoutError:
+        recorder.error("timeout")
+    except websockets.ConnectionClosed:
+        recorder.error("connection_closed")
+    except OSError:
+        recorder.error("connect_failed")
+
+
+def clip_pcm(clip):
+    with wave.open(io.BytesIO(clip), "rb") as wav:
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+async def stream_live_clip(ws, pcm, rate, args, started):
+    """Send `pcm` in chunk_ms chunks, each when its audio would have been fully spoken."""
+    chunk_bytes = int(rate * args.chunk_ms / 1000) * 2
+    for i, offset in enumerate(range(0, len(pcm), chunk_bytes)):
+        await asyncio.sleep(max(0.0, started + (offset + chunk_bytes) / 2 / rate - time.perf_counter()))
+        await ws.send(encode_audio_frame(pcm[offset:offset + chunk_bytes], seq=i, target_lang=args.target_lang,
+                                         fmt=PCM_FORMAT, live=True))
+    await ws.send(encode_audio_frame(b"", target_lang=args.target_lang, fmt=PCM_FORMAT, live=True, end=True))
+    return time.perf_counter()
+
+
+async def run_live_connection(args, clips, offset, recorder):
+    url = f"{args.url}/ws/live-{uuid.uuid4().hex[:8]}"
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            for seq in range(args.clips):
+                pcm, rate = clip_pcm(clips[(offset + seq) % len(clips)])
+                started = time.perf_counter()
+                sender = asyncio.create_task(stream_live_clip(ws, pcm, rate, args, started))
+                segment_ends = {}
+                try:
+                    while True:
+                        message = json.loads(await asyncio.wait_for(ws.recv(), args.timeout))
+                        recorder.messages += 1
+                        now = time.perf_counter()
+                        kind = message.get("type")
+                        # Lag: how long after the audio was spoken it shows up
+                        if kind == "subtitle_partial" and message["heard_until"]:
+                            recorder.add("partial_lag_ms", (now - started - message["heard_until"]) * 1000)
+                        elif kind == "subtitle_final":
+                            segment_ends[message["segment_id"]] = message["end"]
+                            recorder.add("final_lag_ms", (now - started - message["end"]) * 1000)
+                        elif kind == "subtitle_translation":
+                            end = segment_ends.get(message["segment_id"], 0.0)
+                            recorder.add("translation_lag_ms", (now - started - end) * 1000)
+                        elif kind in ("error", "busy"):
+                            recorder.error(f"{kind}_{message.get('reason', 'live')}")
+                        elif kind == "subtitle_end":
+                            recorder.add("flush_ms", (now - await sender) * 1000)
+                            recorder.completed += 1
+                            break
+                finally:
+                    sender.cancel()
+    except asyncio.TimeoutError:
+        recorder.error("timeout")
+    except websockets.ConnectionClosed:
+        recorder.error("connection_closed")
+    except OSError:
+        recorder.error("connect_failed")
+
+
+def peak_rss_bytes(pid=None):
+    """High-water RSS of `pid` (Linux /proc) or of this process."""
+    if pid is not None:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def wait_for_http(url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout}s")
+
+
+def spawn_stack(args):
+    """Start the fake OpenAI server and server.py pointed at it."""
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(REPO_DIR, "loadtest", "fake_openai.py"),
+        "--port", str(args.fake_port), *args.fake_args.split(),
+    ])
+    # Every store starts empty, so runs neither reuse nor pollute the repo's .cache
+    state_dir = tempfile.mkdtemp(prefix="loadtest-")
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="sk-fake",
+        OPENAI_API_BASE=f"http://127.0.0.1:{args.fake_port}/v1",
+        TRANSLATION_CACHE_PATH=os.path.join(state_dir, "cache.sqlite3"),
+        TRANSLATION_MEMORY_PATH=os.path.join(state_dir, "memory.sqlite3"),
+        TRANSCRIPT_STORE_PATH=os.path.join(state_dir, "transcripts.sqlite3"),
+        SUMMARY_CACHE_PATH=os.path.join(state_dir, "summaries.sqlite3"),
+        GRAMMAR_CACHE_PATH=os.path.join(state_dir, "grammar.sqlite3"),
+        STATE_STORE_PATH=os.path.join(state_dir, "state.sqlite3"),
+    )
+    if args.server_workers > 1:
+        env["WEB_CONCURRENCY"] = str(args.server_workers)
+        env["STATE_STORE"] = "sqlite://" + env["STATE_STORE_PATH"]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.server_port), "--log-level", "warning",
+         "--workers", str(args.server_workers)],
+        cwd=REPO_DIR,
+        env=env,
+    )
+    wait_for_http(f"http://127.0.0.1:{args.fake_port}/v1/models")
+    wait_for_http(f"http://127.0.0.1:{args.server_port}/stats")
+    args.url = f"ws://127.0.0.1:{args.server_port}"
+    return fake, server
+
+
+async def run(args, clips):
+    recorder = Recorder()
+    started = time.perf_counter()
+    run_one = run_live_connection if args.live else run_connection
+    await asyncio.gather(*(run_one(args, clips, i, recorder) for i in range(args.connections)))
+    return recorder, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--clips", type=int, default=5, help="clips sent per connection")
+    parser.add_argument("--corpus", help="directory of audio clips (default: synthetic WAV clips)")
+    parser.add_argument("--synthetic-lengths", default="2,4,6,12", help="seconds per synthetic clip")
+    parser.add_argument("--target-lang", default="ko")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="request single result messages")
+    parser.add_argument("--live", action="store_true", help="stream clips in real time as live subtitle sessions")
+    parser.add_argument("--chunk-ms", type=float, default=250, help="audio per chunk in --live mode")
+    parser.add_argument("--think-time", type=float, default=0, help="ms to wait between clips on a connection")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for a result")
+    parser.add_argument("--spawn", action="store_true", help="start fake_openai.py and server.py locally")
+    parser.add_argument("--fake-port", type=int, default=8100)
+    parser.add_argument("--server-port", type=int, default=8001)
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes for --spawn")
+    parser.add_argument("--fake-args", default="", help="extra arguments for fake_openai.py")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    clips = load_corpus(args.corpus, [float(s) for s in args.synthetic_lengths.split(",")])
+    processes = spawn_stack(args) if args.spawn else ()
+    try:
+        recorder, elapsed = asyncio.run(run(args, clips))
+        server_rss = peak_rss_bytes(processes[1].pid) if processes else None
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "connections": args.connections,
+        "clips_sent": args.connections * args.clips,
+        "completed": recorder.completed,
+        "errors": recorder.errors,
+        "elapsed_s": elapsed,
+        "clips_per_s": recorder.completed / elapsed,
+        "messages_per_s": recorder.messages / elapsed,
+        "latency": {metric: percentiles(values) for metric, values in sorted(recorder.samples.items())},
+        "peak_rss_bytes": {"load_generator": peak_rss_bytes(), "server": server_rss},
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['completed']}/{report['clips_sent']} clips in {elapsed:.1f}s over {args.connections} connections")
+    print(f"{report['clips_per_s']:.2f} clips/s, {report['messages_per_s']:.1f} messages/s, errors: {recorder.errors or 'none'}")
+    print(f"{'metric':<28} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for metric, stats in report["latency"].items():
+        print(f"{metric:<28} {stats['n']:>6} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f} {stats['max']:>9.1f}")
+    for name, rss in report["peak_rss_bytes"].items():
+        if rss is not None:
+            print(f"peak RSS {name}: {rss / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+# Stage latencies span sub-millisecond fast-path decodes to multi-second API calls
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "translator_stage_seconds",
+    "Time spent in each processing stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+AUDIO_SECONDS = Counter(
+    "translator_audio_seconds_total",
+    "Seconds of decoded audio processed",
+)
+BYTES_RECEIVED = Counter(
+    "translator_received_bytes_total",
+    "WebSocket payload bytes received from clients",
+)
+BYTES_SENT = Counter(
+    "translator_sent_bytes_total",
+    "WebSocket payload bytes sent to clients",
+)
+ACTIVE_CONNECTIONS = Gauge(
+    "translator_active_connections",
+    "Open WebSocket connections",
+)
+IN_FLIGHT = Gauge(
+    "translator_in_flight_requests",
+    "Audio jobs received but not yet answered",
+)
+ROUTE_SECONDS = Histogram(
+    "translator_model_route_seconds",
+    "Latency of model calls by task, route and model",
+    ["task", "route", "model", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+ERRORS = Counter(
+    "translator_errors_total",
+    "Errors by stage and exception type",
+    ["stage", "type"],
+)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def observe_route(route, seconds, ok):
+    ROUTE_SECONDS.labels(
+        task=route.task, route=route.name, model=route.model, outcome="ok" if ok else "error"
+    ).observe(seconds)
+
+
+def count_error(stage, error):
+    ERRORS.labels(stage=stage, type=type(error).__name__).inc()
+
+
+class ComponentStatsCollector:
+    """
+    Exposes the numeric entries of components' `stats()` dicts as gauges,
+    e.g. `translator_transcoder_queue_depth`.
+    """
+
+    def __init__(self, components):
+        # name -> zero-argument callable returning a stats dict (or None)
+        self.components = components
+
+    def collect(self):
+        for component, read_stats in self.components.items():
+            stats = read_stats() or {}
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauge = GaugeMetricFamily(f"translator_{component}_{key}", f"{component} {key}")
+                    gauge.add_metric([], value)
+                    yield gauge
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+def _env_list(name, default):
+    return tuple(item.strip() for item in os.getenv(name, default).split(",") if item.strip())
+
+
+@dataclass(frozen=True)
+class Route:
+    task: str
+    name: str
+    model: str
+    reason: str
+
+
+@dataclass
+class RouterConfig:
+    fast_model: str = "gpt-4o-mini"
+    strong_model: str = "gpt-4"
+    # Inputs up to both limits count as short
+    short_chars: int = 120
+    short_words: int = 20
+    # "source-target" pairs the fast model handles well; "*" matches any language
+    fast_pairs: tuple = ("*-en", "*-ko", "en-*", "ko-*")
+    # Per-task override: "fast", "strong" or "auto" (decide by length and pair)
+    task_routes: tuple = ("translate=auto", "grammar=strong", "summarize=fast")
+    # Optional JSONL file that gets one line per routed call, for tuning
+    log_path: str = ""
+
+    @classmethod
+    def from_env(cls):
+        """ROUTER_* settings, read when called so values loaded from .env after import still apply."""
+        return cls(
+            fast_model=os.getenv("ROUTER_FAST_MODEL", cls.fast_model),
+            strong_model=os.getenv("ROUTER_STRONG_MODEL", cls.strong_model),
+            short_chars=int(os.getenv("ROUTER_SHORT_CHARS", str(cls.short_chars))),
+            short_words=int(os.getenv("ROUTER_SHORT_WORDS", str(cls.short_words))),
+            fast_pairs=_env_list("ROUTER_FAST_PAIRS", ",".join(cls.fast_pairs)),
+            task_routes=_env_list("ROUTER_TASK_ROUTES", ",".join(cls.task_routes)),
+            log_path=os.getenv("ROUTER_LOG_PATH", cls.log_path),
+        )
+
+
+class ModelRouter:
+    """
+    Picks a model per request from the task, input length and language pair.
+
+    Tasks routed "auto" send short inputs in a known-good language pair to
+    the fast model and everything else (long inputs, pairs outside
+    `fast_pairs`) to the strong one. `timed(route, text)` measures a call
+    and records it in `stats()`, in the optional `on_record(route, seconds,
+    ok)` callback and, if configured, in a JSONL log.
+    """
+
+    def __init__(self, config=None, on_record=None):
+        self.config = config or RouterConfig.from_env()
+        self.on_record = on_record
+        self._task_routes = dict(item.split("=", 1) for item in self.config.task_routes)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def choose(self, task, text="", source_lang=None, target_lang=None):
+        mode = self._task_routes.get(task, "auto")
+        if mode in ("fast", "strong"):
+            return self._route(task, mode, f"task:{task}")
+        if len(text) > self.config.short_chars or len(text.split()) > self.config.short_words:
+            return self._route(task, "strong", "long")
+        if not self._fast_pair(source_lang, target_lang):
+            return self._route(task, "strong", f"pair:{source_lang or 'auto'}-{target_lang}")
+        return self._route(task, "fast", "short")
+
+    def _route(self, task, name, reason):
+        model = self.config.fast_model if name == "fast" else self.config.strong_model
+        return Route(task, name, model, reason)
+
+    def _fast_pair(self, source_lang, target_lang):
+        if target_lang is None:
+            return True
+        for pair in self.config.fast_pairs:
+            source, _, target = pair.partition("-")
+            # An unknown ("auto") source only matches wildcard pairs
+            if source in ("*", source_lang) and target in ("*", target_lang):
+                return True
+        return False
+
+    @contextmanager
+    def timed(self, route, text=""):
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(route, time.perf_counter() - started, ok, len(text))
+
+    def record(self, route, seconds, ok=True, chars=0):
+        with self._lock:
+            entry = self._stats.setdefault((route.task, route.name), {"calls": 0, "errors": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["errors"] += 0 if ok else 1
+            entry["seconds"] += seconds
+            if self.config.log_path:
+                with open(self.config.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({
+                        "ts": time.time(),
+                        "task": route.task,
+                        "route": route.name,
+                        "model": route.model,
+                        "reason": route.reason,
+                        "chars": chars,
+                        "seconds": round(seconds, 4),
+                        "ok": ok,
+                    }) + "\n")
+        if self.on_record is not None:
+            self.on_record(route, seconds, ok)
+
+    def stats(self):
+        stats = {}
+        with self._lock:
+            for (task, name), entry in self._stats.items():
+                prefix = f"{task}_{name}"
+                stats[f"{prefix}_calls"] = entry["calls"]
+                stats[f"{prefix}_errors"] = entry["errors"]
+                stats[f"{prefix}_latency_ms_avg"] = entry["seconds"] / entry["calls"] * 1000
+        return stats
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from openai import AsyncOpenAI
+
+
+def create_async_client(api_key=None, base_url=None):
+    """
+    One long-lived AsyncOpenAI client per process, backed by a pooled
+    keep-alive httpx client so connections and TLS sessions are reused.
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60")),
+    )
+    return AsyncOpenAI(
+        api_key=api_key or os.getenv("OPENAI_API_KEY"),
+        # OPENAI_API_BASE is kept for setups written against the legacy SDK
+        base_url=base_url or os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE"),
+        # Retries are left to resilience.ResilientCaller, which also hedges and
+        # keeps the circuit breaker informed
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "0")),
+        http_client=httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0, connect=5.0)),
+    )
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; `acquire` waits for one."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _CallLimit:
+    def __init__(self, max_in_flight, rate_per_second):
+        self.max_in_flight = max_in_flight
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.bucket = TokenBucket(rate_per_second) if rate_per_second > 0 else None
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.total_wait = 0.0
+
+
+class CallGovernor:
+    """
+    Process-wide limits on upstream calls, kept separately per kind of call
+    (e.g. "transcribe" and "chat"). A call first takes a token from the
+    kind's rate bucket, if it has one, then one of its in-flight slots, so a
+    burst queues here instead of turning into 429s upstream.
+    """
+
+    def __init__(self, limits):
+        # kind -> (max in-flight calls, calls per second or 0 for no rate limit)
+        self._limits = {kind: _CallLimit(*limit) for kind, limit in limits.items()}
+
+    @asynccontextmanager
+    async def slot(self, kind):
+        limit = self._limits[kind]
+        limit.waiting += 1
+        started = time.perf_counter()
+        try:
+            if limit.bucket is not None:
+                await limit.bucket.acquire()
+            await limit.semaphore.acquire()
+        finally:
+            limit.waiting -= 1
+        limit.total_wait += time.perf_counter() - started
+        limit.calls += 1
+        limit.in_flight += 1
+        try:
+            yield
+        finally:
+            limit.in_flight -= 1
+            limit.semaphore.release()
+
+    def stats(self):
+        stats = {}
+        for kind, limit in self._limits.items():
+            stats[f"{kind}_max_in_flight"] = limit.max_in_flight
+            stats[f"{kind}_in_flight"] = limit.in_flight
+            stats[f"{kind}_waiting"] = limit.waiting
+            stats[f"{kind}_calls"] = limit.calls
+            stats[f"{kind}_wait_ms_avg"] = limit.total_wait / limit.calls * 1000 if limit.calls else 0.0
+        return stats
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EngineBusy(Exception):
+    """Raised when the engine already has `max_queued` jobs waiting."""
+
+
+class Job:
+    """
+    One piece of page work running on a PageEngine.
+
+    The worker reports through `update(**fields)` (latest value wins, e.g.
+    the current stage) and `emit(item)` (appended in order, e.g. sections of
+    a streamed answer); the page reads them with `snapshot()` and
+    `events(start)`. `status` goes "queued" -> "running" -> "done" or
+    "failed" (with `error` set).
+    """
+
+    def __init__(self, kind, owner=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._fields = {}
+        self._events = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def update(self, **fields):
+        with self._lock:
+            self._fields.update(fields)
+
+    def emit(self, item):
+        with self._lock:
+            self._events.append(item)
+
+    def snapshot(self):
+        """The fields set with `update()` so far, as a new dict."""
+        with self._lock:
+            return dict(self._fields)
+
+    def events(self, start=0):
+        """Items emitted from index `start` on."""
+        with self._lock:
+            return self._events[start:]
+
+
+class PageEngine:
+    """
+    Shared worker pool that runs the Streamlit pages' slow calls (speech
+    recognition, translation, TTS, grammar analysis) off the script thread.
+
+    A page submits work with `submit()`, keeps only the job id in session
+    state and renders the job's progress on each rerun (e.g. from a
+    fragment polling `get()`), so a script run never waits on an API call
+    and Streamlit's threads stay free for other sessions. At most
+    `max_workers` jobs run at once and `max_queued` wait; beyond that
+    `submit()` raises EngineBusy. Finished jobs are forgotten after
+    `retention` seconds.
+    """
+
+    def __init__(self, max_workers=16, max_queued=64, retention=600.0):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="page-engine")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._counters = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0, "job_ms_total": 0.0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_workers=int(os.getenv("PAGE_ENGINE_WORKERS", "16")),
+            max_queued=int(os.getenv("PAGE_ENGINE_MAX_QUEUED", "64")),
+            retention=float(os.getenv("PAGE_ENGINE_RETENTION_S", "600")),
+        )
+
+    def submit(self, kind, func, *args, owner=None):
+        """Run `func(job, *args)` on a worker; its return value becomes `job.result`."""
+        job = Job(kind, owner)
+        with self._lock:
+            self._forget_finished()
+            if self._queued >= self.max_queued:
+                self._counters["rejected"] += 1
+                raise EngineBusy(f"page engine queue is full ({self.max_queued} waiting)")
+            self._queued += 1
+            self._counters["submitted"] += 1
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        job.status = "running"
+        started = time.perf_counter()
+        try:
+            job.result = func(job, *args)
+            status = "done"
+        except Exception as e:
+            job.error = e
+            status = "failed"
+        # Before the status: a finished job must already have its finish time
+        # when another thread's _forget_finished sees it
+        job.finished_at = time.time()
+        job.status = status
+        with self._lock:
+            self._running -= 1
+            self._counters[job.status] += 1
+            self._counters["job_ms_total"] += (time.perf_counter() - started) * 1000
+
+    def _forget_finished(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """The job with `job_id`, or None if it is unknown or was forgotten."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            finished = self._counters["done"] + self._counters["failed"]
+            return {
+                **{key: value for key, value in self._counters.items() if key != "job_ms_total"},
+                "queued": self._queued,
+                "running": self._running,
+                "jobs": len(self._jobs),
+                "job_ms_avg": self._counters["job_ms_total"] / finished if finished else 0.0,
+            }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def shared_engine():
+    """The process-wide engine (PAGE_ENGINE_* settings), shared by every page and session."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PageEngine.from_env()
+        return _engine
@@ -1,9 +1,17 @@
 import streamlit as st
-import speech_recognition as sr
-from openai import OpenAI
 import os
+import hashlib
 from dotenv import load_dotenv
 
+# .env 파일 로드 (프로젝트 모듈의 기본값이 import 시점에 환경 변수를 읽으므로 먼저 실행)
+load_dotenv()
+
+from model_router import ModelRouter
+from grammar_analysis import SECTIONS, GrammarAnalyzer
+from grammar_bulk import collect_sentences, read_submission, run_bulk
+from startup import check_api_key, preload_modules
+from page_engine import EngineBusy, shared_engine
+
 # Streamlit 페이지 설정을 가장 먼저 실행
 st.set_page_config(
     page_title="English Grammar Checker",
@@ -11,28 +19,53 @@ st.set_page_config(
     layout="centered"
 )
 
-# .env 파일 로드
-load_dotenv()
+@st.cache_resource
+def get_preloaded_modules():
+    """
+    API 키 입력을 기다리는 동안 무거운 모듈(OpenAI SDK, 음성 인식)을 백그라운드에서 미리 import
+    """
+    return preload_modules("openai", "speech_recognition")
+
+# 첫 화면을 막지 않도록 페이지 시작 시 백그라운드에서 미리 로드
+get_preloaded_modules()
 
 # 세션 상태 초기화
 if "openai_api_key" not in st.session_state:
     st.session_state.openai_api_key = os.getenv("OPENAI_API_KEY", "")
 if "is_api_key_valid" not in st.session_state:
     st.session_state.is_api_key_valid = False
+# 백그라운드 엔진에서 처리 중인 작업 ID와 끝난 작업의 결과
+if "grammar_job" not in st.session_state:
+    st.session_state.grammar_job = None
+if "analysis" not in st.session_state:
+    st.session_state.analysis = None
+if "bulk_result" not in st.session_state:
+    st.session_state.bulk_result = None
+if "job_messages" not in st.session_state:
+    st.session_state.job_messages = []
+
+@st.cache_resource
+def get_openai_client(api_key):
+    """
+    API 키별로 OpenAI 클라이언트를 한 번만 생성해서 재실행 간에 연결 풀을 재사용하는 함수
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+@st.cache_resource
+def get_model_router():
+    """
+    작업/입력 길이/언어 쌍에 따라 모델을 고르는 라우터 (ROUTER_* 환경 변수로 설정)
+    """
+    return ModelRouter()
 
 def validate_api_key(api_key):
     """
     OpenAI API 키의 유효성을 검사하는 함수
     """
     try:
-        client = OpenAI(api_key=api_key)
-        # 간단한 API 호출로 키 검증
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": "test"}],
-            max_tokens=5
-        )
-        return True
+        # 토큰을 쓰지 않는 모델 목록 조회로 검증하고, 결과는 키별로 캐시됨
+        return check_api_key(get_openai_client(api_key))
     except Exception as e:
         return False
 
@@ -69,7 +102,8 @@ if not api_key_input:
     st.stop()
 
 if api_key_input:
-    if api_key_input != st.session_state.openai_api_key:
+    # 환경 변수로 받은 키도 처음 한 번은 검증 (검증 결과는 캐시되므로 재실행 비용 없음)
+    if api_key_input != st.session_state.openai_api_key or not st.session_state.is_api_key_valid:
         st.session_state.openai_api_key = api_key_input
         st.session_state.is_api_key_valid = validate_api_key(api_key_input)
         if st.session_state.is_api_key_valid:
@@ -84,91 +118,29 @@ if not st.session_state.is_api_key_valid:
     st.error("유효한 OpenAI API 키를 입력해주세요.")
     st.stop()
 
-# OpenAI 클라이언트 초기화
-client = OpenAI(api_key=st.session_state.openai_api_key)
-
-def recognize_speech():
+def recognize_speech(job):
     """
-    음성을 텍스트로 변환하는 함수
+    음성을 텍스트로 변환하는 작업 (진행 상황은 job의 stage로 표시)
     """
+    import speech_recognition as sr
+
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
-        st.info("🎤 말씀해 주세요... (마이크 조정 중)")
+        job.update(stage="🎤 말씀해 주세요... (마이크 조정 중)")
         recognizer.adjust_for_ambient_noise(source)
-        st.info("🎤 이제 말씀하세요!")
+        job.update(stage="🎤 이제 말씀하세요!")
         audio = recognizer.listen(source, timeout=20)
-        st.info("✨ 음성 처리 중...")
+        job.update(stage="✨ 음성 처리 중...")
 
     try:
         # 영어로 인식
         text = recognizer.recognize_google(audio, language="en-US")
         return text
     except sr.UnknownValueError:
-        st.error("❌ 음성을 인식하지 못했습니다.")
+        job.emit(("error", "❌ 음성을 인식하지 못했습니다."))
         return None
     except sr.RequestError:
-        st.error("❌ 음성 인식 서비스에 문제가 있습니다.")
-        return None
-
-def analyze_grammar(text):
-    """
-    GPT-4를 사용하여 문법을 분석하고 교정하는 함수
-    """
-    prompt = f"""Please analyze the following English sentence and provide the feedback in Korean:
-1. 문법 평가 점수 (100점 만점)
-2. 발견된 오류 (있는 경우)
-3. 수정된 문장
-4. 수정 내용 설명
-5. 학습할 어휘
-6. 예문
-7. 관련 학습 자료
-8. 작문 스타일 제안
-
-분석할 문장: "{text}"
-
-응답은 다음과 같은 형식으로 작성해주세요:
-
-문법 평가: [점수]/100
-
-발견된 오류:
-- [오류 설명]
-
-수정된 문장:
-"[수정된 영문]"
-
-상세 설명:
-[문법 오류와 수정 사항에 대한 자세한 설명]
-
-학습할 어휘:
-- [단어/표현]: [의미]
-- 난이도: [초급/중급/고급]
-- 유의어/반의어: [관련 단어들]
-
-예문:
-1. [예문 1]
-2. [예문 2]
-3. [예문 3]
-
-관련 학습 자료:
-- YouTube 영상: [추천 영상 링크]
-- 온라인 학습 자료: [관련 웹사이트 링크]
-- 추천 책/교재: [도서명]
-
-작문 스타일 제안:
-- [개선을 위한 제안사항]
-"""
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "당신은 전문 영어 교사이자 문법 검사기입니다. 문법 교정뿐만 아니라 어휘 학습과 관련 자료도 제공하여 종합적인 영어 학습이 가능하도록 한국어로 상세하고 건설적인 피드백을 제공해주세요."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        st.error(f"분석 중 오류가 발생했습니다: {str(e)}")
+        job.emit(("error", "❌ 음성 인식 서비스에 문제가 있습니다."))
         return None
 
 # 예제 문장 리스트
@@ -185,6 +157,127 @@ EXAMPLE_SENTENCES = [
     "I am interesting in learning English.",  # 형용사/분사 오류
 ]
 
+# 분석 결과 섹션 제목 (grammar_analysis.SECTIONS 순서)
+SECTION_TITLES = {
+    "score": "문법 평가",
+    "errors": "발견된 오류",
+    "corrected": "수정된 문장",
+    "explanation": "상세 설명",
+    "vocabulary": "학습할 어휘",
+    "examples": "예문",
+    "resources": "관련 학습 자료",
+    "style": "작문 스타일 제안",
+}
+
+@st.cache_resource
+def get_grammar_analyzer(api_key):
+    """
+    API 키별로 하나만 생성되는 문법 분석기
+    예제 문장은 백그라운드에서 미리 분석해서 캐시에 저장해 둠
+    """
+    analyzer = GrammarAnalyzer(get_openai_client(api_key), router=get_model_router())
+    analyzer.prewarm(EXAMPLE_SENTENCES)
+    return analyzer
+
+# 문법 분석기 (재실행마다 새로 만들지 않고 캐시된 분석기 사용)
+analyzer = get_grammar_analyzer(st.session_state.openai_api_key)
+
+def render_section(section, value):
+    """
+    분석 결과의 한 섹션을 화면에 표시하는 함수
+    """
+    st.markdown(f"#### {SECTION_TITLES[section]}")
+    if section == "score":
+        st.metric("문법 점수", f"{value}/100")
+    elif section == "errors":
+        if not value:
+            st.success("발견된 오류가 없습니다.")
+        for error in value or []:
+            st.markdown(f"- **{error.get('error', '')}**: {error.get('explanation', '')}")
+    elif section == "corrected":
+        st.success(value)
+    elif section == "vocabulary":
+        for item in value or []:
+            related = ", ".join(item.get("related") or [])
+            st.markdown(f"- **{item.get('term', '')}**: {item.get('meaning', '')} ({item.get('level', '')})"
+                        + (f" · 유의어/반의어: {related}" if related else ""))
+    elif section == "examples":
+        for i, example in enumerate(value or [], 1):
+            st.markdown(f"{i}. {example}")
+    elif isinstance(value, list):
+        for item in value:
+            st.markdown(f"- {item}")
+    else:
+        st.write(value)
+
+def render_analysis(analysis):
+    """
+    분석 결과의 섹션들을 정해진 순서대로 화면에 표시하는 함수
+    """
+    for section in SECTIONS:
+        if section in analysis:
+            render_section(section, analysis[section])
+
+def analyze_grammar(job, analyzer, text):
+    """
+    문법을 분석하는 작업: 섹션이 생성되는 대로 job.update로 전달해서 페이지가 바로 표시
+    (같은 문장은 캐시된 결과가 한 번에 전달됨)
+    """
+    analysis = {}
+    for section, value in analyzer.stream(text):
+        analysis[section] = value
+        job.update(analysis=dict(analysis))
+    return analysis
+
+def submit_job(kind, func, *args):
+    """
+    공유 백그라운드 엔진에 작업을 제출하고 작업 ID를 세션 상태에 저장하는 함수
+    """
+    try:
+        job = shared_engine().submit(kind, func, *args)
+    except EngineBusy:
+        st.warning("요청이 많아 잠시 후 다시 시도해주세요.")
+        return
+    st.session_state.grammar_job = job.id
+    st.session_state.job_messages = []
+
+@st.fragment(run_every=0.3)
+def poll_job():
+    """
+    진행 중인 작업을 주기적으로 확인해서 중간 결과를 표시하고,
+    끝나면 결과와 메시지를 세션 상태에 반영한 뒤 페이지 전체를 다시 실행하는 함수
+    """
+    job = shared_engine().get(st.session_state.grammar_job)
+    if job is None or job.finished:
+        st.session_state.grammar_job = None
+        if job is not None:
+            apply_result(job)
+        st.rerun()
+    snapshot = job.snapshot()
+    if job.kind == "analyze":
+        st.markdown("### 분석 결과")
+        render_analysis(snapshot.get("analysis", {}))
+        st.info("✍️ 분석 중...")
+    elif job.kind == "bulk":
+        done, total = snapshot.get("done", 0), snapshot.get("total", 0)
+        st.progress(done / total if total else 0.0, text=f"{done}/{total} 문장 검사 완료")
+    else:
+        st.info(snapshot.get("stage", "⏳ 처리 대기 중..."))
+
+def apply_result(job):
+    """
+    끝난 작업의 결과와 메시지를 세션 상태에 반영하는 함수
+    """
+    st.session_state.job_messages = job.events()
+    if job.status == "failed":
+        st.session_state.job_messages.append(("error", f"처리 중 오류가 발생했습니다: {job.error}"))
+    elif job.kind == "record" and job.result:
+        st.session_state.input_text = job.result
+    elif job.kind == "analyze":
+        st.session_state.analysis = job.result
+    elif job.kind == "bulk":
+        st.session_state.bulk_result = job.result
+
 st.markdown("""
     ### 영어 문법 검사기
     말하거나 입력한 영어 문장의 문법을 검사하고 개선 방안을 제시합니다.
@@ -202,14 +295,42 @@ st.markdown("""
 # 입력 방식 선택
 input_method = st.radio(
     "입력 방식을 선택하세요:",
-    ["음성 입력", "텍스트 입력", "예제 문장 선택"]
+    ["음성 입력", "텍스트 입력", "예제 문장 선택", "파일 일괄 검사"]
 )
 
+# 결과 파일을 저장할 디렉터리 (같은 파일을 다시 올리면 중단된 지점부터 이어서 검사)
+BULK_RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), ".cache", "bulk")
+
+def run_bulk_check(job, analyzer, files, concurrency):
+    """
+    업로드된 에세이/제출물 파일(이름, 내용)의 모든 문장을 일괄 검사하는 작업
+    """
+    submissions = {}
+    for name, data in files:
+        # 이름이 같은 파일을 여러 개 올려도 덮어쓰지 않도록 번호를 붙임
+        source, copy = name, 1
+        while source in submissions:
+            copy += 1
+            source = f"{name} ({copy})"
+        submissions[source] = read_submission(name, data)
+    entries = collect_sentences(submissions)
+    digest = hashlib.sha256()
+    for name in sorted(submissions):
+        digest.update(name.encode("utf-8") + b"\0" + submissions[name].encode("utf-8"))
+    os.makedirs(BULK_RESULTS_DIR, exist_ok=True)
+    output = os.path.join(BULK_RESULTS_DIR, f"{digest.hexdigest()[:16]}.jsonl")
+
+    def report(done, total):
+        job.update(done=done, total=total)
+
+    summary = run_bulk(analyzer, entries, output, concurrency=concurrency, on_progress=report)
+    return summary, output
+
+job_running = st.session_state.grammar_job is not None
+
 if input_method == "음성 입력":
-    if st.button("🎤 음성 녹음 시작", key="record"):
-        input_text = recognize_speech()
-        if input_text:
-            st.session_state.input_text = input_text
+    if st.button("🎤 음성 녹음 시작", key="record", disabled=job_running):
+        submit_job("record", recognize_speech)
 elif input_method == "예제 문장 선택":
     selected_example = st.selectbox(
         "분석할 예제 문장을 선택하세요:",
@@ -223,13 +344,49 @@ else:
     if input_text:
         st.session_state.input_text = input_text
 
+if input_method == "파일 일괄 검사":
+    uploaded_files = st.file_uploader(
+        "에세이 또는 제출물 파일을 올려주세요 (txt, csv)",
+        type=["txt", "csv"],
+        accept_multiple_files=True
+    )
+    concurrency = st.slider("동시 요청 수", min_value=1, max_value=16, value=4)
+    if st.button("일괄 검사 시작", type="primary", disabled=not uploaded_files or job_running):
+        # 업로드 객체 대신 내용을 넘겨서 작업이 스크립트 재실행과 무관하게 진행되도록 함
+        files = [(file.name, file.getvalue()) for file in uploaded_files]
+        st.session_state.bulk_result = None
+        submit_job("bulk", run_bulk_check, analyzer, files, concurrency)
+    for level, message in st.session_state.job_messages:
+        getattr(st, level)(message)
+    if st.session_state.grammar_job is not None:
+        poll_job()
+    elif st.session_state.bulk_result:
+        summary, output = st.session_state.bulk_result
+        st.success(
+            f"총 {summary['total']}개 문장 중 {summary['analyzed']}개 검사, "
+            f"{summary['skipped']}개는 이전 결과 재사용"
+        )
+        if summary["failed"]:
+            st.warning(f"{summary['failed']}개 문장은 검사하지 못했습니다. 다시 실행하면 해당 문장만 재시도합니다.")
+        with open(output, "rb") as f:
+            st.download_button("결과 다운로드 (JSONL)", f.read(), file_name="grammar_results.jsonl",
+                               mime="application/jsonl")
+    st.stop()
+
 # 분석 버튼
-if st.button("문법 분석하기", type="primary"):
+if st.button("문법 분석하기", type="primary", disabled=job_running):
     if "input_text" in st.session_state and st.session_state.input_text:
-        with st.spinner("문법을 분석하고 있습니다..."):
-            analysis = analyze_grammar(st.session_state.input_text)
-            if analysis:
-                st.markdown("### 분석 결과")
-                st.write(analysis)
+        st.session_state.analysis = None
+        submit_job("analyze", analyze_grammar, analyzer, st.session_state.input_text)
     else:
-        st.warning("분석할 텍스트를 입력해주세요.")
\ No newline at end of file
+        st.warning("분석할 텍스트를 입력해주세요.")
+
+for level, message in st.session_state.job_messages:
+    getattr(st, level)(message)
+
+if st.session_state.grammar_job is not None:
+    # 작업이 끝날 때까지 이 부분만 주기적으로 다시 그림 (스크립트 스레드는 기다리지 않음)
+    poll_job()
+elif st.session_state.analysis:
+    st.markdown("### 분석 결과")
+    render_analysis(st.session_state.analysis)
\ No newline at end of file
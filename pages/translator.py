@@ -1,15 +1,27 @@
 import streamlit as st
-import speech_recognition as sr
+import asyncio
 import json
 import threading
 import os
-from gtts import gTTS
-import pygame
+import sqlite3
 import time
-from openai import OpenAI
-import langdetect
+import uuid
 from dotenv import load_dotenv
 
+# .env 파일 로드 (프로젝트 모듈의 기본값이 import 시점에 환경 변수를 읽으므로 먼저 실행)
+load_dotenv()
+
+from model_router import ModelRouter
+from translation_cache import TranslationCache
+from transcript_store import TranscriptStore
+from summarizer import DEFAULT_SUMMARY_CACHE_PATH, Summarizer, transcript_lines
+from language_id import LanguageIdentifier
+from tts import TTSEngine
+from recognition import NoiseCalibration, recognize_best
+from resilience import CircuitOpen, ResilientCaller
+from startup import check_api_key, preload, preload_modules
+from page_engine import EngineBusy, shared_engine
+
 # Streamlit 페이지 설정을 가장 먼저 실행
 st.set_page_config(
     page_title="Catch Up AI Translator",
@@ -17,8 +29,29 @@ st.set_page_config(
     layout="centered"
 )
 
-# .env 파일 로드
-load_dotenv()
+@st.cache_resource
+def get_preloaded_modules():
+    """
+    API 키 입력을 기다리는 동안 무거운 모듈(OpenAI SDK, 음성 인식, 번역 메모리)을 백그라운드에서 미리 import
+    """
+    return preload_modules("openai", "speech_recognition", "translation_memory")
+
+@st.cache_resource
+def get_language_identifier():
+    """
+    프로세스당 한 번만 언어 프로필을 로드하고 미리 워밍업한 언어 감지기
+    로드는 백그라운드에서 진행되고, 사용하는 쪽에서 .result()로 완료를 기다림
+    """
+    def load():
+        identifier = LanguageIdentifier()
+        identifier.warm()
+        return identifier
+
+    return preload(load, "language-profiles")
+
+# 첫 화면을 막지 않도록 페이지 시작 시 백그라운드에서 미리 로드
+get_preloaded_modules()
+get_language_identifier()
 
 # 세션 상태 초기화
 if "openai_api_key" not in st.session_state:
@@ -29,24 +62,49 @@ if "input_text" not in st.session_state:
     st.session_state.input_text = ""
 if "output_text" not in st.session_state:
     st.session_state.output_text = ""
-if "audio_file" not in st.session_state:
-    st.session_state.audio_file = None
+if "audio_bytes" not in st.session_state:
+    st.session_state.audio_bytes = None
 if "detected_language" not in st.session_state:
     st.session_state.detected_language = None
+if "detected_language_name" not in st.session_state:
+    st.session_state.detected_language_name = None
+if "noise_calibration" not in st.session_state:
+    st.session_state.noise_calibration = NoiseCalibration()
+if "transcript_session" not in st.session_state:
+    st.session_state.transcript_session = uuid.uuid4().hex
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = ""
+# 백그라운드 엔진에서 처리 중인 작업 ID와 끝난 작업이 남긴 메시지
+if "translation_job" not in st.session_state:
+    st.session_state.translation_job = None
+if "summary_job" not in st.session_state:
+    st.session_state.summary_job = None
+if "job_messages" not in st.session_state:
+    st.session_state.job_messages = []
+
+@st.cache_resource
+def get_openai_client(api_key):
+    """
+    API 키별로 OpenAI 클라이언트를 한 번만 생성해서 재실행 간에 연결 풀을 재사용하는 함수
+    재시도는 get_upstream_caller가 담당하므로 SDK 자체 재시도는 끔
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, max_retries=0)
+
+@st.cache_resource
+def get_model_router():
+    """
+    작업/입력 길이/언어 쌍에 따라 모델을 고르는 라우터 (ROUTER_* 환경 변수로 설정)
+    """
+    return ModelRouter()
 
 def validate_api_key(api_key):
     """
     OpenAI API 키의 유효성을 검사하는 함수
     """
     try:
-        client = OpenAI(api_key=api_key)
-        # 간단한 API 호출로 키 검증
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": "test"}],
-            max_tokens=5
-        )
-        return True
+        # 토큰을 쓰지 않는 모델 목록 조회로 검증하고, 결과는 키별로 캐시됨
+        return check_api_key(get_openai_client(api_key))
     except Exception as e:
         return False
 
@@ -83,7 +141,8 @@ if not api_key_input:
     st.stop()
 
 if api_key_input:
-    if api_key_input != st.session_state.openai_api_key:
+    # 환경 변수로 받은 키도 처음 한 번은 검증 (검증 결과는 캐시되므로 재실행 비용 없음)
+    if api_key_input != st.session_state.openai_api_key or not st.session_state.is_api_key_valid:
         st.session_state.openai_api_key = api_key_input
         st.session_state.is_api_key_valid = validate_api_key(api_key_input)
         if st.session_state.is_api_key_valid:
@@ -98,36 +157,81 @@ if not st.session_state.is_api_key_valid:
     st.error("유효한 OpenAI API 키를 입력해주세요.")
     st.stop()
 
-# OpenAI 클라이언트 초기화
-client = OpenAI(api_key=st.session_state.openai_api_key)
+# OpenAI 클라이언트 (재실행마다 새로 만들지 않고 캐시된 클라이언트 사용)
+client = get_openai_client(st.session_state.openai_api_key)
+
+# 번역 프롬프트를 바꾸면 버전을 올려서 이전 캐시를 사용하지 않도록 함
+TRANSLATION_PROMPT_VERSION = "page-v2"
+
+@st.cache_resource
+def get_upstream_caller():
+    """
+    번역 호출에 마감 시간, 지터 재시도, 헤징, 서킷 브레이커를 적용하는 호출기 (CHAT_*, HEDGE_*, BREAKER_* 환경 변수로 설정)
+    """
+    return ResilientCaller.from_env("chat")
+
+@st.cache_resource
+def get_translation_cache():
+    """
+    모든 세션이 공유하는 번역 캐시 (메모리 LRU + SQLite)
+    """
+    return TranslationCache()
+
+@st.cache_resource
+def get_translation_memory():
+    """
+    모든 세션이 공유하는 번역 메모리 (비슷한 문장의 이전 번역 재사용 + 용어집, TM_* 환경 변수로 설정)
+    """
+    from translation_memory import TranslationMemory
+
+    return TranslationMemory.from_env()
+
+@st.cache_resource
+def get_transcript_store():
+    """
+    모든 세션이 공유하는 대화 기록 저장소 (백그라운드에서 모아서 SQLite에 기록)
+    """
+    return TranscriptStore()
+
+@st.cache_resource
+def get_summary_cache():
+    """
+    모든 세션이 공유하는 요약 캐시 (청크/병합 요약을 입력별로 저장해서 기록이 늘어나도 마지막 부분만 다시 요약)
+    """
+    return TranslationCache(path=DEFAULT_SUMMARY_CACHE_PATH)
 
-def detect_language(text):
+@st.cache_resource
+def get_tts_engine():
     """
-    텍스트의 언어를 감지하는 함수
+    모든 세션이 공유하는 메모리 TTS 엔진 (문장 단위 합성 + LRU 캐시)
+    백엔드는 TTS_BACKEND 환경 변수로 선택 (gtts, edge-tts, silent)
+    """
+    return TTSEngine()
+
+def get_services():
+    """
+    백그라운드 작업에 넘길 공유 리소스 모음
+    작업 스레드에서는 st.* 함수를 호출하지 않도록 스크립트 실행 중에 미리 꺼내서 전달
+    """
+    return {
+        "client": client,
+        "router": get_model_router(),
+        "caller": get_upstream_caller(),
+        "cache": get_translation_cache(),
+        "memory": get_translation_memory(),
+        "identifier": get_language_identifier(),
+        "tts": get_tts_engine(),
+        "store": get_transcript_store(),
+        "summary_cache": get_summary_cache(),
+    }
+
+def detect_language(services, text, hint=None):
+    """
+    텍스트의 언어를 감지하는 함수 (결과는 텍스트별로 캐시됨)
+    hint: 음성 인식에 사용된 로케일 (예: "ko-KR")
     Returns language code and language name
     """
-    try:
-        detected = langdetect.detect(text)
-        # 언어 코드와 해당하는 언어 이름을 반환
-        language_names = {
-            'ko': '한국어',
-            'en': '영어',
-            'ja': '일본어',
-            'zh-cn': '중국어',
-            'es': '스페인어',
-            'fr': '프랑스어',
-            'de': '독일어',
-            'ru': '러시아어',
-            'vi': '베트남어',
-            'th': '태국어',
-            'ar': '아랍어',
-            'hi': '힌디어',
-            'pt': '포르투갈어',
-            'it': '이탈리아어'
-        }
-        return detected, language_names.get(detected, detected)
-    except:
-        return "en", "영어"  # 기본값으로 영어 반환
+    return services["identifier"].result().detect(text, hint)
 
 def get_tts_language(lang_code):
     """
@@ -137,86 +241,215 @@ def get_tts_language(lang_code):
         return "ko"
     return "en"
 
-def recognize_speech():
+def recognize_speech(job, services, calibration):
     """
-    음성을 텍스트로 변환하는 함수
+    음성을 텍스트로 변환하는 함수 (진행 상황은 job의 stage로 표시)
+    Returns recognized text and the locale it was recognized with
     """
+    import speech_recognition as sr
+
     recognizer = sr.Recognizer()
+    # 주변 소음 보정값은 세션별로 저장해 두고 일정 시간마다만 다시 측정
     with sr.Microphone() as source:
-        st.info("🎤 말씀해 주세요... (마이크 조정 중)")
-        recognizer.adjust_for_ambient_noise(source)
-        st.info("🎤 이제 말씀하세요!")
+        job.update(stage="🎤 말씀해 주세요... (마이크 조정 중)")
+        calibration.apply(recognizer, source)
+        job.update(stage="🎤 이제 말씀하세요!")
         audio = recognizer.listen(source, timeout=30)  # 녹음 시간을 30초로 설정
-        st.info("✨ 음성 처리 중...")
+        calibration.update(recognizer)
+        job.update(stage="✨ 음성 처리 중...")
 
     try:
-        # 먼저 한국어로 인식 시도
-        try:
-            text = recognizer.recognize_google(audio, language="ko-KR")
-        except:
-            # 한국어 인식 실패 시 영어로 시도
-            text = recognizer.recognize_google(audio, language="en-US")
-        return text
+        # 후보 로케일(기본값: 한국어, 영어)로 동시에 인식하고 가장 적합한 결과 선택
+        candidate = recognize_best(recognizer, audio, identifier=services["identifier"].result())
+        return candidate.text, candidate.locale
     except sr.UnknownValueError:
-        st.error("❌ 음성을 인식하지 못했습니다.")
-        return None
+        job.emit(("error", "❌ 음성을 인식하지 못했습니다."))
+        return None, None
     except sr.RequestError:
-        st.error("❌ 음성 인식 서비스에 문제가 있습니다.")
-        return None
+        job.emit(("error", "❌ 음성 인식 서비스에 문제가 있습니다."))
+        return None, None
 
-def translate_text(text, source_lang):
+def translate_text(services, text, source_lang):
     """
     OpenAI API를 사용하여 텍스트를 번역하는 함수
     """
+    target_lang = "ko" if source_lang == "en" else "en"
+    cache = services["cache"]
+    # 라우터가 고른 모델을 캐시 키에 넣어 빠른/강한 모델의 번역을 따로 캐시
+    router = services["router"]
+    route = router.choose("translate", text, source_lang, target_lang)
+    cache_args = (text, source_lang, target_lang, route.model, TRANSLATION_PROMPT_VERSION)
+    cached = cache.get(*cache_args)
+    if cached is not None:
+        return cached
+
+    from translation_memory import prompt_context
+
+    # 숫자/이름만 다른 비슷한 문장은 이전 번역을 그대로 사용하고, 아니면 가까운 예시와 용어집을 프롬프트에 추가
+    memory = services["memory"]
+    match = memory.lookup(text, source_lang, target_lang)
+    if match.translation is not None:
+        cache.put(*cache_args, match.translation)
+        return match.translation
+    context = prompt_context(match)
+
     if source_lang == "en":
         prompt = f"Translate the following English text to Korean, preserving any proper nouns: '{text}'"
     else:
         prompt = f"Translate the following {source_lang} text to English. The input text is: '{text}'"
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
+
+    with router.timed(route, text):
+        response = services["caller"].call_blocking(lambda: services["client"].chat.completions.create(
+            model=route.model,
             messages=[
-                {"role": "system", "content": "You are a professional translator. Translate the text naturally while preserving the original meaning."},
+                {"role": "system", "content": "You are a professional translator. Translate the text naturally while preserving the original meaning."
+                 + ("\n" + context if context else "")},
                 {"role": "user", "content": prompt}
             ]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        st.error(f"번역 중 오류가 발생했습니다: {str(e)}")
-        return None
+        ))
+    translated_text = response.choices[0].message.content.strip()
+    cache.put(*cache_args, translated_text)
+    memory.add(text, translated_text, source_lang, target_lang)
+    return translated_text
 
-def handle_translation(input_text):
+def run_translation(job, services, session_id, calibration):
     """
-    번역 처리와 음성 변환을 관리하는 함수
+    녹음 → 언어 감지 → 번역 → 음성 변환 → 대화 기록 추가를 백그라운드에서 처리하는 작업
+    중간 결과는 job.update로, 오류/경고 메시지는 job.emit으로 페이지에 전달
     """
-    source_lang, source_lang_name = detect_language(input_text)
-    st.session_state.detected_language = source_lang
-    
+    timings = {}
+    started = time.perf_counter()
+    input_text, hint = recognize_speech(job, services, calibration)
+    if not input_text:
+        return
+    timings["recognize_ms"] = (time.perf_counter() - started) * 1000
+    job.update(input_text=input_text, stage="🔍 언어 감지 중...")
+
+    started = time.perf_counter()
+    source_lang, source_lang_name = detect_language(services, input_text, hint)
+    timings["detect_ms"] = (time.perf_counter() - started) * 1000
+    job.update(detected_language=source_lang, detected_language_name=source_lang_name, stage="🔄 번역 중...")
+
     # 텍스트 번역
-    translated_text = translate_text(input_text, source_lang)
-    if translated_text:
-        st.session_state.output_text = translated_text
-        
-        # 번역된 텍스트를 음성으로 변환
-        target_lang = "ko" if source_lang == "en" else "en"
-        try:
-            tts = gTTS(text=translated_text, lang=get_tts_language(target_lang))
-            audio_file = "output.mp3"
-            tts.save(audio_file)
-            st.session_state.audio_file = audio_file
-        except Exception as e:
-            st.error(f"음성 변환 중 오류가 발생했습니다: {str(e)}")
-
-def play_audio(file_path):
-    """
-    음성 파일 재생 함수
-    """
-    pygame.mixer.init()
-    pygame.mixer.music.load(file_path)
-    pygame.mixer.music.play()
-    while pygame.mixer.music.get_busy():
-        time.sleep(0.1)
+    started = time.perf_counter()
+    try:
+        translated_text = translate_text(services, input_text, source_lang)
+    except CircuitOpen as e:
+        job.emit(("warning", f"번역 서비스에 일시적인 문제가 있습니다. {e.retry_after:.0f}초 후에 다시 시도해주세요."))
+        return
+    except Exception as e:
+        job.emit(("error", f"번역 중 오류가 발생했습니다: {str(e)}"))
+        return
+    timings["translate_ms"] = (time.perf_counter() - started) * 1000
+    job.update(output_text=translated_text, audio_bytes=None, stage="🔊 음성 변환 중...")
+
+    # 번역된 텍스트를 문장 단위로 음성 변환 (파일 없이 메모리에서 처리)
+    started = time.perf_counter()
+    target_lang = "ko" if source_lang == "en" else "en"
+    engine = services["tts"]
+    try:
+        # 첫 문장이 합성되는 즉시 페이지에서 재생할 수 있도록 먼저 전달
+        chunks = []
+        for chunk in engine.stream(translated_text, get_tts_language(target_lang)):
+            if not chunks:
+                job.update(first_audio=chunk)
+            chunks.append(chunk)
+        job.update(audio_bytes=engine.backend.join(chunks))
+    except Exception as e:
+        job.emit(("error", f"음성 변환 중 오류가 발생했습니다: {str(e)}"))
+    timings["tts_ms"] = (time.perf_counter() - started) * 1000
+
+    # 기록은 대기열에만 추가되고 디스크 쓰기는 백그라운드에서 처리
+    services["store"].append(session_id, input_text, translated_text, source_lang, target_lang, timings)
+
+def summarize_history(job, services, session_id):
+    """
+    이 세션의 대화 기록을 청크로 나눠 동시에 요약한 뒤 단계적으로 합치는 작업
+    """
+    router = services["router"]
+
+    async def complete(messages, text):
+        route = router.choose("summarize", text)
+        with router.timed(route, text):
+            response = await services["caller"].call(
+                lambda: asyncio.to_thread(services["client"].chat.completions.create, model=route.model,
+                                          messages=messages)
+            )
+        return response.choices[0].message.content
+
+    # 긴 세션은 가장 최근 기록 20000개를 말한 순서대로 요약
+    entries = services["store"].range(session_id=session_id, limit=20000, newest_first=True)
+    entries.reverse()
+    # 작업마다 이벤트 루프가 새로 만들어지므로 요약기는 매번 만들고 캐시만 공유
+    summarizer = Summarizer.from_env(complete, cache=services["summary_cache"])
+    try:
+        return asyncio.run(summarizer.summarize(transcript_lines(entries)))
+    except CircuitOpen as e:
+        job.emit(("warning", f"요약 서비스에 일시적인 문제가 있습니다. {e.retry_after:.0f}초 후에 다시 시도해주세요."))
+    except Exception as e:
+        job.emit(("error", f"요약 중 오류가 발생했습니다: {str(e)}"))
+    return ""
+
+def submit_job(state_key, kind, func, *args):
+    """
+    공유 백그라운드 엔진에 작업을 제출하고 작업 ID를 세션 상태에 저장하는 함수
+    """
+    try:
+        job = shared_engine().submit(kind, func, *args, owner=st.session_state.transcript_session)
+    except EngineBusy:
+        st.warning("요청이 많아 잠시 후 다시 시도해주세요.")
+        return
+    st.session_state[state_key] = job.id
+    st.session_state.job_messages = []
+
+@st.fragment(run_every=0.3)
+def poll_job(state_key, render_progress, apply_result):
+    """
+    진행 중인 작업을 주기적으로 확인해서 중간 결과를 표시하고,
+    끝나면 결과와 메시지를 세션 상태에 반영한 뒤 페이지 전체를 다시 실행하는 함수
+    """
+    job = shared_engine().get(st.session_state[state_key])
+    if job is None or job.finished:
+        st.session_state[state_key] = None
+        if job is not None:
+            apply_result(job)
+            st.session_state.job_messages = job.events()
+            if job.status == "failed":
+                st.session_state.job_messages.append(("error", f"처리 중 오류가 발생했습니다: {job.error}"))
+        st.rerun()
+    render_progress(job)
+
+def show_translation_progress(job):
+    """
+    번역 작업의 현재 단계와 지금까지 나온 결과를 표시하는 함수
+    """
+    snapshot = job.snapshot()
+    st.info(snapshot.get("stage", "⏳ 처리 대기 중..."))
+    if snapshot.get("input_text"):
+        st.markdown("### 📝 입력된 텍스트")
+        st.info(snapshot["input_text"])
+    if snapshot.get("output_text"):
+        st.markdown("### 🔄 번역된 텍스트")
+        st.success(snapshot["output_text"])
+    if snapshot.get("first_audio"):
+        # 첫 문장 음성은 나머지 문장이 합성되는 동안 바로 재생 가능
+        st.audio(snapshot["first_audio"], format=get_tts_engine().mime)
+
+def apply_translation(job):
+    """
+    끝난 번역 작업의 결과를 세션 상태에 반영하는 함수
+    """
+    snapshot = job.snapshot()
+    for key in ("input_text", "detected_language", "detected_language_name", "output_text", "audio_bytes"):
+        if key in snapshot:
+            st.session_state[key] = snapshot[key]
+
+def apply_summary(job):
+    """
+    끝난 요약 작업의 결과를 세션 상태에 반영하는 함수
+    """
+    if job.result:
+        st.session_state.history_summary = job.result
 
 # Streamlit UI
 st.markdown("""
@@ -228,39 +461,63 @@ st.markdown("""
     - 그 외 언어 → 영어
 """)
 
-col1, col2 = st.columns(2)
-with col1:
-    if st.button("🎤 음성 녹음 시작", key="record"):
-        input_text = recognize_speech()
-        if input_text:
-            st.session_state.input_text = input_text
-            handle_translation(input_text)
-
-with col2:
-    if st.session_state.audio_file and os.path.exists(st.session_state.audio_file):
-        if st.button("🔊 번역 음성 재생", key="play"):
-            play_audio(st.session_state.audio_file)
-
-if st.session_state.input_text:
-    st.markdown("### 📝 입력된 텍스트")
-    st.info(st.session_state.input_text)
-    if st.session_state.detected_language:
-        source_lang, source_lang_name = detect_language(st.session_state.input_text)
-        st.caption(f"감지된 언어: {source_lang_name}")
-
-if st.session_state.output_text:
-    st.markdown("### 🔄 번역된 텍스트")
-    st.success(st.session_state.output_text)
-    target_lang = "한국어" if st.session_state.detected_language == "en" else "영어"
-    st.caption(f"번역된 언어: {target_lang}")
-
-# 오디오 파일 표시
-if st.session_state.audio_file and os.path.exists(st.session_state.audio_file):
-    st.markdown("### 🎵 번역된 음성")
-    with open(st.session_state.audio_file, "rb") as file:
-        st.audio(file.read(), format="audio/mp3")
-
-# 앱 종료 시 오디오 파일 정리
-if st.session_state.audio_file and os.path.exists(st.session_state.audio_file):
-    os.remove(st.session_state.audio_file)
-    st.session_state.audio_file = None
\ No newline at end of file
+if st.button("🎤 음성 녹음 시작", key="record", disabled=st.session_state.translation_job is not None):
+    submit_job("translation_job", "translate", run_translation, get_services(),
+               st.session_state.transcript_session, st.session_state.noise_calibration)
+
+for level, message in st.session_state.job_messages:
+    getattr(st, level)(message)
+
+if st.session_state.translation_job is not None:
+    # 작업이 끝날 때까지 이 부분만 주기적으로 다시 그림 (스크립트 스레드는 기다리지 않음)
+    poll_job("translation_job", show_translation_progress, apply_translation)
+else:
+    if st.session_state.input_text:
+        st.markdown("### 📝 입력된 텍스트")
+        st.info(st.session_state.input_text)
+        if st.session_state.detected_language:
+            st.caption(f"감지된 언어: {st.session_state.detected_language_name}")
+
+    if st.session_state.output_text:
+        st.markdown("### 🔄 번역된 텍스트")
+        st.success(st.session_state.output_text)
+        target_lang = "한국어" if st.session_state.detected_language == "en" else "영어"
+        st.caption(f"번역된 언어: {target_lang}")
+
+    # 번역된 음성은 브라우저에서 재생
+    if st.session_state.audio_bytes:
+        st.markdown("### 🎵 번역된 음성")
+        st.audio(st.session_state.audio_bytes, format=get_tts_engine().mime)
+
+# 대화 기록 (이 세션에서 번역한 내용)
+with st.expander("📚 대화 기록"):
+    store = get_transcript_store()
+    query = st.text_input("기록 검색", key="history_query")
+    try:
+        if query:
+            entries = store.search(query, session_id=st.session_state.transcript_session)
+        else:
+            entries = store.range(session_id=st.session_state.transcript_session, limit=20, newest_first=True)
+    except sqlite3.OperationalError:
+        st.warning("검색어를 이해하지 못했습니다.")
+        entries = []
+    if not entries:
+        st.caption("아직 기록이 없습니다.")
+    for entry in entries:
+        st.markdown(f"**{time.strftime('%H:%M:%S', time.localtime(entry['created_at']))}** {entry['original']}")
+        st.caption(entry["translated"])
+    if entries:
+        st.download_button(
+            "기록 내보내기 (JSONL)",
+            data="".join(store.export(session_id=st.session_state.transcript_session)),
+            file_name="conversation.jsonl",
+            mime="application/x-ndjson"
+        )
+        if st.button("📋 회의/강의 요약", key="summarize_history", disabled=st.session_state.summary_job is not None):
+            submit_job("summary_job", "summarize", summarize_history, get_services(),
+                       st.session_state.transcript_session)
+    if st.session_state.summary_job is not None:
+        poll_job("summary_job", lambda job: st.info("📋 요약 중..."), apply_summary)
+    elif st.session_state.history_summary:
+        st.markdown("#### 📋 요약")
+        st.markdown(st.session_state.history_summary)
@@ -0,0 +1,117 @@
+import asyncio
+
+# What `submit` does when the input queue is full
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+_CLOSE = object()
+
+
+class PipelineStage:
+    def __init__(self, name, handler, concurrency=1):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+
+
+class OrderedPipeline:
+    """
+    Chain of async stages joined by bounded queues.
+
+    Every stage handler receives the item and returns nothing; handlers mutate
+    the item in place. A stage may run up to `concurrency` items at once, but
+    items leave the pipeline in submission order: each queue carries
+    `(item, task)` pairs and the next stage waits for those tasks in FIFO
+    order. `results()` yields the same pairs so the consumer can follow an
+    item that is still in its last stage (for example to stream its output).
+
+    A failed item skips the remaining stages and is yielded with its failed
+    task. When every queue is full, `submit` blocks (`block`), rejects the new
+    item (`drop_newest`) or evicts the oldest waiting item (`drop_oldest`);
+    dropped items are passed to `on_drop`.
+    """
+
+    def __init__(self, stages, queue_size=4, drop_policy="block", on_drop=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {DROP_POLICIES}")
+        self.stages = stages
+        self.drop_policy = drop_policy
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._queues = [asyncio.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self._workers = [
+            asyncio.create_task(self._run_stage(stage, self._queues[i], self._queues[i + 1]))
+            for i, stage in enumerate(stages)
+        ]
+        self._tasks = set()
+        self._closed = False
+
+    async def submit(self, item):
+        """Queue an item; returns False if it was dropped."""
+        inbox = self._queues[0]
+        entry = (item, None)
+        if not inbox.full() or self.drop_policy == "block":
+            await inbox.put(entry)
+            return True
+        if self.drop_policy == "drop_newest":
+            self._drop(item)
+            return False
+        oldest, _ = inbox.get_nowait()
+        self._drop(oldest)
+        inbox.put_nowait(entry)
+        return True
+
+    def _drop(self, item):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    async def _run_stage(self, stage, inbox, outbox):
+        limit = asyncio.Semaphore(stage.concurrency)
+        while True:
+            entry = await inbox.get()
+            if entry is _CLOSE:
+                await outbox.put(_CLOSE)
+                return
+            item, previous = entry
+            if previous is not None:
+                try:
+                    await previous
+                except Exception:
+                    # Keep order: forward the failure without running this stage
+                    await outbox.put(entry)
+                    continue
+            await limit.acquire()
+            task = asyncio.create_task(stage.handler(item))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda _: limit.release())
+            await outbox.put((item, task))
+
+    async def results(self):
+        """Yield `(item, task)` in submission order until the pipeline is closed."""
+        outbox = self._queues[-1]
+        while True:
+            entry = await outbox.get()
+            if entry is _CLOSE:
+                return
+            yield entry
+
+    async def close(self):
+        """Stop accepting items; items already queued still flow to `results()`."""
+        if not self._closed:
+            self._closed = True
+            await self._queues[0].put(_CLOSE)
+
+    def cancel(self):
+        for task in (*self._workers, *self._tasks):
+            task.cancel()
+
+    def stats(self):
+        return {
+            "queue_depths": {
+                stage.name: queue.qsize() for stage, queue in zip(self.stages, self._queues)
+            },
+            "output_depth": self._queues[-1].qsize(),
+            "in_flight": len(self._tasks),
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,100 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from language_id import hint_language
+
+DEFAULT_LOCALES = tuple(os.getenv("RECOGNITION_LOCALES", "ko-KR,en-US").split(","))
+# Google omits the confidence on some results
+DEFAULT_CONFIDENCE = 0.5
+# Added to a candidate whose transcript language ID agrees with its locale
+AGREEMENT_BONUS = 0.5
+
+
+@dataclass
+class RecognitionCandidate:
+    locale: str
+    text: str
+    confidence: Optional[float]
+    agrees: bool = False
+
+    @property
+    def score(self):
+        confidence = self.confidence if self.confidence is not None else DEFAULT_CONFIDENCE
+        return confidence + (AGREEMENT_BONUS if self.agrees else 0.0)
+
+
+def _recognize(recognizer, audio, locale):
+    import speech_recognition as sr
+
+    try:
+        result = recognizer.recognize_google(audio, language=locale, show_all=True)
+    except sr.UnknownValueError:
+        return None
+    # Older SpeechRecognition releases return an empty list instead of raising
+    if not isinstance(result, dict) or not result.get("alternative"):
+        return None
+    best = result["alternative"][0]
+    return RecognitionCandidate(locale, best["transcript"], best.get("confidence"))
+
+
+def recognize_best(recognizer, audio, locales=DEFAULT_LOCALES, identifier=None):
+    """
+    Recognizes the same captured audio in every candidate locale at once and
+    returns the best RecognitionCandidate, by confidence plus agreement
+    between the transcript's detected language and the locale. Earlier
+    locales win ties. Raises sr.UnknownValueError if no locale produced a
+    transcript, or the first sr.RequestError if every request failed.
+    """
+    # Imported here so pages can load this module before the library is needed
+    import speech_recognition as sr
+
+    with ThreadPoolExecutor(max_workers=len(locales)) as executor:
+        futures = [executor.submit(_recognize, recognizer, audio, locale) for locale in locales]
+    candidates, errors = [], []
+    for future in futures:
+        try:
+            candidate = future.result()
+        except sr.RequestError as e:
+            errors.append(e)
+            continue
+        if candidate is not None:
+            candidates.append(candidate)
+    if not candidates:
+        if errors and len(errors) == len(locales):
+            raise errors[0]
+        raise sr.UnknownValueError()
+
+    if identifier is not None:
+        for candidate in candidates:
+            candidate.agrees = identifier.detect(candidate.text)[0] == hint_language(candidate.locale)
+    # max() keeps the first of equal scores, i.e. the earlier locale
+    return max(candidates, key=lambda candidate: candidate.score)
+
+
+class NoiseCalibration:
+    """
+    Remembers a recognizer's calibrated energy threshold so the one-second
+    ambient noise measurement only runs every `max_age` seconds.
+    """
+
+    def __init__(self, max_age=300, duration=1.0):
+        self.max_age = max_age
+        self.duration = duration
+        self.energy_threshold = None
+        self.calibrated_at = 0.0
+
+    def apply(self, recognizer, source):
+        """Calibrates `recognizer` on `source` if the cached threshold is missing or stale."""
+        if self.energy_threshold is None or time.monotonic() - self.calibrated_at > self.max_age:
+            recognizer.adjust_for_ambient_noise(source, duration=self.duration)
+            self.calibrated_at = time.monotonic()
+        else:
+            recognizer.energy_threshold = self.energy_threshold
+        self.energy_threshold = recognizer.energy_threshold
+
+    def update(self, recognizer):
+        """Keeps the threshold the recognizer adapted to while listening."""
+        self.energy_threshold = recognizer.energy_threshold
@@ -0,0 +1,323 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# HTTP statuses worth another attempt: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class CircuitOpen(Exception):
+    """Raised without calling upstream while its circuit breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} upstream unavailable, retry after {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call, including its retries, runs past its deadline."""
+
+
+class QueueTimeout(DeadlineExceeded):
+    """Raised when the deadline passes while a call still waits for its local slot; upstream was never asked."""
+
+
+def is_retryable(error):
+    """Whether `error` says more about upstream health than about the request itself."""
+    # Imported on first use: the SDK takes most of a second to import and
+    # pages load this module before they need it
+    import httpx
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUSES or status >= 500)
+
+
+class LatencyTracker:
+    """Latencies of the most recent successful calls, for quantile estimates."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+
+    def quantile(self, q):
+        """The q-quantile of recent latencies, or None until there are enough samples."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and then
+    fails calls fast for `reset_timeout` seconds. After that one probe call
+    is let through (half-open): success closes the circuit, failure opens
+    it again. A probe that is cancelled proves nothing either way, so
+    `release_probe` just lets the next call probe instead.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.opens = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen, or let the call through; returns True for the half-open probe."""
+        with self._lock:
+            if self.state == "closed":
+                return False
+            retry_after = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and retry_after <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            raise CircuitOpen(self.name, max(retry_after, 0.1))
+
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+def _consume_exception(task):
+    # Losing hedges are cancelled or fail unobserved; keep asyncio from warning about it
+    if not task.cancelled():
+        task.exception()
+
+
+class ResilientCaller:
+    """
+    Deadlines, retries, hedging and circuit breaking for one kind of
+    upstream call (e.g. "transcribe" or "chat").
+
+    `call(factory)` runs `factory()`, a coroutine function making one
+    upstream request, until it succeeds or:
+    - the whole call, retries included, passes `deadline` seconds;
+    - a non-retryable error is raised (see `is_retryable`);
+    - `retries` retries, spaced by jittered exponential backoff, are used up;
+    - the circuit breaker is open (CircuitOpen, without calling upstream).
+
+    Each attempt gets at most `attempt_timeout` seconds. With `hedge`, an
+    attempt still unanswered at the `hedge_quantile` of recent successful
+    latencies starts a duplicate request and the first answer wins; the
+    other one is cancelled. Hedges are capped at `hedge_budget` of all
+    calls so a slow upstream is not hit twice as hard.
+
+    `slot`, if given, returns an async context manager that every request
+    (hedges included) holds while it runs, such as a CallGovernor slot.
+    Latencies, the hedge timer and the attempt timeout start once the slot
+    is held, so time queued locally neither raises the p95, triggers
+    hedges nor counts as an upstream failure; it only uses up `deadline`
+    (QueueTimeout).
+    """
+
+    def __init__(self, name, deadline=30.0, attempt_timeout=None, retries=2, backoff=0.2, max_backoff=2.0,
+                 hedge=True, hedge_quantile=0.95, hedge_budget=0.1, min_hedge_delay=0.05, breaker=None):
+        self.name = name
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.min_hedge_delay = min_hedge_delay
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self._executor = None
+        self._counters = {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                          "attempt_timeouts": 0, "deadline_exceeded": 0, "queue_timeouts": 0, "rejected_open": 0}
+
+    @classmethod
+    def from_env(cls, name):
+        """
+        Settings from {NAME}_DEADLINE_S, {NAME}_ATTEMPT_TIMEOUT_S, {NAME}_RETRIES
+        and {NAME}_HEDGE, plus the shared HEDGE_* and BREAKER_* variables.
+        """
+        prefix = name.upper()
+        # 0 lets one attempt use the whole deadline
+        attempt_timeout = float(os.getenv(f"{prefix}_ATTEMPT_TIMEOUT_S", "10"))
+        return cls(
+            name,
+            deadline=float(os.getenv(f"{prefix}_DEADLINE_S", "30")),
+            attempt_timeout=attempt_timeout or None,
+            retries=int(os.getenv(f"{prefix}_RETRIES", "2")),
+            hedge=os.getenv(f"{prefix}_HEDGE", "1") not in ("0", "false", "no"),
+            hedge_quantile=float(os.getenv("HEDGE_QUANTILE", "0.95")),
+            hedge_budget=float(os.getenv("HEDGE_BUDGET", "0.1")),
+            breaker=CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("BREAKER_RESET_S", "30"))
+            ),
+        )
+
+    async def call(self, factory, hedge=None, slot=None):
+        try:
+            probe = self.breaker.before_call()
+        except CircuitOpen:
+            self._counters["rejected_open"] += 1
+            raise
+        self._counters["calls"] += 1
+        hedge = self.hedge if hedge is None else hedge
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                result = await self._attempt(factory, deadline, hedge, slot)
+            except QueueTimeout:
+                # Only the local queue was slow: says nothing about upstream health
+                if probe:
+                    self.breaker.release_probe()
+                self._counters["failures"] += 1
+                self._counters["queue_timeouts"] += 1
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # Upstream answered; the request itself was at fault
+                    self.breaker.record_success()
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                if not retryable or attempt >= self.retries or self.breaker.state == "open":
+                    self._counters["failures"] += 1
+                    raise
+                if time.monotonic() + delay >= deadline:
+                    self._counters["failures"] += 1
+                    self._counters["deadline_exceeded"] += 1
+                    raise DeadlineExceeded(f"{self.name} call exceeded its {self.deadline:.1f}s deadline") from e
+                self._counters["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled, e.g. the client went away: neither a success nor a failure
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def _attempt(self, factory, deadline, hedge, slot):
+        hedge_delay = self._hedge_delay() if hedge else None
+        dispatched = asyncio.Event()
+        first = self._start(factory, slot, dispatched)
+        tasks = [first]
+        try:
+            # Waiting for the slot is bounded by the call's deadline only
+            waiter = asyncio.ensure_future(dispatched.wait())
+            await asyncio.wait([first, waiter], timeout=deadline - time.monotonic(),
+                               return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if not dispatched.is_set() and not first.done():
+                raise QueueTimeout(f"{self.name} call waited its whole {self.deadline:.1f}s deadline for a slot")
+            started = time.monotonic()
+            remaining = deadline - started
+            timeout = min(remaining, self.attempt_timeout or remaining)
+            if hedge_delay is not None:
+                done = first.done() or timeout <= hedge_delay
+                if not done:
+                    done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self._counters["hedges"] < self.hedge_budget * self._counters["calls"]:
+                    self._counters["hedges"] += 1
+                    tasks.append(self._start(factory, slot))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=started + timeout - time.monotonic(),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._counters["attempt_timeouts"] += 1
+                    raise TimeoutError(f"{self.name} attempt timed out after {timeout:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self._counters["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _start(self, factory, slot, dispatched=None):
+        async def request():
+            if dispatched is not None:
+                dispatched.set()
+            started = time.perf_counter()
+            result = await factory()
+            self.latency.observe(time.perf_counter() - started)
+            return result
+
+        async def timed():
+            if slot is None:
+                return await request()
+            async with slot():
+                return await request()
+
+        task = asyncio.ensure_future(timed())
+        task.add_done_callback(_consume_exception)
+        return task
+
+    def _hedge_delay(self):
+        delay = self.latency.quantile(self.hedge_quantile)
+        return max(delay, self.min_hedge_delay) if delay is not None else None
+
+    def call_blocking(self, func, hedge=None):
+        """
+        `call` for synchronous code such as the Streamlit pages: `func` makes
+        one blocking request and runs in a shared thread pool, so a stuck
+        attempt is abandoned instead of waited for.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"{self.name}-call")
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            return await self.call(lambda: loop.run_in_executor(self._executor, func), hedge)
+
+        return asyncio.run(run())
+
+    def stats(self):
+        p95 = self.latency.quantile(0.95)
+        return {
+            **self._counters,
+            "latency_p95_ms": p95 * 1000 if p95 is not None else None,
+            "breaker_open": int(self.breaker.state != "closed"),
+            "breaker_opens": self.breaker.opens,
+        }
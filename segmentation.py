@@ -0,0 +1,114 @@
+import numpy as np
+
+from transcoder import TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH
+
+
+def frame_energies(samples, frame_size):
+    """RMS level of each full frame in dBFS."""
+    frame_count = len(samples) // frame_size
+    if frame_count == 0:
+        return np.empty(0)
+    frames = samples[:frame_count * frame_size].astype(np.float32).reshape(frame_count, frame_size)
+    rms = np.sqrt(np.mean(np.square(frames / 32768.0), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def find_speech_segments(
+    pcm,
+    sample_rate=TARGET_SAMPLE_RATE,
+    frame_ms=30,
+    min_silence_ms=400,
+    min_segment_s=1.0,
+    max_segment_s=15.0,
+    threshold_db=None,
+):
+    """
+    Split 16-bit mono PCM into utterances using frame energy.
+
+    A frame is speech when it is louder than `threshold_db`; by default the
+    threshold adapts to the clip (10 dB above its noise floor, never below
+    -50 dBFS). Clips are cut in the middle of silences of at least
+    `min_silence_ms`, segments shorter than `min_segment_s` are merged into
+    their neighbour and segments longer than `max_segment_s` are cut at a
+    quiet frame. Returns `(start, end)` sample offsets of the segments
+    that contain speech.
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame_size = int(sample_rate * frame_ms / 1000)
+    energies = frame_energies(samples, frame_size)
+    if len(energies) == 0:
+        return [(0, len(samples))] if len(samples) else []
+
+    if threshold_db is None:
+        threshold_db = max(np.percentile(energies, 10) + 10, -50.0)
+    voiced = energies > threshold_db
+    if not voiced.any():
+        return []
+
+    # Cut points in the middle of every silence long enough to end an utterance
+    min_silence_frames = max(1, min_silence_ms // frame_ms)
+    cuts = [0]
+    run_start = None
+    for i, is_voiced in enumerate(np.append(voiced, True)):
+        if not is_voiced and run_start is None:
+            run_start = i
+        elif is_voiced and run_start is not None:
+            if i - run_start >= min_silence_frames and run_start > 0 and i < len(voiced):
+                cuts.append((run_start + i) // 2)
+            run_start = None
+    cuts.append(len(energies))
+
+    # Merge segments that are too short to be worth a separate request
+    min_frames = int(min_segment_s * 1000 / frame_ms)
+    merged = [cuts[0]]
+    for cut in cuts[1:-1]:
+        if cut - merged[-1] >= min_frames:
+            merged.append(cut)
+    if len(merged) > 1 and cuts[-1] - merged[-1] < min_frames:
+        merged.pop()
+    merged.append(cuts[-1])
+
+    # Split segments that are still too long at the quietest frame of the
+    # second half of the allowed length, so pieces do not get tiny
+    max_frames = int(max_segment_s * 1000 / frame_ms)
+    bounds = []
+    for start, end in zip(merged, merged[1:]):
+        while end - start > max_frames:
+            window_start = start + max(min_frames, max_frames // 2)
+            window = energies[window_start:start + max_frames]
+            cut = window_start + int(np.argmin(window)) if len(window) else start + max_frames
+            bounds.append((start, cut))
+            start = cut
+        bounds.append((start, end))
+
+    segments = []
+    for start, end in bounds:
+        if voiced[start:end].any():
+            sample_end = len(samples) if end == len(energies) else end * frame_size
+            segments.append((start * frame_size, sample_end))
+    return segments
+
+
+def split_pcm(pcm, **kwargs):
+    """Slice PCM bytes into speech segments without copying (memoryviews)."""
+    view = memoryview(pcm)
+    return [
+        view[start * TARGET_SAMPLE_WIDTH:end * TARGET_SAMPLE_WIDTH]
+        for start, end in find_speech_segments(pcm, **kwargs)
+    ]
+
+
+def pcm_duration(pcm, sample_rate=TARGET_SAMPLE_RATE):
+    """Length of 16-bit mono PCM in seconds."""
+    return len(pcm) / (sample_rate * TARGET_SAMPLE_WIDTH)
+
+
+def trailing_silence(pcm, sample_rate=TARGET_SAMPLE_RATE, frame_ms=30, threshold_db=-45.0):
+    """Seconds of silence (frames at or below `threshold_db`) at the end of 16-bit mono PCM."""
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame_size = int(sample_rate * frame_ms / 1000)
+    energies = frame_energies(samples, frame_size)
+    voiced = np.flatnonzero(energies > threshold_db)
+    if len(voiced) == 0:
+        return len(samples) / sample_rate
+    return len(samples) / sample_rate - (voiced[-1] + 1) * frame_size / sample_rate
@@ -1,19 +1,102 @@
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import asyncio
+import functools
+import sqlite3
 import json
 import os
-import openai
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import base64
-import ffmpeg
+from contextlib import asynccontextmanager
 
-# Load environment variables
+# Load environment variables before the project imports: their defaults
+# (cache paths, recognition locales) are read when they are imported
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-app = FastAPI()
+from transcoder import PCM_FORMAT, AudioTranscoder, pcm_to_wav
+from ws_protocol import AudioMessage, ProtocolError, read_audio_message
+from live_subtitles import LiveSubtitleSession
+from pipeline import OrderedPipeline, PipelineStage
+from segmentation import pcm_duration, split_pcm
+from translation_cache import TranslationCache
+from transcript_store import EXPORT_FORMATS, TranscriptStore
+from summarizer import Summarizer, transcript_lines
+from translation_memory import MemoryMatch, TranslationMemory, prompt_context
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from metrics import (
+    ACTIVE_CONNECTIONS, AUDIO_SECONDS, BYTES_RECEIVED, BYTES_SENT, IN_FLIGHT,
+    ComponentStatsCollector, count_error, observe_route, observe_stage
+)
+from openai_client import CallGovernor, create_async_client
+from model_router import ModelRouter
+from admission import AdmissionController, AdmissionRejected
+from state_store import create_state_store
+from resilience import CircuitOpen, ResilientCaller
+from batching import BatchTranslationError, MicroBatcher, batch_translation_messages, parse_batch_translations
+
+# Bump when translation_messages changes so stale cache entries are not reused
+TRANSLATION_PROMPT_VERSION = "server-v2"
+
+# Clips at least this long are split on silence and transcribed per utterance
+SEGMENT_MIN_CLIP_SECONDS = float(os.getenv("SEGMENT_MIN_CLIP_SECONDS", "8"))
+SEGMENT_MAX_SECONDS = float(os.getenv("SEGMENT_MAX_SECONDS", "15"))
+
+# Translation micro-batching window (0 disables it) and texts per upstream request
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "0"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+
+# Startup warm-up (WARMUP=0 skips it): upstream connections to open and a bound on the whole step
+WARMUP = os.getenv("WARMUP", "1") not in ("0", "false", "no")
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+WARMUP_TIMEOUT_S = float(os.getenv("WARMUP_TIMEOUT_S", "10"))
+
+# Most history entries one summary request reads
+SUMMARY_MAX_ENTRIES = int(os.getenv("SUMMARY_MAX_ENTRIES", "20000"))
+
+def component_stats_collector():
+    return ComponentStatsCollector({
+        "transcoder": manager.transcoder.stats,
+        "translation_cache": manager.translation_cache.stats,
+        "batcher": lambda: manager.batcher.stats() if manager.batcher is not None else None,
+        "governor": manager.governor.stats,
+        "router": manager.router.stats,
+        "admission": manager.admission.stats,
+        "transcripts": manager.transcripts.stats,
+        "summarizer": manager.summarizer.stats,
+        "translation_memory": manager.memory.stats,
+        "startup": lambda: manager.startup,
+        "upstream_transcribe": manager.upstream["transcribe"].stats,
+        "upstream_chat": manager.upstream["chat"].stats
+    })
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client per process; OPENAI_BASE_URL / OPENAI_API_BASE
+    # can point it at a compatible stand-in such as loadtest/fake_openai.py
+    manager.client = create_async_client()
+    # Registered per running app rather than at import: with several workers
+    # each process imports this module twice (as __mp_main__ and as server)
+    collector = component_stats_collector()
+    REGISTRY.register(collector)
+    if WARMUP:
+        # uvicorn accepts connections only after this, so no request pays these costs
+        manager.startup = await manager.warm_up(WARMUP_CONNECTIONS, WARMUP_TIMEOUT_S)
+    yield
+    REGISTRY.unregister(collector)
+    await manager.client.close()
+    manager.transcoder.close()
+    manager.translation_cache.close()
+    manager.transcripts.close()
+    manager.summarizer.cache.close()
+    manager.memory.close()
+    manager.state_store.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Serve static files
 current_dir = os.path.dirname(os.path.realpath(__file__))
@@ -29,79 +112,822 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 class TranslationManager:
     def __init__(self):
         self.active_connections = {}
+        self.transcoder = AudioTranscoder(
+            pool_size=int(os.getenv("TRANSCODER_POOL_SIZE", "4")),
+            max_queue=int(os.getenv("TRANSCODER_MAX_QUEUE", "32"))
+        )
+        self.translation_cache = TranslationCache()
+        # Fuzzy reuse of past translations and the user glossary (TM_* settings)
+        self.memory = TranslationMemory.from_env()
+        # Conversation history; appends are queued and written in batches
+        self.transcripts = TranscriptStore()
+        # Set by the app lifespan
+        self.client = None
+        # Milliseconds per warm-up step, from the app lifespan
+        self.startup = {}
+        # Limits on in-flight and per-second Whisper and chat calls; the
+        # configured totals are split evenly between the server workers
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        self.governor = CallGovernor({
+            "transcribe": (max(1, int(os.getenv("TRANSCRIBE_CONCURRENCY", "4")) // workers),
+                           float(os.getenv("TRANSCRIBE_RATE_PER_S", "0")) / workers),
+            "chat": (max(1, int(os.getenv("CHAT_CONCURRENCY", "8")) // workers),
+                     float(os.getenv("CHAT_RATE_PER_S", "0")) / workers)
+        })
+        # Counters shared by all workers: in-memory for one worker, SQLite
+        # for several (WEB_CONCURRENCY), or whatever STATE_STORE names
+        self.state_store = create_state_store()
+        # Connection, in-flight and audio-rate limits (ADMISSION_* settings)
+        self.admission = AdmissionController.from_env(store=self.state_store)
+        # Deadlines, retries, hedging and circuit breaking per upstream
+        # (TRANSCRIBE_* / CHAT_* deadline and retry settings, HEDGE_*, BREAKER_*)
+        self.upstream = {kind: ResilientCaller.from_env(kind) for kind in ("transcribe", "chat")}
+        # Picks the chat model per request (ROUTER_* settings)
+        self.router = ModelRouter(on_record=observe_route)
+        # Incremental map-reduce summaries of the conversation history (SUMMARY_* settings)
+        self.summarizer = Summarizer.from_env(
+            lambda messages, text: self.complete_chat(messages, self.router.choose("summarize", text), text)
+        )
+        # Optional cross-connection micro-batching of translation requests
+        self.batcher = None
+        if BATCH_WINDOW_MS > 0:
+            self.batcher = MicroBatcher(self.translate_batch, window_ms=BATCH_WINDOW_MS, max_batch_size=BATCH_MAX_SIZE)
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        ACTIVE_CONNECTIONS.inc()
 
     def disconnect(self, client_id: str):
         if client_id in self.active_connections:
             del self.active_connections[client_id]
+            ACTIVE_CONNECTIONS.dec()
 
-    async def process_audio(self, audio_data: bytes, source_lang: str, target_lang: str):
-        try:
-            # Convert audio to required format (16kHz, mono, PCM16)
-            process = (
-                ffmpeg
-                .input('pipe:0')
-                .output('pipe:1', acodec='pcm_s16le', ac=1, ar='16k')
-                .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
-            )
-            
-            output_data, _ = process.communicate(input=audio_data)
-
-            # Call OpenAI Whisper API for transcription
-            response = await openai.Audio.atranscribe(
-                "whisper-1",
-                output_data,
-                language=source_lang if source_lang != "auto" else None
+    async def warm_up(self, connections: int = 2, timeout: float = 10.0):
+        """
+        Pay first-request costs before traffic arrives: load the SDK's chat
+        and audio modules, spawn the ffmpeg decoder processes and open
+        `connections` pooled upstream connections (TLS included) with cheap
+        models.list calls. Each step is bounded by `timeout`; a failed step
+        is logged, not raised.
+        Returns the milliseconds each step took.
+        """
+        timings = {}
+
+        async def step(name, awaitable):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(awaitable, timeout)
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {e!r}")
+                timings[f"{name}_failed"] = 1
+            timings[f"{name}_ms"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        # The SDK imports its resource modules (and builds their models) on first access
+        await step("sdk", asyncio.to_thread(lambda: (self.client.chat.completions, self.client.audio.transcriptions)))
+        await asyncio.gather(
+            step("transcoder", self.transcoder.prewarm()),
+            # Concurrent requests, so each one opens a connection of its own
+            step("upstream", asyncio.gather(*(self.client.models.list() for _ in range(connections)))),
+        )
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+        return timings
+
+    async def transcribe_pcm(self, pcm_data: bytes, source_lang: str):
+        # Call OpenAI Whisper API for transcription; the API expects a named audio file
+        params = {"language": source_lang} if source_lang != "auto" else {}
+        # A fresh file per attempt, since a hedged duplicate may upload concurrently
+        response = await self.upstream["transcribe"].call(
+            lambda: self.client.audio.transcriptions.create(model="whisper-1", file=pcm_to_wav(pcm_data), **params),
+            slot=lambda: self.governor.slot("transcribe")
+        )
+
+        # Get the transcription
+        return response.text
+
+    async def transcribe_words(self, pcm_data: bytes, source_lang: str, prompt: str = ""):
+        """Whisper words as (word, start, end), in seconds from the start of `pcm_data`."""
+        params = {"language": source_lang} if source_lang != "auto" else {}
+        if prompt:
+            params["prompt"] = prompt
+        response = await self.upstream["transcribe"].call(
+            lambda: self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=pcm_to_wav(pcm_data),
+                response_format="verbose_json",
+                timestamp_granularities=["word"],
+                **params
+            ),
+            slot=lambda: self.governor.slot("transcribe")
+        )
+        words = [(word.word.strip(), word.start, word.end) for word in getattr(response, "words", None) or ()]
+        tokens = response.text.split()
+        if not words and tokens:
+            # No word timestamps from this upstream; spread the words evenly over the audio
+            step = pcm_duration(pcm_data) / len(tokens)
+            words = [(token, i * step, (i + 1) * step) for i, token in enumerate(tokens)]
+        return words
+
+    def start_live_session(self, client_id: str, message: AudioMessage, emit):
+        async def translate(text):
+            translation = await self.translate(text, message.source_lang, message.target_lang)
+            self.transcripts.append(client_id, text, translation, message.source_lang, message.target_lang)
+            return translation
+
+        return LiveSubtitleSession.from_env(
+            transcribe=lambda pcm, prompt: self.transcribe_words(pcm, message.source_lang, prompt),
+            translate=translate,
+            emit=emit,
+            on_pass=lambda seconds: observe_stage("live_pass", seconds)
+        )
+
+    async def complete_chat(self, messages: list, route, text: str = ""):
+        with self.router.timed(route, text):
+            response = await self.upstream["chat"].call(
+                lambda: self.client.chat.completions.create(model=route.model, messages=messages),
+                slot=lambda: self.governor.slot("chat")
             )
+        return response.choices[0].message.content
+
+    def translation_messages(self, text: str, target_lang: str, match: MemoryMatch = None):
+        # Glossary terms and close past translations from the memory, if any
+        context = prompt_context(match)
+        return [
+            {"role": "system", "content": "You are a translator. Translate the following text to " + target_lang
+             + ("\n" + context if context else "")},
+            {"role": "user", "content": text}
+        ]
+
+    async def translate_uncached(self, text: str, target_lang: str, source_lang: str = None,
+                                 match: MemoryMatch = None, route=None):
+        # Call OpenAI API for translation
+        route = route or self.router.choose("translate", text, source_lang, target_lang)
+        return await self.complete_chat(self.translation_messages(text, target_lang, match), route, text)
+
+    def translation_cache_args(self, text: str, source_lang: str, target_lang: str):
+        """The route for `text` and its cache key arguments; each routed model has its own entries."""
+        route = self.router.choose("translate", text, source_lang, target_lang)
+        return route, (text, source_lang, target_lang, route.model, TRANSLATION_PROMPT_VERSION)
+
+    async def translate(self, text: str, source_lang: str, target_lang: str):
+        route, cache_args = self.translation_cache_args(text, source_lang, target_lang)
+        translation = await self.translation_cache.aget(*cache_args)
+        if translation is None:
+            match = self.memory.lookup(text, source_lang, target_lang)
+            if match.translation is not None:
+                translation = match.translation
+            elif self.batcher is not None and not match.examples:
+                # Texts with few-shot examples go alone; their prompts differ
+                translation = await self.batcher.translate(text, target_lang)
+                await self.memory.aadd(text, translation, source_lang, target_lang)
+            else:
+                translation = await self.translate_uncached(text, target_lang, source_lang, match, route)
+                await self.memory.aadd(text, translation, source_lang, target_lang)
+            await self.translation_cache.aput(*cache_args, translation)
+        return translation
+
+    async def translate_batch(self, texts: list, target_lang: str):
+        """Translate several texts with one structured request."""
+        # Glossary terms only; per-text examples would make the shared prompt long
+        glossary = MemoryMatch(terms=self.memory.glossary.find("\n".join(texts), None, target_lang))
+        if len(texts) == 1:
+            return [await self.translate_uncached(texts[0], target_lang, match=glossary)]
+        # The longest text decides the route for the whole batch
+        route = self.router.choose("translate", max(texts, key=len), target_lang=target_lang)
+        content = await self.complete_chat(
+            batch_translation_messages(texts, target_lang, prompt_context(glossary)), route, "".join(texts)
+        )
+        try:
+            return parse_batch_translations(content, len(texts))
+        except BatchTranslationError as e:
+            # The model did not keep the structure; fall back to one request per text
+            print(f"Batch translation fallback: {e}")
+            return await asyncio.gather(*(self.translate_uncached(text, target_lang, match=glossary) for text in texts))
+
+    async def translate_many(self, texts: list, source_lang: str, target_lang: str):
+        """Translate a list of texts, sending only distinct cache misses upstream."""
+        translations = {}
+        cache_args = {}
+        for text in dict.fromkeys(texts):
+            _, cache_args[text] = self.translation_cache_args(text, source_lang, target_lang)
+            translations[text] = await self.translation_cache.aget(*cache_args[text])
+        misses = []
+        for text in [text for text, translation in translations.items() if translation is None]:
+            translations[text] = self.memory.lookup(text, source_lang, target_lang).translation
+            if translations[text] is None:
+                misses.append(text)
+            else:
+                await self.translation_cache.aput(*cache_args[text], translations[text])
 
-            # Get the transcription
-            transcription = response["text"]
+        if self.batcher is not None:
+            # Share batches with concurrent requests from other clients
+            results = await asyncio.gather(*(self.batcher.translate(text, target_lang) for text in misses))
+        else:
+            chunks = [misses[i:i + BATCH_MAX_SIZE] for i in range(0, len(misses), BATCH_MAX_SIZE)]
+            results = [
+                translation
+                for chunk in await asyncio.gather(*(self.translate_batch(chunk, target_lang) for chunk in chunks))
+                for translation in chunk
+            ]
 
-            # Call OpenAI API for translation
-            translation_response = await openai.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a translator. Translate the following text to " + target_lang},
-                    {"role": "user", "content": transcription}
-                ]
+        for text, translation in zip(misses, results):
+            translations[text] = translation
+            await self.translation_cache.aput(*cache_args[text], translation)
+            await self.memory.aadd(text, translation, source_lang, target_lang)
+        return [translations[text] for text in texts]
+
+    async def translation_events(self, utterance_id: str, transcription: str, source_lang: str, target_lang: str):
+        """Yield "translation_delta" events as the model generates, then a "final" event."""
+        route, cache_args = self.translation_cache_args(transcription, source_lang, target_lang)
+        translation = await self.translation_cache.aget(*cache_args)
+        match = None
+        if translation is None:
+            match = self.memory.lookup(transcription, source_lang, target_lang)
+            translation = match.translation
+        cached = translation is not None
+        if not cached:
+            parts = []
+            # The chat slot is held until the stream is fully consumed
+            async with self.governor.slot("chat"):
+                with self.router.timed(route, transcription):
+                    # Deadline, retries and breaker cover opening the stream; it is
+                    # not hedged, and deltas already sent are never replayed
+                    stream = await self.upstream["chat"].call(lambda: self.client.chat.completions.create(
+                        model=route.model,
+                        messages=self.translation_messages(transcription, target_lang, match),
+                        stream=True
+                    ), hedge=False)
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            yield {
+                                "type": "translation_delta",
+                                "utterance_id": utterance_id,
+                                "index": len(parts) - 1,
+                                "delta": delta
+                            }
+            translation = "".join(parts)
+            await self.translation_cache.aput(*cache_args, translation)
+            await self.memory.aadd(transcription, translation, source_lang, target_lang)
+        elif match is not None:
+            await self.translation_cache.aput(*cache_args, translation)
+
+        yield {
+            "type": "final",
+            "utterance_id": utterance_id,
+            "original": transcription,
+            "translated": translation,
+            "detected_language": source_lang,
+            "cached": cached
+        }
+
+    async def process_audio(self, audio_data: bytes, source_lang: str, target_lang: str, fmt: str = None):
+        try:
+            job = AudioJob(
+                message=AudioMessage(None, source_lang, target_lang, memoryview(audio_data), fmt=fmt),
+                utterance_id=uuid.uuid4().hex
             )
+            await self.run_job(job)
+            return {**job.result, "trace_id": job.trace_id}
 
-            translation = translation_response.choices[0].message.content
+        except CircuitOpen as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(round(e.retry_after))})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-            return {
-                "original": transcription,
-                "translated": translation,
-                "detected_language": source_lang
-            }
+    async def process_audio_stream(self, audio_data: bytes, source_lang: str, target_lang: str,
+                                   fmt: str = None, utterance_id: str = None):
+        """
+        Streaming variant of process_audio. Yields a "transcription" event as soon
+        as Whisper returns, "translation_delta" events while GPT-4 generates, and
+        a "final" event with the full result. Every event carries `utterance_id`.
+        """
+        job = AudioJob(
+            message=AudioMessage(None, source_lang, target_lang, memoryview(audio_data), fmt=fmt, stream=True),
+            utterance_id=utterance_id or uuid.uuid4().hex,
+            events=asyncio.Queue()
+        )
+        runner = asyncio.create_task(self.run_job(job))
+        try:
+            while (event := await job.events.get()) is not None:
+                event["trace_id"] = job.trace_id
+                yield event
+            await runner
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            runner.cancel()
+
+    async def run_job(self, job: "AudioJob"):
+        """Run every pipeline stage for one job, outside of a connection pipeline."""
+        try:
+            await self.run_stage("transcode", job)
+            await self.run_stage("transcribe", job)
+        except Exception:
+            # translate_stage closes the event stream; close it here if it never runs
+            if job.events is not None:
+                job.events.put_nowait(None)
+            raise
+        await self.run_stage("translate", job)
+
+    async def run_stage(self, stage: str, job: "AudioJob"):
+        try:
+            await getattr(self, f"{stage}_stage")(job)
+        except AdmissionRejected:
+            # Load shedding, not a failure; the client gets a "busy" message
+            raise
+        except Exception as e:
+            count_error(stage, e)
+            print(f"Error [{job.trace_id}] in {stage}: {e}")
+            raise
+
+    # Per-connection pipeline stages. Each one fills in part of the AudioJob.
+
+    async def transcode_stage(self, job: "AudioJob"):
+        # Convert audio to required format (16kHz, mono, PCM16) off the event loop
+        started = time.perf_counter()
+        job.pcm = await self.transcoder.decode(job.message.audio, fmt=job.message.fmt)
+        job.record_timing("transcode", started)
+        seconds = pcm_duration(job.pcm)
+        if job.client_id is not None:
+            # Decoding is local and cheap; the per-minute audio budget is
+            # enforced before any upstream call is made
+            await self.admission.charge_audio(job.client_id, seconds)
+        AUDIO_SECONDS.inc(seconds)
+
+    async def transcribe_stage(self, job: "AudioJob"):
+        message = job.message
+        started = time.perf_counter()
+        segments = []
+        if pcm_duration(job.pcm) >= SEGMENT_MIN_CLIP_SECONDS:
+            segments = split_pcm(job.pcm, max_segment_s=SEGMENT_MAX_SECONDS)
+
+        if len(segments) > 1:
+            # Long clip: transcribe utterances concurrently; each segment's
+            # translation starts as soon as its own text is ready
+            job.segments = [self.start_segment(pcm, message.source_lang, message.target_lang) for pcm in segments]
+            results = await asyncio.gather(*(transcription for transcription, _ in job.segments), return_exceptions=True)
+            texts = [text for text in results if not isinstance(text, BaseException)]
+            if not texts:
+                raise results[0]
+            job.transcription = " ".join(text for text in texts if text)
+        else:
+            job.transcription = await self.transcribe_segment(job.pcm, message.source_lang)
+        job.record_timing("transcribe", started)
+
+        if job.events is not None:
+            job.events.put_nowait({
+                "type": "transcription",
+                "utterance_id": job.utterance_id,
+                "original": job.transcription,
+                "detected_language": message.source_lang
+            })
+
+    async def translate_stage(self, job: "AudioJob"):
+        message = job.message
+        job.translate_started = time.perf_counter()
+        if job.segments:
+            await self.translate_segments(job)
+        elif job.events is None:
+            translation = await self.translate(job.transcription, message.source_lang, message.target_lang)
+            job.result = {
+                "original": job.transcription,
+                "translated": translation,
+                "detected_language": message.source_lang,
+                "timings": job.finish_timings()
+            }
+        else:
+            try:
+                async for event in self.translation_events(
+                    job.utterance_id, job.transcription, message.source_lang, message.target_lang
+                ):
+                    if event["type"] == "final":
+                        event["timings"] = job.finish_timings()
+                    job.events.put_nowait(event)
+            finally:
+                job.events.put_nowait(None)
+
+    def start_segment(self, pcm_data: bytes, source_lang: str, target_lang: str):
+        transcription = asyncio.create_task(self.transcribe_segment(pcm_data, source_lang))
+        translation = asyncio.create_task(self.translate_segment(transcription, source_lang, target_lang))
+        return transcription, translation
+
+    async def transcribe_segment(self, pcm_data: bytes, source_lang: str):
+        return (await self.transcribe_pcm(pcm_data, source_lang)).strip()
+
+    async def translate_segment(self, transcription: asyncio.Task, source_lang: str, target_lang: str):
+        text = await transcription
+        return await self.translate(text, source_lang, target_lang) if text else ""
+
+    async def translate_segments(self, job: "AudioJob"):
+        # Reassemble segment translations in order; a failed segment is
+        # skipped instead of failing the whole clip
+        translations = []
+        failed = 0
+        try:
+            for _, translation_task in job.segments:
+                try:
+                    translation = await translation_task
+                except Exception as e:
+                    count_error("segment", e)
+                    print(f"Error [{job.trace_id}] in segment: {e}")
+                    failed += 1
+                    continue
+                if not translation:
+                    continue
+                translations.append(translation)
+                if job.events is not None:
+                    job.events.put_nowait({
+                        "type": "translation_delta",
+                        "utterance_id": job.utterance_id,
+                        "index": len(translations) - 1,
+                        "delta": translation if len(translations) == 1 else " " + translation
+                    })
+
+            job.result = {
+                "original": job.transcription,
+                "translated": " ".join(translations),
+                "detected_language": job.message.source_lang,
+                "segments": len(job.segments),
+                "failed_segments": failed,
+                "timings": job.finish_timings()
+            }
+            if job.events is not None:
+                job.events.put_nowait({"type": "final", "utterance_id": job.utterance_id, **job.result})
+        finally:
+            if job.events is not None:
+                job.events.put_nowait(None)
+
+    def create_pipeline(self, on_drop=None):
+        concurrency = int(os.getenv("PIPELINE_STAGE_CONCURRENCY", "1"))
+        return OrderedPipeline(
+            [
+                PipelineStage(stage, functools.partial(self.run_stage, stage), concurrency)
+                for stage in ("transcode", "transcribe", "translate")
+            ],
+            queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", "4")),
+            drop_policy=os.getenv("PIPELINE_DROP_POLICY", "block"),
+            on_drop=on_drop
+        )
+
+# eq=False keeps jobs hashable by identity for the per-connection pending set
+@dataclass(eq=False)
+class AudioJob:
+    message: AudioMessage
+    utterance_id: str
+    # Streaming jobs collect their events here; None for single-result jobs
+    events: Optional[asyncio.Queue] = None
+    pcm: Optional[bytes] = None
+    transcription: Optional[str] = None
+    # (transcription task, translation task) per utterance of a long clip
+    segments: Optional[list] = None
+    # Time spent inside each stage, reported to the client with the result
+    timings: dict = field(default_factory=dict)
+    translate_started: float = 0.0
+    # The message sent to the client for single-result jobs
+    result: Optional[dict] = None
+
+    # Correlates the client's result messages with server logs
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # Set for WebSocket jobs admitted by the AdmissionController
+    client_id: Optional[str] = None
+    admitted_at: Optional[float] = None
+
+    def record_timing(self, stage: str, started: float):
+        seconds = time.perf_counter() - started
+        self.timings[f"{stage}_ms"] = seconds * 1000
+        observe_stage(stage, seconds)
+
+    def finish_timings(self):
+        self.record_timing("translate", self.translate_started)
+        return self.timings
+
+    def cancel(self):
+        # Segment tasks run outside the pipeline's stage tasks
+        for transcription, translation in self.segments or ():
+            transcription.cancel()
+            translation.cancel()
 
 manager = TranslationManager()
 
+@app.middleware("http")
+async def add_trace_id(request: Request, call_next):
+    # One id per request: handlers put it in their error logs, the client gets it back
+    request.state.trace_id = uuid.uuid4().hex
+    response = await call_next(request)
+    response.headers["X-Trace-Id"] = request.state.trace_id
+    return response
+
+@app.get("/metrics")
+async def read_metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/stats")
+async def read_stats():
+    # Per worker process, except the admission "shared_*" counters
+    return {
+        "worker": os.getpid(),
+        "startup": manager.startup,
+        "transcoder": manager.transcoder.stats(),
+        "translation_cache": manager.translation_cache.stats(),
+        "batcher": manager.batcher.stats() if manager.batcher is not None else None,
+        "governor": manager.governor.stats(),
+        "router": manager.router.stats(),
+        "admission": manager.admission.stats(),
+        "transcripts": manager.transcripts.stats(),
+        "summarizer": manager.summarizer.stats(),
+        "translation_memory": manager.memory.stats(),
+        "upstream": {kind: caller.stats() for kind, caller in manager.upstream.items()}
+    }
+
+class BatchTranslationRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=256)
+    source_lang: str = "auto"
+    target_lang: str = "en"
+
+@app.post("/translate/batch")
+async def translate_batch(request: BatchTranslationRequest, http_request: Request):
+    try:
+        translations = await manager.translate_many(request.texts, request.source_lang, request.target_lang)
+    except Exception as e:
+        count_error("translate_batch", e)
+        print(f"Error [{http_request.state.trace_id}] in translate_batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "target_lang": request.target_lang,
+        "translations": translations
+    }
+
+@app.get("/transcripts")
+async def read_transcripts(session_id: Optional[str] = None, start: Optional[float] = None,
+                           end: Optional[float] = None, limit: int = 100):
+    # start/end are Unix timestamps
+    entries = await asyncio.to_thread(manager.transcripts.range, start, end, session_id, min(limit, 1000))
+    return {"entries": entries}
+
+@app.get("/transcripts/search")
+async def search_transcripts(q: str, session_id: Optional[str] = None, start: Optional[float] = None,
+                             end: Optional[float] = None, limit: int = 50):
+    try:
+        entries = await asyncio.to_thread(manager.transcripts.search, q, session_id, start, end, min(limit, 1000))
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=400, detail=f"invalid search query: {e}")
+    return {"entries": entries}
+
+@app.get("/transcripts/export")
+async def export_transcripts(session_id: Optional[str] = None, start: Optional[float] = None,
+                             end: Optional[float] = None, format: str = "jsonl"):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {EXPORT_FORMATS}")
+    return StreamingResponse(
+        manager.transcripts.export(session_id, start, end, format),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="transcripts.{format}"'}
+    )
+
+@app.get("/transcripts/summary")
+async def summarize_transcripts(request: Request, session_id: str, start: Optional[float] = None,
+                                end: Optional[float] = None, lang: str = "ko"):
+    # Polling this during a meeting only recomputes the newest chunk and its merges.
+    # A long session keeps its latest SUMMARY_MAX_ENTRIES entries, back in spoken order
+    entries = await asyncio.to_thread(manager.transcripts.range, start, end, session_id, SUMMARY_MAX_ENTRIES, True)
+    entries.reverse()
+    try:
+        summary = await manager.summarizer.summarize(transcript_lines(entries), lang)
+    except CircuitOpen as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(round(e.retry_after))})
+    except Exception as e:
+        count_error("summary", e)
+        print(f"Error [{request.state.trace_id}] in summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"session_id": session_id, "entries": len(entries), "summary": summary}
+
+def record_transcript(job: "AudioJob", result: dict):
+    if job.client_id is not None and result.get("original"):
+        manager.transcripts.append(job.client_id, result["original"], result["translated"],
+                                   job.message.source_lang, job.message.target_lang, result.get("timings"))
+
+async def send_event(websocket: WebSocket, send_lock: asyncio.Lock, event: dict):
+    text = json.dumps(event)
+    started = time.perf_counter()
+    async with send_lock:
+        await websocket.send_text(text)
+    observe_stage("send", time.perf_counter() - started)
+    BYTES_SENT.inc(len(text.encode("utf-8")))
+
+def busy_event(job: AudioJob, rejected: AdmissionRejected):
+    return {
+        "type": "busy",
+        "utterance_id": job.utterance_id,
+        "seq": job.message.seq,
+        "trace_id": job.trace_id,
+        "reason": rejected.reason,
+        "retry_after": round(rejected.retry_after, 1)
+    }
+
+def error_event(job: AudioJob, error: Exception):
+    # The job failed but the connection stays usable for the next clip
+    event = {
+        "type": "error",
+        "utterance_id": job.utterance_id,
+        "seq": job.message.seq,
+        "trace_id": job.trace_id,
+        "message": str(error)
+    }
+    if isinstance(error, CircuitOpen):
+        event["retry_after"] = round(error.retry_after, 1)
+    return event
+
+async def finish_live_session(client_id: str, session: LiveSubtitleSession):
+    try:
+        await session.finish()
+    finally:
+        # No-op after a clean finish; stops leftover work on disconnect
+        session.cancel()
+        manager.admission.release(client_id)
+
+async def receive_live_chunk(websocket: WebSocket, client_id: str, message: AudioMessage, live: dict,
+                             send_lock: asyncio.Lock):
+    """Feed one chunk of a live subtitle stream, starting its session on the first chunk."""
+    if message.fmt != PCM_FORMAT:
+        # Compressed timeslices (e.g. MediaRecorder webm) cannot be decoded on their own
+        await send_event(websocket, send_lock, {
+            "type": "error", "seq": message.seq, "message": "live subtitles need 16 kHz mono PCM16 chunks"
+        })
+        return
+    session = live["session"]
+    if session is None and not message.end:
+        try:
+            # A live session holds one job slot until it ends
+            await manager.admission.acquire(client_id)
+        except AdmissionRejected as e:
+            await send_event(websocket, send_lock, {
+                "type": "busy", "live": True, "seq": message.seq, "reason": e.reason, "retry_after": round(e.retry_after, 1)
+            })
+            return
+        session = live["session"] = manager.start_live_session(
+            client_id, message, lambda event: send_event(websocket, send_lock, event)
+        )
+    if session is not None and len(message.audio):
+        seconds = pcm_duration(message.audio)
+        try:
+            await manager.admission.charge_audio(client_id, seconds)
+        except AdmissionRejected as e:
+            await send_event(websocket, send_lock, {
+                "type": "busy", "live": True, "seq": message.seq, "reason": e.reason, "retry_after": round(e.retry_after, 1)
+            })
+        else:
+            session.feed(bytes(message.audio))
+            AUDIO_SECONDS.inc(seconds)
+    if message.end and session is not None:
+        live["session"] = None
+        task = asyncio.create_task(finish_live_session(client_id, session))
+        live["finishing"].add(task)
+        task.add_done_callback(live["finishing"].discard)
+
+async def receive_jobs(websocket: WebSocket, client_id: str, pipeline: OrderedPipeline, pending: set,
+                       send_lock: asyncio.Lock, live: dict):
+    while True:
+        # Binary frames carry raw audio; JSON/base64 text frames are still accepted
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        if message.get("bytes") is not None:
+            BYTES_RECEIVED.inc(len(message["bytes"]))
+        elif message.get("text") is not None:
+            BYTES_RECEIVED.inc(len(message["text"].encode("utf-8")))
+
+        try:
+            audio_message = read_audio_message(message)
+        except ProtocolError as e:
+            # Drop the bad message but keep the session going
+            count_error("protocol", e)
+            await send_event(websocket, send_lock, {"type": "error", "message": f"invalid message: {e}"})
+            continue
+        if audio_message is not None and audio_message.live:
+            await receive_live_chunk(websocket, client_id, audio_message, live, send_lock)
+        elif audio_message is not None:
+            if audio_message.seq is not None:
+                utterance_id = f"{client_id}-{audio_message.seq}"
+            else:
+                utterance_id = uuid.uuid4().hex
+            job = AudioJob(
+                message=audio_message,
+                utterance_id=utterance_id,
+                events=asyncio.Queue() if audio_message.stream else None,
+                client_id=client_id
+            )
+            try:
+                # Waits in the bounded global queue, at most ADMISSION_QUEUE_TIMEOUT
+                job.admitted_at = await manager.admission.acquire(client_id)
+            except AdmissionRejected as e:
+                await send_event(websocket, send_lock, busy_event(job, e))
+                continue
+            pending.add(job)
+            IN_FLIGHT.inc()
+            await pipeline.submit(job)
+
+async def send_results(websocket: WebSocket, pipeline: OrderedPipeline, send_lock: asyncio.Lock, finish):
+    # Results arrive in submission order, even when later jobs finish first
+    async for job, task in pipeline.results():
+        if task.done() and isinstance(task.exception(), AdmissionRejected):
+            await send_event(websocket, send_lock, busy_event(job, task.exception()))
+            finish(job)
+            continue
+        if task.done() and task.exception() is not None:
+            await send_event(websocket, send_lock, error_event(job, task.exception()))
+            finish(job)
+            continue
+
+        try:
+            if job.events is not None:
+                while (event := await job.events.get()) is not None:
+                    event["seq"] = job.message.seq
+                    event["trace_id"] = job.trace_id
+                    await send_event(websocket, send_lock, event)
+                    if event["type"] == "final":
+                        record_transcript(job, event)
+                await task
+            else:
+                await task
+                job.result["seq"] = job.message.seq
+                job.result["trace_id"] = job.trace_id
+                await send_event(websocket, send_lock, job.result)
+                record_transcript(job, job.result)
+        except Exception as e:
+            # Failed in its last stage, possibly after some deltas were sent
+            await send_event(websocket, send_lock, error_event(job, e))
+        finish(job)
+
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
+    try:
+        await manager.admission.open_connection(client_id)
+    except AdmissionRejected as e:
+        # Accept only to say why, then close with 1013 (try again later)
+        await websocket.accept()
+        await websocket.send_text(json.dumps({"type": "busy", "reason": e.reason, "retry_after": round(e.retry_after, 1)}))
+        await websocket.close(code=1013)
+        return
     await manager.connect(websocket, client_id)
+    send_lock = asyncio.Lock()
+    notices = set()
+    # Jobs admitted but not yet answered
+    pending = set()
+    # The open live subtitle session, if any, and ended ones still flushing
+    live = {"session": None, "finishing": set()}
+
+    def finish(job: AudioJob, cancelled: bool = False):
+        if job in pending:
+            pending.discard(job)
+            IN_FLIGHT.dec()
+            manager.admission.release(client_id, job.admitted_at, cancelled)
+
+    def notify_dropped(job: AudioJob):
+        finish(job)
+        # Tell the client its clip was shed instead of leaving it waiting
+        task = asyncio.create_task(send_event(websocket, send_lock, {
+            "type": "dropped",
+            "utterance_id": job.utterance_id,
+            "seq": job.message.seq,
+            "trace_id": job.trace_id
+        }))
+        notices.add(task)
+        task.add_done_callback(notices.discard)
+
+    pipeline = manager.create_pipeline(on_drop=notify_dropped)
+    receiver = asyncio.create_task(receive_jobs(websocket, client_id, pipeline, pending, send_lock, live))
+    sender = asyncio.create_task(send_results(websocket, pipeline, send_lock, finish))
     try:
-        while True:
-            data = await websocket.receive_json()
-            
-            if data["type"] == "audio":
-                audio_data = base64.b64decode(data["data"])
-                source_lang = data.get("source_lang", "auto")
-                target_lang = data.get("target_lang", "en")
-                
-                result = await manager.process_audio(audio_data, source_lang, target_lang)
-                await websocket.send_json(result)
-            
+        done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
     except Exception as e:
+        count_error("websocket", e)
         print(f"Error: {e}")
     finally:
+        receiver.cancel()
+        sender.cancel()
+        pipeline.cancel()
+        # Nobody is left to receive these results; stop spending API calls on them
+        for job in list(pending):
+            job.cancel()
+            finish(job, cancelled=True)
+        if live["session"] is not None:
+            live["session"].cancel()
+            manager.admission.release(client_id, cancelled=True)
+        for task in live["finishing"]:
+            task.cancel()
         manager.disconnect(client_id)
+        manager.admission.close_connection(client_id)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Several workers need the import string; each worker process builds its
+    # own manager and shares limits through the state store
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    uvicorn.run("server:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
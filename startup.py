@@ -0,0 +1,63 @@
+import hashlib
+import importlib
+import threading
+import time
+from concurrent.futures import Future
+
+# How long a key check is trusted; a revoked key is noticed after this
+API_KEY_CHECK_TTL = 3600.0
+
+_key_checks = {}
+_key_lock = threading.Lock()
+
+
+def preload(factory, name="preload"):
+    """
+    Start `factory()` in a daemon thread and return a Future for its result,
+    so expensive setup (module imports, model profiles) overlaps with
+    whatever the caller does next instead of blocking it.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(factory())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"preload-{name}", daemon=True).start()
+    return future
+
+
+def preload_modules(*names):
+    """Import `names` in the background; a later `import` of one of them waits for it instead of starting over."""
+    return preload(lambda: [importlib.import_module(name) for name in names], "imports")
+
+
+def check_api_key(client, ttl=API_KEY_CHECK_TTL, timeout=10.0):
+    """
+    Whether the API accepts `client`'s key, using one models.list request
+    (no tokens, no model call) instead of a completion. Answers are
+    remembered per key hash for `ttl` seconds, so reruns and other sessions
+    with the same key do not ask again. Network errors are raised, not
+    remembered, so a blip does not mark a good key invalid.
+    """
+    import openai
+
+    digest = hashlib.sha256(client.api_key.encode("utf-8")).hexdigest()
+    now = time.monotonic()
+    with _key_lock:
+        cached = _key_checks.get(digest)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    try:
+        client.with_options(timeout=timeout, max_retries=0).models.list()
+        valid = True
+    except openai.PermissionDeniedError:
+        # A restricted key may not list models but did authenticate
+        valid = True
+    except openai.AuthenticationError:
+        valid = False
+    with _key_lock:
+        _key_checks[digest] = (valid, now + ttl)
+    return valid
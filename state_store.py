@@ -0,0 +1,296 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import deque
+
+DEFAULT_STATE_PATH = os.getenv(
+    "STATE_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache", "state.sqlite3")
+)
+
+
+class StateStore(ABC):
+    """
+    Counters that admission control shares between server workers.
+
+    `open_connection` and `acquire_client_slot` atomically check a limit and
+    take one unit, returning False when the limit is reached. `charge_audio`
+    returns None when the audio fits the client's budget for the window, or
+    the seconds until it would. Implementations: MemoryStateStore (one
+    process) and SQLiteStateStore (all workers on one machine); other
+    backends can be added with `register_store`. Stores whose calls wait on
+    I/O set `blocking`, and callers on an event loop run them in a thread.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def open_connection(self, client_id, limit):
+        pass
+
+    @abstractmethod
+    def close_connection(self, client_id):
+        pass
+
+    @abstractmethod
+    def acquire_client_slot(self, client_id, limit):
+        pass
+
+    @abstractmethod
+    def release_client_slot(self, client_id):
+        pass
+
+    @abstractmethod
+    def charge_audio(self, client_id, seconds, limit, window):
+        pass
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def _retry_after(charges, excess, window, now):
+    """Seconds until `excess` audio seconds of the oldest `charges` leave the window."""
+    freed = 0.0
+    for charged_at, seconds in charges:
+        freed += seconds
+        if freed >= excess:
+            return max(charged_at + window - now, 0.1)
+    return window
+
+
+class MemoryStateStore(StateStore):
+    """In-process state; correct only with a single server worker."""
+
+    def __init__(self):
+        self._connections = {}
+        self._slots = {}
+        self._audio = {}
+
+    def open_connection(self, client_id, limit):
+        if sum(self._connections.values()) >= limit:
+            return False
+        self._connections[client_id] = self._connections.get(client_id, 0) + 1
+        return True
+
+    def close_connection(self, client_id):
+        remaining = self._connections.get(client_id, 0) - 1
+        if remaining > 0:
+            self._connections[client_id] = remaining
+        else:
+            self._connections.pop(client_id, None)
+
+    def acquire_client_slot(self, client_id, limit):
+        if self._slots.get(client_id, 0) >= limit:
+            return False
+        self._slots[client_id] = self._slots.get(client_id, 0) + 1
+        return True
+
+    def release_client_slot(self, client_id):
+        remaining = self._slots.get(client_id, 0) - 1
+        if remaining > 0:
+            self._slots[client_id] = remaining
+        else:
+            self._slots.pop(client_id, None)
+
+    def charge_audio(self, client_id, seconds, limit, window):
+        now = time.time()
+        if len(self._audio) > 4096:
+            # Forget clients with nothing left in the window
+            for stale in [key for key, charges in self._audio.items() if charges[-1][0] <= now - window]:
+                del self._audio[stale]
+        charges = self._audio.setdefault(client_id, deque())
+        while charges and charges[0][0] <= now - window:
+            charges.popleft()
+        total = sum(charged for _, charged in charges)
+        # A clip longer than the whole budget is still let through on an empty window
+        if total > 0 and total + seconds > limit:
+            return _retry_after(charges, total + seconds - limit, window, now)
+        charges.append((now, seconds))
+        return None
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "connections": sum(self._connections.values()),
+            "clients": len(self._connections),
+            "client_slots": sum(self._slots.values()),
+        }
+
+
+class SQLiteStateStore(StateStore):
+    """
+    State shared by every worker process on one machine through a WAL-mode
+    SQLite file. Rows are tagged with the owning worker's pid, so counts
+    held by a worker that died are dropped when the next worker starts.
+    """
+
+    # BEGIN IMMEDIATE can wait up to `timeout` seconds for another worker
+    blocking = True
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.worker_id = os.getpid()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS connections ("
+            " client_id TEXT NOT NULL, worker_id INTEGER NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (client_id, worker_id));"
+            "CREATE TABLE IF NOT EXISTS client_slots ("
+            " client_id TEXT NOT NULL, worker_id INTEGER NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (client_id, worker_id));"
+            "CREATE TABLE IF NOT EXISTS audio ("
+            " client_id TEXT NOT NULL, charged_at REAL NOT NULL, seconds REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS audio_client ON audio (client_id, charged_at);"
+        )
+        self._drop_dead_workers()
+
+    def _transaction(self):
+        return _Transaction(self._db, self._lock)
+
+    def _drop_dead_workers(self):
+        with self._transaction() as db:
+            workers = {row[0] for table in ("connections", "client_slots")
+                       for row in db.execute(f"SELECT DISTINCT worker_id FROM {table}")}
+            for worker_id in workers:
+                if worker_id != self.worker_id and not _pid_alive(worker_id):
+                    db.execute("DELETE FROM connections WHERE worker_id = ?", (worker_id,))
+                    db.execute("DELETE FROM client_slots WHERE worker_id = ?", (worker_id,))
+
+    def _take(self, db, table, client_id):
+        db.execute(
+            f"INSERT INTO {table} (client_id, worker_id, count) VALUES (?, ?, 1)"
+            " ON CONFLICT (client_id, worker_id) DO UPDATE SET count = count + 1",
+            (client_id, self.worker_id)
+        )
+
+    def _give_back(self, db, table, client_id):
+        db.execute(f"UPDATE {table} SET count = count - 1 WHERE client_id = ? AND worker_id = ?",
+                   (client_id, self.worker_id))
+        db.execute(f"DELETE FROM {table} WHERE count <= 0")
+
+    def open_connection(self, client_id, limit):
+        with self._transaction() as db:
+            (total,) = db.execute("SELECT COALESCE(SUM(count), 0) FROM connections").fetchone()
+            if total >= limit:
+                return False
+            self._take(db, "connections", client_id)
+            return True
+
+    def close_connection(self, client_id):
+        with self._transaction() as db:
+            self._give_back(db, "connections", client_id)
+
+    def acquire_client_slot(self, client_id, limit):
+        with self._transaction() as db:
+            (count,) = db.execute("SELECT COALESCE(SUM(count), 0) FROM client_slots WHERE client_id = ?",
+                                  (client_id,)).fetchone()
+            if count >= limit:
+                return False
+            self._take(db, "client_slots", client_id)
+            return True
+
+    def release_client_slot(self, client_id):
+        with self._transaction() as db:
+            self._give_back(db, "client_slots", client_id)
+
+    def charge_audio(self, client_id, seconds, limit, window):
+        now = time.time()
+        with self._transaction() as db:
+            # Expire every client's old charges, not just this one's
+            db.execute("DELETE FROM audio WHERE charged_at <= ?", (now - window,))
+            charges = db.execute("SELECT charged_at, seconds FROM audio WHERE client_id = ? ORDER BY charged_at",
+                                 (client_id,)).fetchall()
+            total = sum(charged for _, charged in charges)
+            if total > 0 and total + seconds > limit:
+                return _retry_after(charges, total + seconds - limit, window, now)
+            db.execute("INSERT INTO audio (client_id, charged_at, seconds) VALUES (?, ?, ?)", (client_id, now, seconds))
+            return None
+
+    def stats(self):
+        with self._lock:
+            connections, clients = self._db.execute(
+                "SELECT COALESCE(SUM(count), 0), COUNT(DISTINCT client_id) FROM connections").fetchone()
+            (slots,) = self._db.execute("SELECT COALESCE(SUM(count), 0) FROM client_slots").fetchone()
+            (workers,) = self._db.execute("SELECT COUNT(DISTINCT worker_id) FROM connections").fetchone()
+        return {
+            "backend": "sqlite",
+            "connections": connections,
+            "clients": clients,
+            "client_slots": slots,
+            "workers_with_connections": workers,
+        }
+
+    def close(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM connections WHERE worker_id = ?", (self.worker_id,))
+            db.execute("DELETE FROM client_slots WHERE worker_id = ?", (self.worker_id,))
+        self._db.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so check-and-update is atomic across processes."""
+
+    def __init__(self, db, lock):
+        self._db = db
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            # Raises "database is locked" once the busy timeout runs out
+            self._db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._db.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+        finally:
+            self._lock.release()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+STORES = {
+    "memory": lambda location: MemoryStateStore(),
+    "sqlite": lambda location: SQLiteStateStore(location or DEFAULT_STATE_PATH),
+}
+
+
+def register_store(scheme, factory):
+    """Add a backend, e.g. register_store("redis", lambda location: RedisStateStore(location))."""
+    STORES[scheme] = factory
+
+
+def create_state_store(spec=None, workers=None):
+    """
+    Build a store from a spec such as "memory", "sqlite" or
+    "sqlite:///var/run/translator/state.sqlite3" (env STATE_STORE). Without a
+    spec, multi-worker deployments (WEB_CONCURRENCY > 1) get SQLite.
+    """
+    workers = workers if workers is not None else int(os.getenv("WEB_CONCURRENCY", "1"))
+    spec = spec or os.getenv("STATE_STORE") or ("sqlite" if workers > 1 else "memory")
+    scheme, _, location = spec.partition("://")
+    try:
+        factory = STORES[scheme]
+    except KeyError:
+        raise ValueError(f"unknown state store {scheme!r}, expected one of {sorted(STORES)}") from None
+    return factory(location or None)
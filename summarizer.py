@@ -0,0 +1,166 @@
+import asyncio
+import os
+import time
+
+from translation_cache import TranslationCache
+
+# Cache namespace for summaries; the model per call is picked by the router
+SUMMARY_MODEL = "gpt-4"
+# Bump when the prompts change so stale cached summaries are not reused
+SUMMARY_PROMPT_VERSION = "summary-v1"
+DEFAULT_SUMMARY_CACHE_PATH = os.getenv(
+    "SUMMARY_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache", "summaries.sqlite3")
+)
+
+SECTIONS_INSTRUCTION = (
+    "Use three short bulleted sections: key points, decisions, and action items (with owners if named). "
+    "Leave a section out if there is nothing for it. Keep names, numbers and dates exact."
+)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count without a tokenizer: about four ASCII characters per
+    token, and one token per Korean/Japanese/Chinese character.
+    """
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+
+def chunk_utterances(utterances, budget):
+    """
+    Group consecutive utterances into chunks of at most `budget` tokens.
+    Chunks are filled greedily from the start, so appending utterances only
+    ever changes the last chunk or adds new ones after it. An utterance
+    longer than the budget gets a chunk of its own.
+    """
+    chunks, current, size = [], [], 0
+    for utterance in utterances:
+        tokens = estimate_tokens(utterance) + 1
+        if current and size + tokens > budget:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(utterance)
+        size += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def transcript_lines(entries, field="original"):
+    """TranscriptStore entries as "[HH:MM:SS] text" lines, the form `summarize()` expects."""
+    return [f"[{time.strftime('%H:%M:%S', time.localtime(entry['created_at']))}] {entry[field]}"
+            for entry in entries if entry[field]]
+
+
+def map_messages(chunk, language, max_words):
+    return [
+        {"role": "system", "content": (
+            "You summarize one part of a meeting or lecture transcript. Lines start with the time they were said. "
+            f"{SECTIONS_INSTRUCTION} Write in the language with ISO code '{language}', at most {max_words} words."
+        )},
+        {"role": "user", "content": chunk}
+    ]
+
+
+def reduce_messages(summaries, language, max_words):
+    parts = "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+    return [
+        {"role": "system", "content": (
+            "You merge summaries of consecutive parts of one meeting or lecture, given in order, into one summary. "
+            "Drop repetition, keep what was decided last when parts disagree, and keep every action item. "
+            f"{SECTIONS_INSTRUCTION} Write in the language with ISO code '{language}', at most {max_words} words."
+        )},
+        {"role": "user", "content": parts}
+    ]
+
+
+class Summarizer:
+    """
+    Map-reduce summaries of long transcripts.
+
+    `summarize(utterances)` splits the transcript into chunks of about
+    `chunk_tokens` tokens (see `chunk_utterances`), summarizes the chunks
+    concurrently with at most `concurrency` requests in flight, then merges
+    the summaries `fan_in` at a time, level by level, until one is left.
+
+    Every summary is cached by its exact input (TranslationCache: memory
+    LRU + SQLite). Chunk boundaries only move at the end of a transcript
+    and groups are fixed by position, so when utterances are appended only
+    the tail chunk and the merges above it are recomputed; a running
+    meeting summary costs about one request per tree level.
+
+    `complete(messages, text)` is a coroutine function returning the
+    model's reply, e.g. TranslationManager.complete_chat with a route.
+    """
+
+    def __init__(self, complete, cache=None, language="ko", chunk_tokens=1500, fan_in=6, max_words=200,
+                 concurrency=4, model=SUMMARY_MODEL):
+        self.complete = complete
+        self.cache = cache if cache is not None else TranslationCache(path=DEFAULT_SUMMARY_CACHE_PATH)
+        self.language = language
+        self.chunk_tokens = chunk_tokens
+        self.fan_in = max(2, fan_in)
+        self.max_words = max_words
+        self.model = model
+        self._limit = asyncio.Semaphore(concurrency)
+        self._counters = {"summaries": 0, "chunks": 0, "computed": 0, "reused": 0, "levels": 0,
+                          "summary_ms_total": 0.0}
+
+    @classmethod
+    def from_env(cls, complete, cache=None, language="ko"):
+        return cls(
+            complete, cache=cache, language=language,
+            chunk_tokens=int(os.getenv("SUMMARY_CHUNK_TOKENS", "1500")),
+            fan_in=int(os.getenv("SUMMARY_FAN_IN", "6")),
+            max_words=int(os.getenv("SUMMARY_MAX_WORDS", "200")),
+            concurrency=int(os.getenv("SUMMARY_CONCURRENCY", "4")),
+        )
+
+    async def summarize(self, utterances, language=None):
+        """One summary of `utterances` (strings, in order); "" for an empty transcript."""
+        language = language or self.language
+        started = time.perf_counter()
+        chunks = chunk_utterances(utterances, self.chunk_tokens)
+        if not chunks:
+            return ""
+        summaries = await asyncio.gather(*(
+            self._node(0, chunk, map_messages(chunk, language, self.max_words), language) for chunk in chunks
+        ))
+        level = 0
+        while len(summaries) > 1:
+            level += 1
+            groups = [summaries[i:i + self.fan_in] for i in range(0, len(summaries), self.fan_in)]
+            summaries = await asyncio.gather(*(self._merge(level, group, language) for group in groups))
+        self._counters["summaries"] += 1
+        self._counters["chunks"] += len(chunks)
+        self._counters["levels"] += level + 1
+        self._counters["summary_ms_total"] += (time.perf_counter() - started) * 1000
+        return summaries[0]
+
+    async def _merge(self, level, group, language):
+        if len(group) == 1:
+            # A lone trailing summary moves up a level unchanged
+            return group[0]
+        messages = reduce_messages(group, language, self.max_words)
+        return await self._node(level, messages[1]["content"], messages, language)
+
+    async def _node(self, level, text, messages, language):
+        cache_args = (text, f"level{level}", language, self.model, SUMMARY_PROMPT_VERSION)
+        summary = await self.cache.aget(*cache_args)
+        if summary is not None:
+            self._counters["reused"] += 1
+            return summary
+        async with self._limit:
+            summary = (await self.complete(messages, text)).strip()
+        self._counters["computed"] += 1
+        await self.cache.aput(*cache_args, summary)
+        return summary
+
+    def stats(self):
+        summaries = self._counters["summaries"]
+        return {
+            **{key: value for key, value in self._counters.items() if key != "summary_ms_total"},
+            "summary_ms_avg": self._counters["summary_ms_total"] / summaries if summaries else 0.0,
+        }
@@ -0,0 +1,207 @@
+import asyncio
+import functools
+import io
+import time
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg
+
+# Whisper input format produced by every decode path
+TARGET_SAMPLE_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2
+
+# Format hint for payloads that are already raw 16 kHz mono PCM16
+PCM_FORMAT = "pcm_s16le"
+
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg cannot decode a payload."""
+
+
+class TranscoderBusy(Exception):
+    """Raised when the wait queue in front of the decoder pool is full."""
+
+
+def extract_pcm_from_wav(audio_data):
+    """
+    Return the PCM frames of a WAV payload that is already 16 kHz mono PCM16,
+    or None when the payload needs a real decode.
+    """
+    if len(audio_data) < 12 or audio_data[:4] != b"RIFF" or audio_data[8:12] != b"WAVE":
+        return None
+    try:
+        with wave.open(io.BytesIO(audio_data), "rb") as wav:
+            if (
+                wav.getframerate() != TARGET_SAMPLE_RATE
+                or wav.getnchannels() != TARGET_CHANNELS
+                or wav.getsampwidth() != TARGET_SAMPLE_WIDTH
+                or wav.getcomptype() != "NONE"
+            ):
+                return None
+            return wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+
+def pcm_to_wav(pcm, name="audio.wav"):
+    """Wrap 16 kHz mono PCM16 in an in-memory WAV file for upload."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(TARGET_CHANNELS)
+        wav.setsampwidth(TARGET_SAMPLE_WIDTH)
+        wav.setframerate(TARGET_SAMPLE_RATE)
+        wav.writeframes(pcm)
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+class _DecoderWorker:
+    """
+    Owns one ffmpeg process that is spawned ahead of time, so a job only has
+    to feed stdin instead of paying for fork+exec on the critical path.
+    """
+
+    def __init__(self):
+        self._process = None
+
+    def _spawn(self):
+        return (
+            ffmpeg
+            .input('pipe:0')
+            .output('pipe:1', acodec='pcm_s16le', ac=TARGET_CHANNELS, ar='16k')
+            .global_args('-loglevel', 'error')
+            .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+        )
+
+    def prepare(self):
+        if self._process is None or self._process.poll() is not None:
+            self._process = self._spawn()
+
+    def decode(self, audio_data):
+        self.prepare()
+        process, self._process = self._process, None
+        output_data, error_output = process.communicate(input=audio_data)
+        if process.returncode != 0:
+            message = error_output.decode(errors="replace").strip()
+            raise TranscodeError(message or f"ffmpeg exited with code {process.returncode}")
+        return output_data
+
+    def close(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+
+class AudioTranscoder:
+    """
+    Bounded pool of ffmpeg decoder workers that run off the event loop.
+
+    At most `pool_size` decodes run at once; up to `max_queue` further jobs
+    wait for a free worker and anything beyond that raises TranscoderBusy.
+    Payloads that are already 16 kHz mono PCM16 (raw or WAV) skip ffmpeg.
+    """
+
+    def __init__(self, pool_size=4, max_queue=32, stats_window=1024):
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="transcoder")
+        self._workers = [_DecoderWorker() for _ in range(pool_size)]
+        self._idle = None
+        self._waiting = 0
+        self._in_flight = 0
+        self._decode_times = deque(maxlen=stats_window)
+        self._counters = {"decoded": 0, "fast_path": 0, "errors": 0, "rejected": 0}
+        self._total_decode_seconds = 0.0
+
+    def _idle_queue(self):
+        # Created lazily so the queue binds to the running event loop
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self._workers:
+                self._idle.put_nowait(worker)
+        return self._idle
+
+    async def prewarm(self):
+        """Spawn every worker's ffmpeg process now instead of on its first decode."""
+        loop = asyncio.get_running_loop()
+        self._idle_queue()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, worker.prepare) for worker in self._workers))
+
+    async def decode(self, audio_data, fmt=None):
+        """Convert `audio_data` to 16 kHz mono PCM16 bytes."""
+        if fmt == PCM_FORMAT:
+            self._counters["fast_path"] += 1
+            return audio_data
+        pcm = extract_pcm_from_wav(audio_data)
+        if pcm is not None:
+            self._counters["fast_path"] += 1
+            return pcm
+
+        idle = self._idle_queue()
+        if idle.empty() and self._waiting >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise TranscoderBusy(f"transcoder queue is full ({self.max_queue} waiting)")
+
+        self._waiting += 1
+        try:
+            worker = await idle.get()
+        finally:
+            self._waiting -= 1
+
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            output_data = await loop.run_in_executor(self._executor, worker.decode, audio_data)
+        except Exception:
+            self._counters["errors"] += 1
+            raise
+        else:
+            elapsed = time.perf_counter() - started
+            self._counters["decoded"] += 1
+            self._total_decode_seconds += elapsed
+            self._decode_times.append(elapsed)
+            return output_data
+        finally:
+            self._in_flight -= 1
+            # Respawn the worker's ffmpeg process before handing it back
+            refill = loop.run_in_executor(self._executor, worker.prepare)
+            refill.add_done_callback(functools.partial(self._release, worker))
+
+    def _release(self, worker, refill):
+        # A failed respawn is retried by the worker on its next decode
+        if not refill.cancelled():
+            refill.exception()
+        self._idle.put_nowait(worker)
+
+    def stats(self):
+        """Queue depth and decode timings, used to size the pool."""
+        times = sorted(self._decode_times)
+
+        def percentile(p):
+            if not times:
+                return 0.0
+            return times[min(len(times) - 1, int(p * len(times)))] * 1000
+
+        decoded = self._counters["decoded"]
+        return {
+            "pool_size": self.pool_size,
+            "max_queue": self.max_queue,
+            "queue_depth": self._waiting,
+            "in_flight": self._in_flight,
+            **self._counters,
+            "decode_ms_avg": (self._total_decode_seconds / decoded * 1000) if decoded else 0.0,
+            "decode_ms_p50": percentile(0.50),
+            "decode_ms_p95": percentile(0.95),
+            "decode_ms_max": times[-1] * 1000 if times else 0.0,
+        }
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        self._executor.shutdown(wait=False)
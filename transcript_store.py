@@ -0,0 +1,258 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TRANSCRIPT_PATH = os.getenv(
+    "TRANSCRIPT_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache", "transcripts.sqlite3")
+)
+
+FIELDS = ("id", "session_id", "created_at", "source_lang", "target_lang", "original", "translated", "timings")
+EXPORT_FORMATS = ("jsonl", "csv")
+
+
+def _fts_tokenizer(db):
+    # Trigrams match inside Korean/Japanese words (particles attached), but need SQLite 3.34+
+    try:
+        db.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(text, tokenize='trigram')")
+        db.execute("DROP TABLE temp.fts_probe")
+        return "trigram"
+    except sqlite3.OperationalError:
+        return "unicode61"
+
+
+class TranscriptStore:
+    """
+    Conversation history: one entry per translated utterance.
+
+    `append()` only queues the entry in memory; a background thread writes
+    queued entries to SQLite in one transaction every `flush_interval`
+    seconds or as soon as `batch_size` are waiting, so callers never wait
+    on disk. Entries are indexed by time and session, and their text by an
+    FTS5 table for `search()`. Lookups flush first, so they see every
+    entry appended before them. If writes fall more than `max_pending`
+    entries behind, the oldest queued entries are dropped and counted.
+    Pass `path=None` to disable the store.
+    """
+
+    def __init__(self, path=DEFAULT_TRANSCRIPT_PATH, batch_size=256, flush_interval=1.0, max_pending=20000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._counters = {"appended": 0, "written": 0, "flushes": 0, "dropped": 0, "flush_ms_total": 0.0}
+        self._db = None
+        self._thread = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = self._connect()
+            self.tokenizer = _fts_tokenizer(self._db)
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY,"
+                " session_id TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " source_lang TEXT, target_lang TEXT,"
+                " original TEXT NOT NULL, translated TEXT NOT NULL,"
+                " timings TEXT);"
+                "CREATE INDEX IF NOT EXISTS entries_time ON entries (created_at);"
+                "CREATE INDEX IF NOT EXISTS entries_session ON entries (session_id, created_at);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+                f" original, translated, content='entries', content_rowid='id', tokenize='{self.tokenizer}');"
+            )
+            self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+            self._thread.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def append(self, session_id, original, translated, source_lang=None, target_lang=None, timings=None,
+               created_at=None):
+        """Queue one entry; returns immediately."""
+        if self._db is None:
+            return
+        entry = (session_id, created_at or time.time(), source_lang, target_lang, original, translated,
+                 json.dumps(timings) if timings else None)
+        with self._lock:
+            self._pending.append(entry)
+            self._counters["appended"] += 1
+            if len(self._pending) > self.max_pending:
+                overflow = len(self._pending) - self.max_pending
+                del self._pending[:overflow]
+                self._counters["dropped"] += overflow
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                # Entries stay queued and are retried on the next flush
+                print(f"Transcript flush failed: {e}")
+
+    def flush(self):
+        """Write every queued entry now; returns how many were written."""
+        if self._db is None:
+            return 0
+        with self._db_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                # IMMEDIATE: other server workers may be appending to the same file
+                self._db.execute("BEGIN IMMEDIATE")
+                first_id = self._db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM entries").fetchone()[0]
+                rows = [(first_id + i, *entry) for i, entry in enumerate(batch)]
+                self._db.executemany(
+                    "INSERT INTO entries (id, session_id, created_at, source_lang, target_lang, original, translated,"
+                    " timings) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._db.executemany(
+                    "INSERT INTO entries_fts (rowid, original, translated) VALUES (?, ?, ?)",
+                    [(row[0], row[5], row[6]) for row in rows]
+                )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                # Re-queued first: when BEGIN itself failed there is nothing to roll back
+                with self._lock:
+                    self._pending[:0] = batch
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+            self._counters["written"] += len(batch)
+            self._counters["flushes"] += 1
+            self._counters["flush_ms_total"] += (time.perf_counter() - started) * 1000
+            return len(batch)
+
+    def _where(self, session_id, start, end):
+        clauses, params = [], []
+        if session_id is not None:
+            clauses.append("e.session_id = ?")
+            params.append(session_id)
+        if start is not None:
+            clauses.append("e.created_at >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("e.created_at < ?")
+            params.append(end)
+        return clauses, params
+
+    @staticmethod
+    def _entry(row):
+        entry = dict(zip(FIELDS, row))
+        entry["timings"] = json.loads(entry["timings"]) if entry["timings"] else {}
+        return entry
+
+    def range(self, start=None, end=None, session_id=None, limit=100, newest_first=False):
+        """Entries with `start <= created_at < end` (either bound optional), oldest first by default."""
+        if self._db is None:
+            return []
+        self.flush()
+        clauses, params = self._where(session_id, start, end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join('e.' + field for field in FIELDS)} FROM entries e {where}"
+                f" ORDER BY e.created_at {'DESC' if newest_first else 'ASC'}, e.id LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def search(self, query, session_id=None, start=None, end=None, limit=50):
+        """Entries whose original or translated text matches `query` (FTS5 syntax), newest first."""
+        if self._db is None:
+            return []
+        self.flush()
+        clauses, params = self._where(session_id, start, end)
+        if self.tokenizer == "trigram" and len(query.strip()) < 3:
+            # Too short for a trigram lookup; scan instead
+            pattern = f"%{query.strip()}%"
+            clauses.append("(e.original LIKE ? OR e.translated LIKE ?)")
+            with self._db_lock:
+                rows = self._db.execute(
+                    f"SELECT {', '.join('e.' + field for field in FIELDS)} FROM entries e"
+                    f" WHERE {' AND '.join(clauses)} ORDER BY e.created_at DESC LIMIT ?",
+                    (*params, pattern, pattern, limit)
+                ).fetchall()
+            return [self._entry(row) for row in rows]
+        # A plain phrase unless the caller wrote FTS5 syntax
+        match = query if any(op in query for op in ('"', " OR ", " AND ", " NOT ", "*")) else f'"{query}"'
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join('e.' + field for field in FIELDS)} FROM entries_fts"
+                " JOIN entries e ON e.id = entries_fts.rowid"
+                f" WHERE entries_fts MATCH ? {''.join(' AND ' + clause for clause in clauses)}"
+                " ORDER BY e.created_at DESC LIMIT ?", (match, *params, limit)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def export(self, session_id=None, start=None, end=None, fmt="jsonl", chunk_size=500):
+        """
+        Yield the matching entries as JSONL lines or CSV rows, oldest first.
+        Reads through its own connection in chunks, so exporting a long
+        meeting neither loads it into memory nor blocks writers.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"unknown export format {fmt!r}, expected one of {EXPORT_FORMATS}")
+        if self._db is None:
+            return
+        self.flush()
+        clauses, params = self._where(session_id, start, end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        db = self._connect()
+        try:
+            cursor = db.execute(
+                f"SELECT {', '.join('e.' + field for field in FIELDS)} FROM entries e {where}"
+                " ORDER BY e.created_at, e.id", params
+            )
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(FIELDS)
+            while rows := cursor.fetchmany(chunk_size):
+                if fmt == "jsonl":
+                    yield "".join(json.dumps(self._entry(row), ensure_ascii=False) + "\n" for row in rows)
+                else:
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            if fmt == "csv" and buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            db.close()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        flushes = self._counters["flushes"]
+        return {
+            **{key: value for key, value in self._counters.items() if key != "flush_ms_total"},
+            "pending": pending,
+            "flush_ms_avg": self._counters["flush_ms_total"] / flushes if flushes else 0.0,
+        }
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._db is not None:
+            self.flush()
+            self._db.close()
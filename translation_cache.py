@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "TRANSLATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache", "translations.sqlite3")
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normalize text so trivially different inputs share a cache entry."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text, source_lang, target_lang, model, prompt_version):
+    """Content-addressed key for one translation request."""
+    parts = (normalize_text(text), source_lang or "auto", target_lang, model, prompt_version)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """
+    Two-tier translation cache.
+
+    The memory tier is an LRU bounded by `max_entries` with a `memory_ttl`;
+    the SQLite tier survives restarts and expires entries after `disk_ttl`
+    seconds. Expired rows are deleted on open and again every
+    `purge_every` writes, so the file does not grow without bound. Pass
+    `path=None` to run memory-only.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=2048, memory_ttl=3600, disk_ttl=30 * 24 * 3600,
+                 purge_every=1000):
+        self.max_entries = max_entries
+        self.memory_ttl = memory_ttl
+        self.disk_ttl = disk_ttl
+        self.purge_every = purge_every
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0, "purged": 0}
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " key TEXT PRIMARY KEY,"
+                " translation TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS translations_created ON translations (created_at)")
+            self.purge_expired()
+
+    def _memory_get(self, key, now):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        translation, expires_at = entry
+        if expires_at < now:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return translation
+
+    def _memory_put(self, key, translation, now):
+        self._memory[key] = (translation, now + self.memory_ttl)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _memory_lookup(self, key):
+        with self._lock:
+            translation = self._memory_get(key, time.time())
+            if translation is not None:
+                self._counters["memory_hits"] += 1
+            return translation
+
+    def _disk_lookup(self, key):
+        now = time.time()
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT translation FROM translations WHERE key = ? AND created_at >= ?",
+                    (key, now - self.disk_ttl)
+                ).fetchone()
+                if row is not None:
+                    self._counters["disk_hits"] += 1
+                    self._memory_put(key, row[0], now)
+                    return row[0]
+            self._counters["misses"] += 1
+            return None
+
+    def get(self, text, source_lang, target_lang, model, prompt_version):
+        key = cache_key(text, source_lang, target_lang, model, prompt_version)
+        translation = self._memory_lookup(key)
+        return translation if translation is not None else self._disk_lookup(key)
+
+    def put(self, text, source_lang, target_lang, model, prompt_version, translation):
+        key = cache_key(text, source_lang, target_lang, model, prompt_version)
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, translation, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO translations (key, translation, created_at) VALUES (?, ?, ?)",
+                    (key, translation, now)
+                )
+            self._counters["writes"] += 1
+            purge = self._db is not None and self.purge_every and self._counters["writes"] % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    async def aget(self, *args):
+        """`get` for the event loop; memory hits return at once, SQLite lookups run in a worker thread."""
+        key = cache_key(*args)
+        translation = self._memory_lookup(key)
+        if translation is not None or self._db is None:
+            if translation is None:
+                with self._lock:
+                    self._counters["misses"] += 1
+            return translation
+        return await asyncio.to_thread(self._disk_lookup, key)
+
+    async def aput(self, *args):
+        return await asyncio.to_thread(self.put, *args)
+
+    def purge_expired(self):
+        """Drop expired disk entries; returns the number removed."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM translations WHERE created_at < ?", (time.time() - self.disk_ttl,)
+            ).rowcount
+            self._counters["purged"] += removed
+            return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "memory_entries": len(self._memory),
+                "hit_ratio": hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,523 @@
+import asyncio
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import deque
+
+import numpy as np
+
+from translation_cache import normalize_text
+
+DEFAULT_MEMORY_PATH = os.getenv(
+    "TRANSLATION_MEMORY_PATH",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache", "memory.sqlite3")
+)
+
+# Numbers (with decimal/thousands/time separators) or runs of word characters
+_TOKEN = re.compile(r"\d+(?:[.,:]\d+)*|\w+")
+_NUMBER = re.compile(r"\d+(?:[.,:]\d+)*")
+# Whitespace and punctuation other than question marks, which change what a sentence means
+_SEPARATORS = re.compile(r"[^\w?]+")
+_MIX = np.uint64(0x100000001B3)
+
+
+def match_form(text):
+    """
+    The form sentences are compared in: NFKC, lower case, every number
+    replaced by "0", punctuation except question marks dropped. Sentences
+    with the same form differ only in casing, numbers or punctuation.
+    """
+    text = _NUMBER.sub("0", unicodedata.normalize("NFKC", text).lower())
+    return _SEPARATORS.sub(" ", text).strip()
+
+
+def shingle_hashes(form, n=3):
+    """Sorted distinct 32-bit hashes of a match form's character n-grams (one for forms shorter than `n`)."""
+    points = np.frombuffer(form.encode("utf-32-le"), np.uint32).astype(np.uint64)
+    if len(points) < n:
+        points = np.concatenate([points, np.zeros(n - len(points), np.uint64)])
+    count = len(points) - n + 1
+    hashes = points[:count].copy()
+    for i in range(1, n):
+        # Wraps around in uint64, which is fine for hashing
+        hashes = hashes * _MIX ^ points[i:i + count]
+    return np.unique(hashes & 0xFFFFFFFF)
+
+
+def jaccard(a, b):
+    """Jaccard similarity of two `shingle_hashes` arrays."""
+    common = np.intersect1d(a, b, assume_unique=True).size
+    return common / (a.size + b.size - common)
+
+
+def _continues(token, char):
+    # Korean/Japanese text attaches particles and counters to names and
+    # numbers ("Alice는", "3시"), so only same-script neighbours extend a token
+    return (char.isascii() and char.isalnum()) if token.isascii() else (char.isalnum() or char == "_")
+
+
+def _occurrences(token, text):
+    """Start offsets of `token` in `text` where it stands as a whole token."""
+    found, start = [], text.find(token)
+    while start >= 0:
+        end = start + len(token)
+        if not (start and _continues(token, text[start - 1])) and not (end < len(text) and _continues(token, text[end])):
+            found.append(start)
+        start = text.find(token, start + 1)
+    return found
+
+
+def _token_kind(token):
+    """"number" or "capitalized" for tokens a translation copies as they are, else None."""
+    if token[0].isdigit():
+        return "number"
+    return "capitalized" if token[0].isupper() else None
+
+
+def substitute(text, source, translation, max_substitutions=2):
+    """
+    Adapt `translation` of `source` to `text` when they differ only in
+    tokens the translation copies verbatim, numbers and capitalized tokens
+    such as names and codes: each differing token must occur exactly once
+    in the translation and is replaced there by a token of the same kind
+    (number for number, capitalized for capitalized). Casing-only
+    differences are ignored; any other changed word is translated, not copied.
+    Returns None when the translation cannot be adapted this way, e.g.
+    when a translated word changed.
+    """
+    text, source = normalize_text(text), normalize_text(source)
+    text_tokens, source_tokens = _TOKEN.findall(text), _TOKEN.findall(source)
+    if len(text_tokens) != len(source_tokens) or ("?" in text) != ("?" in source):
+        return None
+    changes = [(old, new) for old, new in zip(source_tokens, text_tokens) if old.lower() != new.lower()]
+    if len(changes) > max_substitutions:
+        return None
+    for old, new in changes:
+        found = _occurrences(old, translation)
+        if _token_kind(old) is None or _token_kind(old) != _token_kind(new) or len(found) != 1:
+            return None
+        translation = translation[:found[0]] + new + translation[found[0] + len(old):]
+    return translation
+
+
+class MinHasher:
+    """MinHash signatures of `shingle_hashes` arrays, with `num_perm` multiply-shift hash functions."""
+
+    def __init__(self, num_perm=32, seed=7):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        # (a * x + b) mod 2**64, top 32 bits; no division, unlike the modular-prime family
+        return ((np.outer(hashes, self._a) + self._b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+
+class Glossary:
+    """
+    User terminology per language pair: `term` in the source language is
+    always translated as `translation`. Terms found in a text are given to
+    the model with the prompt (see `prompt_context`).
+    """
+
+    def __init__(self, db=None):
+        self._db = db
+        self._lock = threading.Lock()
+        self._terms = {}
+        if db is not None:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS glossary ("
+                " source_lang TEXT NOT NULL, target_lang TEXT NOT NULL,"
+                " term TEXT NOT NULL, translation TEXT NOT NULL,"
+                " PRIMARY KEY (source_lang, target_lang, term))"
+            )
+            for source_lang, target_lang, term, translation in db.execute("SELECT * FROM glossary"):
+                self._set(source_lang, target_lang, term, translation)
+
+    def _set(self, source_lang, target_lang, term, translation):
+        self._terms.setdefault((source_lang, target_lang), {})[term] = (term.lower(), translation)
+
+    def add(self, term, translation, source_lang="auto", target_lang="ko"):
+        """Add or replace one term; `source_lang="auto"` applies it whatever the detected language."""
+        term, translation = normalize_text(term), normalize_text(translation)
+        with self._lock:
+            self._set(source_lang, target_lang, term, translation)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO glossary VALUES (?, ?, ?, ?)",
+                                 (source_lang, target_lang, term, translation))
+
+    def remove(self, term, source_lang="auto", target_lang="ko"):
+        term = normalize_text(term)
+        with self._lock:
+            self._terms.get((source_lang, target_lang), {}).pop(term, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM glossary WHERE source_lang = ? AND target_lang = ? AND term = ?",
+                                 (source_lang, target_lang, term))
+
+    def load(self, path):
+        """
+        Add terms from a CSV file (term, translation[, source_lang,
+        target_lang] per row) or a JSON file (a list of objects with those
+        keys). Returns how many terms were added.
+        """
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".json"):
+                rows = [(row["term"], row["translation"], row.get("source_lang", "auto"), row.get("target_lang", "ko"))
+                        for row in json.load(f)]
+            else:
+                rows = [row[:4] + ["auto", "ko"][len(row[:4]) - 2:] for row in csv.reader(f)
+                        if len(row) >= 2 and row[0] != "term"]
+        for term, translation, source_lang, target_lang in rows:
+            self.add(term, translation, source_lang, target_lang)
+        return len(rows)
+
+    def find(self, text, source_lang, target_lang, limit=20):
+        """(term, translation) pairs whose term occurs in `text`, longest terms first."""
+        text = normalize_text(text).lower()
+        with self._lock:
+            candidates = {**self._terms.get(("auto", target_lang), {}),
+                          **self._terms.get((source_lang or "auto", target_lang), {})}
+        found = [(term, translation) for term, (lowered, translation) in candidates.items()
+                 if lowered in text and _occurrences(lowered, text)]
+        return sorted(found, key=lambda item: -len(item[0]))[:limit]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(terms) for terms in self._terms.values())
+
+
+class MemoryMatch:
+    """
+    Result of `TranslationMemory.lookup()`: `translation` is set when a past
+    translation can be reused as is (`kind` "exact" or "substituted");
+    otherwise `examples` holds close past (source, translation) pairs and
+    `terms` the glossary terms in the text, for `prompt_context()`.
+    """
+
+    def __init__(self, kind=None, translation=None, similarity=0.0, examples=(), terms=()):
+        self.kind = kind
+        self.translation = translation
+        self.similarity = similarity
+        self.examples = list(examples)
+        self.terms = list(terms)
+
+
+def prompt_context(match, max_chars=200):
+    """Glossary terms and close examples as a few compact lines for the system prompt; "" if there are none."""
+    if match is None:
+        return ""
+    lines = []
+    if match.terms:
+        lines.append("Always translate these terms as given: "
+                     + "; ".join(f"{term} = {translation}" for term, translation in match.terms))
+    if match.examples:
+        lines.append("Approved translations of similar sentences, for terminology and style:")
+        lines.extend(f"- {source[:max_chars]} => {translation[:max_chars]}" for source, translation in match.examples)
+    return "\n".join(lines)
+
+
+class TranslationMemory:
+    """
+    Reuse of past translations for sentences that are almost the same.
+
+    Speakers repeat sentences that differ only in punctuation, casing,
+    numbers or a name, which exact-match caching misses. Every stored
+    sentence is indexed by its match form (see `match_form`) and by a
+    MinHash signature of the form's character trigrams, banded into an LSH
+    table, so `lookup()` only compares against a handful of candidates and
+    stays well under a millisecond at hundreds of thousands of entries.
+
+    `lookup()` reuses a past translation when the sentence has the same
+    match form, or is at least `reuse_threshold` similar, and the
+    translation can be adapted by swapping tokens it copies verbatim (see
+    `substitute`). Otherwise the closest past pairs at least
+    `context_threshold` similar, with any glossary terms in the text, are
+    returned as few-shot context for the prompt.
+
+    Entries and the glossary persist in SQLite. A background thread rebuilds
+    the index from stored signatures, so construction does not wait for it
+    (lookups meanwhile only see what is indexed so far), and then every
+    `refresh_interval` seconds indexes entries that other processes sharing
+    the file added or replaced. Pass `path=None` to run memory-only.
+    """
+
+    def __init__(self, path=DEFAULT_MEMORY_PATH, reuse_threshold=0.6, context_threshold=0.5, max_examples=2,
+                 max_entries=500000, num_perm=32, bands=8, refresh_interval=5.0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.reuse_threshold = reuse_threshold
+        self.context_threshold = context_threshold
+        self.max_examples = max_examples
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self.bands = bands
+        self._rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._band_mix = np.random.default_rng(11).integers(1, 1 << 63, self._rows, dtype=np.uint64)
+        self._lock = threading.Lock()
+        # Serializes SQLite writes, which happen outside `_lock` (see `add`)
+        self._db_lock = threading.Lock()
+        # Index changes not yet written to SQLite, oldest first
+        self._writes = deque()
+        # Entries by slot: SQLite id, language pair, source, match form, translation,
+        # time written and a signature matrix row; indexed by match form and by LSH band
+        self._ids, self._pairs, self._sources, self._slot_forms, self._translations = [], [], [], [], []
+        self._written_at = []
+        self._signatures = np.zeros((1024, num_perm), np.uint32)
+        self._forms = {}
+        self._buckets = {}
+        self._counters = {"lookups": 0, "exact": 0, "substituted": 0, "context": 0, "misses": 0, "added": 0,
+                          "skipped_full": 0, "lookup_ms_total": 0.0, "lookup_ms_max": 0.0}
+        self._db = None
+        self._loader = None
+        self._loaded = threading.Event()
+        self._stop = threading.Event()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY,"
+                " pair TEXT NOT NULL,"
+                " source TEXT NOT NULL, translation TEXT NOT NULL,"
+                " signature BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created_at)")
+            self._loader = threading.Thread(target=self._load, args=(path,), name="translation-memory", daemon=True)
+            self._loader.start()
+        else:
+            self._loaded.set()
+        self.glossary = Glossary(self._db)
+
+    @classmethod
+    def from_env(cls, path=DEFAULT_MEMORY_PATH):
+        memory = cls(
+            path=path,
+            reuse_threshold=float(os.getenv("TM_REUSE_THRESHOLD", "0.6")),
+            context_threshold=float(os.getenv("TM_CONTEXT_THRESHOLD", "0.5")),
+            max_examples=int(os.getenv("TM_MAX_EXAMPLES", "2")),
+            max_entries=int(os.getenv("TM_MAX_ENTRIES", "500000")),
+            refresh_interval=float(os.getenv("TM_REFRESH_S", "5")),
+        )
+        glossary_path = os.getenv("TM_GLOSSARY_PATH")
+        if glossary_path:
+            memory.glossary.load(glossary_path)
+        return memory
+
+    @staticmethod
+    def _pair(source_lang, target_lang):
+        return f"{source_lang or 'auto'}>{target_lang}"
+
+    def _band_keys(self, pair, signature):
+        values = (signature.reshape(self.bands, self._rows).astype(np.uint64) * self._band_mix).sum(axis=1)
+        return [(pair, band, value) for band, value in enumerate(values.tolist())]
+
+    def _index(self, entries, signatures):
+        """Index (entry_id, pair, source, form, translation, written_at) entries with their signature rows."""
+        start = len(self._ids)
+        while start + len(entries) > len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.zeros_like(self._signatures)])
+        self._signatures[start:start + len(entries)] = signatures
+        # Band keys of the whole batch at once; same values as _band_keys
+        band_values = (signatures.reshape(len(entries), self.bands, self._rows).astype(np.uint64)
+                       * self._band_mix).sum(axis=2).tolist()
+        for slot, (entry, values) in enumerate(zip(entries, band_values), start):
+            entry_id, pair, source, form, translation, written_at = entry
+            self._ids.append(entry_id)
+            self._pairs.append(pair)
+            self._sources.append(source)
+            self._slot_forms.append(form)
+            self._translations.append(translation)
+            self._written_at.append(written_at)
+            self._forms[(pair, form)] = slot
+            for band, value in enumerate(values):
+                self._buckets.setdefault((pair, band, value), []).append(slot)
+
+    def _index_rows(self, rows):
+        """
+        Index rows read from SQLite. A row whose match form is already
+        indexed replaces the slot's text only if it was written later.
+        """
+        fresh, signatures = {}, {}
+        for entry_id, pair, source, translation, signature, created_at in rows:
+            key = (pair, match_form(source))
+            if key not in fresh or created_at > fresh[key][5]:
+                fresh[key] = (entry_id, pair, source, key[1], translation, created_at)
+                signatures[key] = signature
+        with self._lock:
+            for key, entry in list(fresh.items()):
+                slot = self._forms.get(key)
+                if slot is not None:
+                    del fresh[key]
+                    if entry[5] > self._written_at[slot]:
+                        self._sources[slot], self._translations[slot], self._written_at[slot] = entry[2], entry[4], entry[5]
+            entries = list(fresh.values())[:max(0, self.max_entries - len(self._ids))]
+            if entries:
+                matrix = np.frombuffer(b"".join(signatures[(entry[1], entry[3])] for entry in entries), np.uint32)
+                self._index(entries, matrix.reshape(len(entries), -1))
+
+    def _load(self, path, batch=2000, overlap=5.0):
+        """Index the stored entries in batches, then keep indexing entries written since."""
+        # Its own connection, so reads never wait on the writers' one
+        db = sqlite3.connect(path, check_same_thread=False)
+        try:
+            since, last_id = time.time() - overlap, 0
+            while not self._stop.is_set():
+                rows = db.execute(
+                    "SELECT id, pair, source, translation, signature, created_at FROM entries"
+                    " WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch)
+                ).fetchall()
+                if not rows:
+                    break
+                self._index_rows(rows)
+                last_id = rows[-1][0]
+            self._loaded.set()
+            while self.refresh_interval and not self._stop.wait(self.refresh_interval):
+                # Rows committed a little after their created_at are read on the next round
+                polled = time.time()
+                self._index_rows(db.execute(
+                    "SELECT id, pair, source, translation, signature, created_at FROM entries"
+                    " WHERE created_at > ? ORDER BY created_at", (since,)
+                ).fetchall())
+                since = polled - overlap
+        except sqlite3.Error as e:
+            print(f"Error loading translation memory: {e}")
+        finally:
+            self._loaded.set()
+            db.close()
+
+    def add(self, source, translation, source_lang, target_lang):
+        """Remember one translation; a sentence with a known match form replaces the older one."""
+        source, translation = normalize_text(source), translation.strip()
+        form = match_form(source)
+        if not form or not translation:
+            return
+        pair = self._pair(source_lang, target_lang)
+        signature = self._hasher.signature(shingle_hashes(form))
+        with self._lock:
+            slot = self._forms.get((pair, form))
+            written_at = time.time()
+            if slot is not None:
+                # Same form, so same shingles and signature: only the text changes
+                self._sources[slot], self._translations[slot], self._written_at[slot] = source, translation, written_at
+                self._writes.append((slot, None, source, translation, written_at))
+            elif len(self._ids) >= self.max_entries:
+                self._counters["skipped_full"] += 1
+                return
+            else:
+                slot = len(self._ids)
+                self._index([(None, pair, source, form, translation, written_at)], signature[None, :])
+                self._writes.append((slot, pair, source, translation, written_at))
+                self._counters["added"] += 1
+        # Lookups only wait for the index update above, never for the disk
+        self._write_queued()
+
+    def _write_queued(self):
+        """
+        Write queued index changes to SQLite in the order they were made. An
+        insert is queued as (slot, pair, ...) and sets the slot's id, an
+        update of an indexed form as (slot, None, ...).
+        """
+        if self._db is None:
+            self._writes.clear()
+            return
+        with self._db_lock:
+            while True:
+                with self._lock:
+                    if not self._writes:
+                        return
+                    slot, pair, source, translation, written_at = self._writes.popleft()
+                    signature = self._signatures[slot].tobytes()
+                if pair is None:
+                    self._db.execute("UPDATE entries SET source = ?, translation = ?, created_at = ? WHERE id = ?",
+                                     (source, translation, written_at, self._ids[slot]))
+                else:
+                    self._ids[slot] = self._db.execute(
+                        "INSERT INTO entries (pair, source, translation, signature, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (pair, source, translation, signature, written_at)
+                    ).lastrowid
+
+    def lookup(self, text, source_lang, target_lang, candidates=4):
+        """A MemoryMatch for `text`; never None."""
+        started = time.perf_counter()
+        pair = self._pair(source_lang, target_lang)
+        form = match_form(text)
+        match = MemoryMatch(terms=self.glossary.find(text, source_lang, target_lang))
+        scored = []
+        with self._lock:
+            slot = self._forms.get((pair, form))
+            if slot is not None:
+                scored.append((1.0, slot))
+            elif form:
+                query = shingle_hashes(form)
+                signature = self._hasher.signature(query)
+                # The newest entries of each bucket, in case one is crowded
+                slots = set()
+                for key in self._band_keys(pair, signature):
+                    slots.update(self._buckets.get(key, ())[-64:])
+                if slots:
+                    slots = np.fromiter(slots, np.int64, len(slots))
+                    # Rank by estimated similarity, then measure the likely few exactly
+                    estimates = (self._signatures[slots] == signature).mean(axis=1)
+                    for i in np.argsort(-estimates)[:candidates]:
+                        if estimates[i] < self.context_threshold - 0.2:
+                            break
+                        similarity = jaccard(query, shingle_hashes(self._slot_forms[slots[i]]))
+                        if similarity >= self.context_threshold:
+                            scored.append((similarity, int(slots[i])))
+                scored.sort(reverse=True)
+            entries = [(similarity, self._sources[slot], self._translations[slot]) for similarity, slot in scored]
+
+        for similarity, source, translation in entries:
+            if similarity < self.reuse_threshold:
+                break
+            adapted = substitute(text, source, translation)
+            if adapted is not None:
+                match.kind = "exact" if adapted == translation and similarity == 1.0 else "substituted"
+                match.translation, match.similarity = adapted, similarity
+                break
+        if match.translation is None:
+            match.examples = [(source, translation) for _, source, translation in entries[:self.max_examples]]
+            match.similarity = entries[0][0] if entries else 0.0
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._counters["lookups"] += 1
+            self._counters[match.kind or ("context" if match.examples or match.terms else "misses")] += 1
+            self._counters["lookup_ms_total"] += elapsed_ms
+            self._counters["lookup_ms_max"] = max(self._counters["lookup_ms_max"], elapsed_ms)
+        return match
+
+    async def aadd(self, source, translation, source_lang, target_lang):
+        """`add()` from async code; the SQLite write runs in a worker thread."""
+        await asyncio.to_thread(self.add, source, translation, source_lang, target_lang)
+
+    def stats(self):
+        glossary_terms = len(self.glossary)
+        with self._lock:
+            lookups = self._counters["lookups"]
+            return {
+                **{key: value for key, value in self._counters.items() if key != "lookup_ms_total"},
+                "entries": len(self._ids),
+                "loaded": int(self._loaded.is_set()),
+                "glossary_terms": glossary_terms,
+                "reuse_rate": (self._counters["exact"] + self._counters["substituted"]) / lookups if lookups else 0.0,
+                "lookup_ms_avg": self._counters["lookup_ms_total"] / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        self._stop.set()
+        if self._loader is not None:
+            self._loader.join()
+        self._write_queued()
+        if self._db is not None:
+            self._db.close()
@@ -0,0 +1,176 @@
+import asyncio
+import io
+import os
+import re
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Sentence ends: Latin and CJK terminal punctuation, or a line break
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|(?<=[。！？])\s*|\n+")
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+class GTTSBackend:
+    """Google Translate TTS; MP3 output, language only (no voice choice)."""
+
+    name = "gtts"
+    mime = "audio/mp3"
+
+    def __init__(self):
+        from gtts import gTTS
+        self._gtts = gTTS
+
+    def default_voice(self, lang):
+        return None
+
+    def synthesize(self, text, lang, voice):
+        buffer = io.BytesIO()
+        self._gtts(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+    def join(self, chunks):
+        # MP3 frames can simply be concatenated
+        return b"".join(chunks)
+
+
+class EdgeTTSBackend:
+    """Microsoft Edge neural voices via edge-tts; MP3 output."""
+
+    name = "edge-tts"
+    mime = "audio/mp3"
+    VOICES = {"ko": "ko-KR-SunHiNeural", "en": "en-US-JennyNeural"}
+
+    def __init__(self):
+        import edge_tts
+        self._edge_tts = edge_tts
+
+    def default_voice(self, lang):
+        return self.VOICES.get(lang, self.VOICES["en"])
+
+    def synthesize(self, text, lang, voice):
+        # Called from a worker thread, so it can own a short-lived event loop
+        return asyncio.run(self._synthesize(text, voice))
+
+    async def _synthesize(self, text, voice):
+        chunks = []
+        async for chunk in self._edge_tts.Communicate(text, voice).stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        return b"".join(chunks)
+
+    def join(self, chunks):
+        return b"".join(chunks)
+
+
+class SilentBackend:
+    """Offline stand-in that returns silence proportional to the text length."""
+
+    name = "silent"
+    mime = "audio/wav"
+    SAMPLE_RATE = 16000
+
+    def default_voice(self, lang):
+        return None
+
+    def synthesize(self, text, lang, voice):
+        return self._wav(b"\x00\x00" * int(self.SAMPLE_RATE * 0.06 * len(text)))
+
+    def join(self, chunks):
+        frames = []
+        for chunk in chunks:
+            with wave.open(io.BytesIO(chunk), "rb") as wav:
+                frames.append(wav.readframes(wav.getnframes()))
+        return self._wav(b"".join(frames))
+
+    def _wav(self, frames):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(frames)
+        return buffer.getvalue()
+
+
+BACKENDS = {backend.name: backend for backend in (GTTSBackend, EdgeTTSBackend, SilentBackend)}
+
+
+def create_backend(name=None):
+    name = name or os.getenv("TTS_BACKEND", "gtts")
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"unknown TTS backend {name!r}, expected one of {sorted(BACKENDS)}") from None
+
+
+class TTSEngine:
+    """
+    In-memory sentence-by-sentence speech synthesis.
+
+    `stream()` splits the text into sentences, submits all of them to a
+    small thread pool at once and yields each sentence's audio in order as
+    soon as it is ready, so playback of the first sentence can start while
+    later ones are still being synthesized. Audio is cached per
+    (sentence, voice, language) in an LRU, so replays and repeated phrases
+    never hit the backend (or the disk) again.
+    """
+
+    def __init__(self, backend=None, cache_size=256, max_workers=4):
+        self.backend = backend or create_backend()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._counters = {"sentences": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def mime(self):
+        return self.backend.mime
+
+    def stream(self, text, lang, voice=None):
+        voice = voice or self.backend.default_voice(lang)
+        pending = [self._submit(sentence, lang, voice) for sentence in split_sentences(text)]
+        for future in pending:
+            yield future.result()
+
+    def synthesize(self, text, lang, voice=None):
+        return self.backend.join(list(self.stream(text, lang, voice)))
+
+    def _submit(self, sentence, lang, voice):
+        key = (sentence, voice, lang)
+        with self._lock:
+            self._counters["sentences"] += 1
+            audio = self._cache.get(key)
+            if audio is not None:
+                self._cache.move_to_end(key)
+                self._counters["hits"] += 1
+                future = Future()
+                future.set_result(audio)
+                return future
+            self._counters["misses"] += 1
+        future = self._executor.submit(self.backend.synthesize, sentence, lang, voice)
+        future.add_done_callback(lambda f: self._store(key, f))
+        return future
+
+    def _store(self, key, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            self._cache[key] = future.result()
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "entries": len(self._cache), "backend": self.backend.name}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
@@ -0,0 +1,129 @@
+import base64
+import binascii
+import json
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+from transcoder import PCM_FORMAT, TARGET_SAMPLE_WIDTH
+
+# Binary audio frame sent on /ws/{client_id}:
+#
+#   magic   2s  b"CU"
+#   version B   FRAME_VERSION
+#   flags   B   FLAG_PCM16 when the body is raw 16 kHz mono PCM16,
+#               FLAG_STREAM to receive incremental translation events,
+#               FLAG_LIVE when the body is the next PCM16 chunk of a live
+#               subtitle session, FLAG_END (with FLAG_LIVE) to end it
+#   seq     I   client sequence number (big-endian)
+#   src_len B   length of the source language code
+#   tgt_len B   length of the target language code
+#   src, tgt    ASCII language codes
+#   body        audio bytes, up to the end of the message
+FRAME_MAGIC = b"CU"
+FRAME_VERSION = 1
+FLAG_PCM16 = 0x01
+FLAG_STREAM = 0x02
+FLAG_LIVE = 0x04
+FLAG_END = 0x08
+HEADER = struct.Struct(">2sBBIBB")
+
+
+class ProtocolError(ValueError):
+    """Raised when a WebSocket message is not a valid audio message."""
+
+
+@dataclass
+class AudioMessage:
+    seq: Optional[int]
+    source_lang: str
+    target_lang: str
+    audio: memoryview
+    fmt: Optional[str] = None
+    stream: bool = False
+    live: bool = False
+    end: bool = False
+
+
+def encode_audio_frame(audio, seq=0, source_lang="auto", target_lang="en", fmt=None, stream=False,
+                       live=False, end=False):
+    """Build a binary audio frame (used by benchmarks and Python clients)."""
+    src = source_lang.encode("ascii")
+    tgt = target_lang.encode("ascii")
+    flags = ((FLAG_PCM16 if fmt == PCM_FORMAT else 0) | (FLAG_STREAM if stream else 0)
+             | (FLAG_LIVE if live else 0) | (FLAG_END if end else 0))
+    return b"".join((HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, seq, len(src), len(tgt)), src, tgt, audio))
+
+
+def decode_audio_frame(frame):
+    """
+    Parse a binary frame without copying the audio body: the returned
+    `audio` is a memoryview into `frame`.
+    """
+    view = memoryview(frame)
+    if len(view) < HEADER.size:
+        raise ProtocolError("frame is shorter than its header")
+    magic, version, flags, seq, src_len, tgt_len = HEADER.unpack_from(view)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ProtocolError("unknown frame magic or version")
+    offset = HEADER.size
+    if len(view) < offset + src_len + tgt_len:
+        raise ProtocolError("frame is shorter than its language codes")
+    try:
+        source_lang = bytes(view[offset:offset + src_len]).decode("ascii") or "auto"
+        offset += src_len
+        target_lang = bytes(view[offset:offset + tgt_len]).decode("ascii") or "en"
+        offset += tgt_len
+    except UnicodeDecodeError as e:
+        raise ProtocolError("language codes are not ASCII") from e
+    if flags & FLAG_PCM16 and (len(view) - offset) % TARGET_SAMPLE_WIDTH:
+        # A stray byte would misalign every later sample of a live stream
+        raise ProtocolError("PCM16 audio is not a whole number of samples")
+    return AudioMessage(
+        seq=seq,
+        source_lang=source_lang,
+        target_lang=target_lang,
+        audio=view[offset:],
+        fmt=PCM_FORMAT if flags & FLAG_PCM16 else None,
+        stream=bool(flags & FLAG_STREAM),
+        live=bool(flags & FLAG_LIVE),
+        end=bool(flags & FLAG_END),
+    )
+
+
+def decode_json_message(text):
+    """Parse the legacy `{"type": "audio", "data": <base64>}` message, or None for other types."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ProtocolError(f"invalid JSON message: {e}") from e
+    if not isinstance(data, dict):
+        raise ProtocolError("JSON message is not an object")
+    if data.get("type") != "audio":
+        return None
+    try:
+        audio = base64.b64decode(data["data"], validate=True)
+    except KeyError as e:
+        raise ProtocolError("audio message has no data") from e
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ProtocolError(f"audio data is not valid base64: {e}") from e
+    return AudioMessage(
+        seq=data.get("seq"),
+        source_lang=data.get("source_lang", "auto"),
+        target_lang=data.get("target_lang", "en"),
+        audio=memoryview(audio),
+        stream=bool(data.get("stream", False)),
+    )
+
+
+def read_audio_message(message):
+    """
+    Turn a raw ASGI `websocket.receive` message into an AudioMessage.
+    Binary frames use the compact protocol; text frames fall back to JSON.
+    Any malformed message raises ProtocolError.
+    """
+    if message.get("bytes") is not None:
+        return decode_audio_frame(message["bytes"])
+    if message.get("text") is not None:
+        return decode_json_message(message["text"])
+    return None